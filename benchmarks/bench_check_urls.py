@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# Wall-clock comparison of serial and concurrent link checking against local
+# stand-in servers (one per loopback address) that add a fixed latency, or
+# against a recorded fixture replayed with its real per-url latencies.
+
+import argparse
+from contextlib import redirect_stdout
+import io
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from tempfile import NamedTemporaryFile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'check_tex_url'))
+from check_tex_url import check_tex_url
+from cv_utils import HttpClient, set_default_http_client
+from url_replay import ReplayServer
+
+class LatencyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_HEAD(self):
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_GET = do_HEAD
+
+    def log_message(self, format, *args):
+        pass
+
+def start_servers(hosts, latency):
+    servers = []
+    for i in range(hosts):
+        server = ThreadingHTTPServer((f"127.0.0.{i + 1}", 0), LatencyHandler)
+        server.latency = latency
+        server.connections = 0
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    return servers
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark check_tex_url against local servers with artificial latency')
+    parser.add_argument('--urls', dest='urls', type=int, default=200, help='Number of distinct URLs to check')
+    parser.add_argument('--hosts', dest='hosts', type=int, default=4, help='Number of stand-in hosts (127.0.0.1 .. 127.0.0.N)')
+    parser.add_argument('--latency', dest='latency', type=float, default=0.05, help='Seconds of latency added to every response')
+    parser.add_argument('--replay', dest='replay', type=str, default='', help='Replay the urls of a fixture recorded with --record-urls instead')
+    parser.add_argument('--latency_scale', dest='latency_scale', type=float, default=1.0, help='Multiplier on recorded latencies when replaying')
+    args = parser.parse_args()
+
+    tex_f = NamedTemporaryFile('w', suffix='.tex', delete=False)
+    if args.replay:
+        replay_server = ReplayServer(args.replay, args.latency_scale).start()
+        servers = []
+        urls = list(replay_server.fixtures['urls'])
+        for i, url in enumerate(urls):
+            tex_f.write(f"\\href{{{url}}}{{Link {i}}}\n")
+        print(f"{len(urls)} recorded urls from {args.replay}, latency x{args.latency_scale}")
+    else:
+        servers = start_servers(args.hosts, args.latency)
+        for i in range(args.urls):
+            host, port = servers[i % len(servers)].server_address
+            tex_f.write(f"\\href{{http://{host}:{port}/paper{i}.pdf}}{{Paper {i}}}\n")
+        print(f"{args.urls} urls, {args.hosts} hosts, {args.latency * 1000:.0f}ms latency")
+    tex_f.close()
+
+    print(f"{'mode':<28}{'seconds':>10}{'connections':>13}")
+    for name, max_workers, max_per_host in [('serial', 1, 1), ('concurrent (defaults)', None, None)]:
+        kwargs = {} if max_workers is None else {'max_workers': max_workers, 'max_per_host': max_per_host}
+        # start every mode with a cold connection pool
+        set_default_http_client(HttpClient(proxy=replay_server.server_address) if args.replay else None)
+        connections = sum(server.connections for server in servers)
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            retval = check_tex_url(tex_f.name, quiet=True, **kwargs)
+        elapsed = time.perf_counter() - start
+        connections = sum(server.connections for server in servers) - connections
+        print(f"{name:<28}{elapsed:>10.2f}{connections if servers else '-':>13}{'' if retval == 0 else '  (failures)'}")
+
+    os.unlink(tex_f.name)
+    set_default_http_client(None)
+    if args.replay:
+        replay_server.stop()
+    for server in servers:
+        server.shutdown()
+
+# Start program
+if __name__ == "__main__":
+    main()
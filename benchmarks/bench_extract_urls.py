@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# Time and peak memory of url extraction from a synthetic multi-megabyte bib file:
+# the original read-everything, one regex pass per pattern find_url_locations against
+# the single-pass mmap extractor check_tex_url now uses.
+
+import argparse
+from bisect import bisect_right
+import os
+import re
+import sys
+import time
+import tracemalloc
+from tempfile import NamedTemporaryFile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'check_tex_url'))
+from check_tex_url import iter_url_locations
+
+URL_PATTERNS = [r"url\s*=\s*\{(.*?)\}", r"href\{(.*?)\}", r"a href=[\"\'](.*?)[\"\']"]
+
+def three_pass(filename):
+    with open(filename, 'r') as f:
+        f_text = f.read()
+    line_starts = [0] + [m.end() for m in re.finditer('\n', f_text)]
+    locations = []
+    for pattern in URL_PATTERNS:
+        for match in re.finditer(pattern, f_text):
+            locations.append((match.group(1), bisect_right(line_starts, match.start(1))))
+    return locations
+
+def single_pass(filename):
+    return [(url, line) for url, _, line, _ in iter_url_locations(filename)]
+
+def write_bib(bib_f, entries):
+    for i in range(entries):
+        bib_f.write(f"@inproceedings{{paper{i},\n"
+                    f"  author = {{Author {i} and Another Author and Third Author}},\n"
+                    f"  title = {{A Paper About Systems Security, Part {i}}},\n"
+                    f"  booktitle = {{Proceedings of the {i % 40}th Symposium on Something Important}},\n"
+                    f"  year = {{{2000 + i % 24}}},\n"
+                    f"  pages = {{{i}--{i + 12}}},\n"
+                    f"  url = {{https://host{i % 50}.example.org/papers/paper{i}.pdf}},\n"
+                    f"  note = {{\\href{{https://host{i % 50}.example.org/slides/{i}}}{{Slides}}}}\n"
+                    "}\n\n")
+
+def measure(extract, filename):
+    start = time.perf_counter()
+    urls = extract(filename)
+    elapsed = time.perf_counter() - start
+    # tracing slows allocation down, so memory gets a run of its own
+    tracemalloc.start()
+    extract(filename)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return len(urls), elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark url extraction from a large synthetic bib file')
+    parser.add_argument('--entries', dest='entries', type=int, default=20000, help='Number of bib entries to generate')
+    args = parser.parse_args()
+
+    bib_f = NamedTemporaryFile('w', suffix='.bib', delete=False)
+    write_bib(bib_f, args.entries)
+    bib_f.close()
+    print(f"{args.entries} entries, {os.path.getsize(bib_f.name) / 1e6:.1f} MB")
+
+    print(f"{'extractor':<28}{'urls':>8}{'seconds':>10}{'peak MB':>10}")
+    for name, extract in [('three regex passes', three_pass), ('single pass (mmap)', single_pass)]:
+        num_urls, elapsed, peak = measure(extract, bib_f.name)
+        print(f"{name:<28}{num_urls:>8}{elapsed:>10.2f}{peak / 1e6:>10.1f}")
+    os.unlink(bib_f.name)
+
+# Start program
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# Time and peak memory of every generator and of url extraction on synthetic inputs at
+# several scales (see synth_cv.py), each run starting with cold parse caches. Memory is
+# measured with tracemalloc in a separate run so it doesn't slow down the timed one.
+
+import argparse
+import glob
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'check_tex_url'))
+import cv_utils
+import cvbuild
+from check_tex_url import iter_urls
+from synth_cv import synthesize
+
+def reset_caches():
+    cv_utils.parsed_inputs.clear()
+    cv_utils.parsed_contents.clear()
+    cv_utils.csv_indexes.clear()
+    cv_utils.cached_latex_format.cache_clear()
+
+# (seconds, peak bytes) of run(), which returns a short description of what it did
+def measure(run):
+    reset_caches()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    reset_caches()
+    start = time.perf_counter()
+    detail = run()
+    return time.perf_counter() - start, peak, detail
+
+def bench_scale(scale, data_dir, seed, jobs_counts=()):
+    sizes = synthesize(data_dir, scale, seed)
+    out_dir = os.path.join(data_dir, 'generated')
+    os.makedirs(out_dir, exist_ok=True)
+    results = []
+    for target, (generator, inputs) in cvbuild.TARGETS.items():
+        def run():
+            cvbuild.run_target(target, data_dir, out_dir, 'critical')
+            return ', '.join(f"{sizes[input]} {input}" for input in inputs)
+        results.append((generator,) + measure(run))
+    files = [os.path.join(data_dir, 'cv.bib')] + sorted(glob.glob(os.path.join(out_dir, '*.tex')) + glob.glob(os.path.join(out_dir, '*.html')))
+    results.append(('url extraction',) + measure(lambda: f"{sum(1 for _ in iter_urls(files))} urls in {len(files)} files"))
+    # a whole build as cvbuild -j runs it, pool workers parse the inputs they share again and
+    # their memory isn't traced
+    for jobs in jobs_counts:
+        def build():
+            cvbuild.build(list(cvbuild.TARGETS), data_dir, os.path.join(data_dir, f"generated-j{jobs}"), 'critical', logging.getLogger('bench_generators'), force=True, jobs=jobs)
+            return f"all targets, {jobs} at a time"
+        results.append((f"cvbuild -j {jobs}",) + measure(build))
+    return [{'scale': scale, 'script': script, 'seconds': seconds, 'peak_bytes': peak, 'detail': detail}
+            for script, seconds, peak, detail in results]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every generator on synthetic inputs at several scales')
+    parser.add_argument('--scales', dest='scales', type=float, nargs='+', default=[0.1, 1.0], help='Multipliers on the synthetic row counts, 1 is a 5,000 entry cv.bib')
+    parser.add_argument('--seed', dest='seed', type=int, default=0, help='Random seed for the synthetic inputs')
+    parser.add_argument('--json', dest='json_file', type=str, default='', help='Also write the results to this JSON file')
+    parser.add_argument('--jobs', dest='jobs', type=int, nargs='*', default=[], help='Also time a full cvbuild with each of these -j values')
+    parser.add_argument('--keep', dest='keep', type=str, default='', help='Write the inputs and outputs under this directory instead of a temporary one')
+    args = parser.parse_args()
+
+    # generators log their complaints about the synthetic data to the root logger
+    logging.basicConfig(level=logging.CRITICAL)
+    root = args.keep or tempfile.mkdtemp()
+    results = []
+    print(f"{'scale':>6}  {'script':<20}{'seconds':>10}{'peak MB':>10}  inputs")
+    for scale in args.scales:
+        for result in bench_scale(scale, os.path.join(root, f"scale-{scale:g}"), args.seed, args.jobs):
+            print(f"{scale:>6g}  {result['script']:<20}{result['seconds']:>10.2f}{result['peak_bytes'] / 2**20:>10.1f}  {result['detail']}")
+            results.append(result)
+    if not args.keep:
+        shutil.rmtree(root)
+    if args.json_file:
+        with open(args.json_file, 'w') as f:
+            json.dump(results, f, indent=1)
+
+# Start program
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# Import time of every script, measured with python -X importtime in a fresh interpreter
+# and checked against the budget in startup_budget.json, with the heaviest imports of any
+# script that goes over it.
+
+import argparse
+import glob
+import json
+import math
+import os
+import subprocess
+import sys
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_budget.json')
+
+def script_modules():
+    return sorted(os.path.splitext(os.path.basename(filename))[0] for filename in glob.glob(os.path.join(SCRIPTS_DIR, '*.py')))
+
+# {module: cumulative microseconds} for everything importing module pulled in
+def import_times(module):
+    # users run with cached bytecode, don't time the compiler
+    env = {name: value for name, value in os.environ.items() if name != 'PYTHONDONTWRITEBYTECODE'}
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"], cwd=SCRIPTS_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    times = {}
+    for line in result.stderr.split('\n'):
+        if line.startswith('import time:'):
+            self_time, cumulative, name = line[len('import time:'):].split('|')
+            # skip the header
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+# fastest of runs after a warm up run that writes the bytecode, in milliseconds, and the
+# heaviest imports of that run
+def measure(module, runs):
+    import_times(module)
+    best = min((import_times(module) for _ in range(runs)), key=lambda times: times[module])
+    heaviest = sorted((name for name in best if name != module), key=best.get, reverse=True)
+    return best[module] / 1000, [(name, best[name] / 1000) for name in heaviest[:3]]
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the import time of every script against its budget')
+    parser.add_argument('modules', type=str, nargs='*', help='Scripts to measure, all of them if none are given')
+    parser.add_argument('--runs', dest='runs', type=int, default=5, help='Runs per script, the fastest counts')
+    parser.add_argument('--budget', dest='budget', type=str, default=BUDGET_FILE, help='JSON file of milliseconds allowed per script')
+    parser.add_argument('--update', dest='update', action='store_true', default=False, help='Record the measured times times --headroom as the new budget')
+    parser.add_argument('--headroom', dest='headroom', type=float, default=1.5, help='Budget as a multiple of the measured time for --update')
+    args = parser.parse_args()
+
+    with open(args.budget, 'r') as f:
+        budget = json.load(f)
+    over = 0
+    print(f"{'script':<20}{'ms':>8}{'budget':>8}")
+    for module in args.modules or script_modules():
+        milliseconds, heaviest = measure(module, args.runs)
+        if args.update:
+            # rounded up to 5ms so noise doesn't churn the file
+            budget[module] = 5 * math.ceil(milliseconds * args.headroom / 5)
+        allowed = budget.get(module)
+        failed = allowed is not None and milliseconds > allowed
+        over += failed
+        print(f"{module:<20}{milliseconds:>8.1f}{allowed if allowed is not None else '-':>8}{'  OVER' if failed else ''}")
+        if failed:
+            for name, cumulative in heaviest:
+                print(f"{'':<4}{name:<32}{cumulative:>8.1f}")
+    if args.update:
+        with open(args.budget, 'w') as f:
+            json.dump(budget, f, indent=1, sort_keys=True)
+            f.write('\n')
+    if over:
+        sys.exit(1)
+
+# Start program
+if __name__ == "__main__":
+    main()
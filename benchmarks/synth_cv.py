@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# Writes a synthetic but realistically shaped set of CV inputs (cv.bib and every csv file
+# the generators read) at a configurable scale, with dates around today so the "last two
+# years" and "current student" paths are exercised. The same seed gives the same files.
+
+import argparse
+import csv
+import os
+import random
+from datetime import date
+
+# rows at scale 1
+SIZES = {
+    'bib': 5000,
+    'students': 2000,
+    'tpcs': 1000,
+    'conferences': 200,
+    'talks': 500,
+    'classes': 200,
+    'grants': 500,
+    'cases': 100,
+    'people': 10000,
+}
+
+FIRST_NAMES = ['Alice', 'Bob', 'Carol', 'David', 'Eve', 'Frank', 'Grace', 'Heidi', 'Ivan', 'Judy', 'Mallory', 'Niaj',
+               'Olivia', 'Peggy', 'Rupert', 'Sybil', 'Trent', 'Victor', 'Walter', 'Zoë', 'José', 'Chloé', 'Søren', 'Łukasz',
+               'Mei', 'Wei', 'Priya', 'Arjun', 'Fatima', 'Omar', 'Yuki', 'Hiroshi', 'Ana', 'João', 'Ingrid', 'Lars',
+               'Nadia', 'Pavel', 'Elif', 'Mehmet', 'Aoife', 'Ciarán', 'Kwame', 'Amara', 'Diego', 'Lucía', 'Noa', 'Eitan',
+               'Thandi', 'Sipho']
+SYLLABLES = ['ba', 'ker', 'lin', 'mo', 'ra', 'son', 'ta', 'vi', 'wen', 'zu', 'chen', 'dal', 'fer', 'gu', 'hol', 'ki']
+AFFILIATIONS = ['Toronto', 'Waterloo', 'MIT', 'Stanford', 'CMU', 'ETH Zürich', 'Microsoft Research', 'Google', 'Intel Labs', 'UBC']
+VENUE_WORDS = ['Security', 'Systems', 'Privacy', 'Networks', 'Computing', 'Software', 'Architecture', 'Data', 'Learning', 'Trust']
+TITLE_WORDS = ['Secure', 'Efficient', 'Scalable', 'Practical', 'Verifiable', 'Private', 'Robust', 'Transparent', 'Hardware',
+               'Enclaves', 'Kernels', 'Permissions', 'Attacks', 'Defenses', 'Provenance', 'Isolation', 'Measurement', 'Études']
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+STUDENT_TYPES = ['PhD', 'MS', 'MEng', 'UG', 'PDF']
+# countries gen_talks knows the CCV code of
+COUNTRIES = ['Canada', 'USA', 'China', 'UK']
+CITIES = ['Toronto', 'Boston', 'Beijing', 'London']
+
+def scaled(name, scale):
+    return max(1, int(SIZES[name] * scale))
+
+def last_names(count):
+    names = []
+    for i in range(count):
+        name = ''
+        while True:
+            name = SYLLABLES[i % len(SYLLABLES)] + name
+            i //= len(SYLLABLES)
+            if not i:
+                break
+        names.append(name.capitalize())
+    return names
+
+# every first name with every last name, so people.csv can hold scale x 10,000 distinct names
+def names(count):
+    last = last_names(count // len(FIRST_NAMES) + 1)
+    return [(FIRST_NAMES[i % len(FIRST_NAMES)], last[i // len(FIRST_NAMES)]) for i in range(count)]
+
+def title(rng, words=6):
+    return ' '.join(rng.choice(TITLE_WORDS) for _ in range(words)).capitalize()
+
+def short_date(day):
+    return f"{day.month}/{day.day:02d}/{day.year % 100:02d}"
+
+def write_csv(filename, fieldnames, rows):
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def write_bib(filename, rng, count, people):
+    this_year = date.today().year
+    with open(filename, 'w', encoding='utf-8') as f:
+        for i in range(count):
+            authors = ['David Lie'] + [' '.join(rng.choice(people)) for _ in range(rng.randint(2, 7))]
+            rng.shuffle(authors)
+            fields = {'author': ' and '.join(authors), 'title': title(rng, rng.randint(4, 10)),
+                      'year': str(this_year - min(int(rng.expovariate(0.15)), 30))}
+            kind = rng.random()
+            if kind < 0.6:
+                entry_type = 'inproceedings'
+                fields['booktitle'] = f"Proceedings of the {rng.randint(1, 40)}th Symposium on {rng.choice(VENUE_WORDS)} ({{SYM}})"
+                fields['pages'] = f"{rng.randint(1, 900)}--{rng.randint(901, 2000)}"
+                fields['note'] = f"(Acceptance: {rng.randint(20, 80)}/{rng.randint(200, 900)}, {rng.randint(8, 25)}\\%)"
+            elif kind < 0.85:
+                entry_type = 'article'
+                fields['journal'] = f"{{ACM}} Transactions on {rng.choice(VENUE_WORDS)}"
+                fields['volume'] = str(rng.randint(1, 50))
+                fields['number'] = str(rng.randint(1, 12))
+                fields['pages'] = f"{rng.randint(1, 50)}:1--{rng.randint(51, 99)}:30"
+            elif kind < 0.95:
+                entry_type = 'techreport'
+                fields['institution'] = f"University of {rng.choice(AFFILIATIONS)}"
+                fields['number'] = f"TR-{i}"
+            else:
+                entry_type = 'misc'
+                fields['howpublished'] = f"U.S. Patent {rng.randint(7000000, 11000000):,}"
+            fields['url'] = f"https://example.org/papers/{i}.pdf"
+            fields['doi'] = f"10.1145/{rng.randint(100000, 999999)}.{i}"
+            f.write(f"@{entry_type}{{synth:{i},\n")
+            f.write(',\n'.join(f"{name} = {{{value}}}" for name, value in fields.items()))
+            f.write(f",\nmonth = {rng.choice(MONTHS)}\n}}\n\n")
+
+def student_rows(rng, count, people):
+    today = date.today()
+    rows = []
+    for i, (first, last) in enumerate(rng.sample(people, count)):
+        student_type = STUDENT_TYPES[i % len(STUDENT_TYPES)]
+        start = date(today.year - rng.randint(0, 20), rng.randint(1, 12), 1)
+        row = {'First Name': first, 'Last Name': last, 'Home Page': f"https://example.org/~{last.lower()}" if i % 3 else ''}
+        row[f"{student_type} Start Date"] = short_date(start)
+        # a fifth of them are current students
+        if i % 5:
+            row[f"{student_type} End Date"] = short_date(date(min(start.year + rng.randint(1, 6), today.year), rng.randint(1, 12), 1))
+            row[f"{student_type} Last Position"] = f"{rng.choice(['Engineer', 'Professor', 'Researcher'])} at {rng.choice(AFFILIATIONS)}"
+        if student_type != 'PDF':
+            row[f"{student_type} Thesis"] = title(rng)
+        if student_type in ('PhD', 'MS', 'MEng') and i % 2:
+            row[f"{student_type} Thesis URL"] = f"https://example.org/theses/{i}.pdf"
+        if student_type in ('PhD', 'MS', 'UG'):
+            row[f"{student_type} Program"] = rng.choice(['ECE', 'CS', 'EngSci'])
+        if student_type in ('PhD', 'MS') and i % 7 == 0:
+            row[f"{student_type} Co-Supervisor"] = ' '.join(rng.choice(people))
+        if student_type == 'PhD' and i % 4 == 0:
+            row['PhD External Examiner'] = f"{' '.join(rng.choice(people))} ({rng.choice(AFFILIATIONS)})"
+        rows.append(row)
+    return rows
+
+def conference_rows(count):
+    return [{'conf_short': f"SYM{i}", 'conf_full': f"Symposium on {VENUE_WORDS[i % len(VENUE_WORDS)]} {i} (SYM{i})",
+             'start_year': str(1980 + i % 40), 'start_num': '1', 'annual': '',
+             'URL': f"https://sym{i}.example.org/<year>/" if i % 2 else '', 'Note': ''} for i in range(count)]
+
+def tpc_rows(rng, count, conferences):
+    this_year = date.today().year
+    rows = []
+    for i in range(count):
+        # some venues aren't in conference_keys.csv and are printed as given
+        conference = rng.choice(conferences)
+        conf = conference['conf_short'] if i % 10 else f"Workshop on {rng.choice(VENUE_WORDS)} {i}"
+        year = max(this_year - int(rng.expovariate(0.1)), int(conference['start_year']) + 1)
+        rows.append({'conf': conf, 'year': str(year), 'month': str(rng.randint(1, 12)), 'URL': '',
+                     'role': 'TPC Chair' if i % 25 == 0 else '', 'notes': ''})
+    return rows
+
+def talk_rows(rng, count, people):
+    this_year = date.today().year
+    return [{'Title': title(rng), 'Venue': f"Symposium on {rng.choice(VENUE_WORDS)}", 'Year': str(this_year - rng.randint(0, 25)),
+             'Type': 'Invited' if i % 3 == 0 else 'Conference', 'Header': '', 'URL': '',
+             'Country': COUNTRIES[i % len(COUNTRIES)], 'City': CITIES[i % len(CITIES)],
+             'Audience': rng.choice(['Researcher', 'Knowledge User', 'General Public']), 'Keynote': 'Yes' if i % 20 == 0 else '',
+             'Co-Presenters': ' '.join(rng.choice(people)) if i % 9 == 0 else ''} for i in range(count)]
+
+def class_rows(rng, count):
+    this_year = date.today().year
+    return [{'Year': str(this_year - i % 25), 'Code': f"ECE{rng.randint(200, 1799)}", 'Title': title(rng, 3),
+             'Enrollment': str(rng.randint(10, 300)), 'Type': 'UG' if i % 2 else 'Grad'} for i in range(count)]
+
+def grant_rows(rng, count, people):
+    this_year = date.today().year
+    rows = []
+    for i in range(count):
+        start = this_year - rng.randint(0, 20)
+        co_pis = ', '.join(f"{' '.join(rng.choice(people))} ({rng.choice(AFFILIATIONS)})" for _ in range(rng.randint(0, 4)))
+        rows.append({'year': f"{start}--{start + rng.randint(1, 5)}", 'start_date': f"{start}/{rng.randint(1, 12):02d}",
+                     'end_date': f"{start + 3}/{rng.randint(1, 12):02d}", 'status': 'PI' if i % 3 else f"Co-PI+{rng.randint(1, 4)}",
+                     'title': title(rng), 'sponsor': rng.choice(['NSERC', 'CFI', 'Ontario Research Fund', 'Google']),
+                     'total_amount': f"{rng.randint(10, 2000) * 1000:,}", 'currency': '' if i % 4 else 'USD', 'share': '',
+                     'type': 'Grant', 'organization': 'NSERC', 'program': 'Discovery', 'ref_number': f"RGPIN-{i}",
+                     'competitive': 'Yes', 'pi': 'David Lie', 'co_pis': co_pis + ('; Collaborating Disciplines: Law' if i % 6 == 0 else '')})
+    return rows
+
+def case_rows(rng, count):
+    this_year = date.today().year
+    return [{'title': f"{title(rng, 2)} v. {title(rng, 2)}", 'plaintiff': title(rng, 2), 'defendant': title(rng, 2),
+             'role': rng.choice(['for the Plaintiff', 'for the Defendant']), 'jurisdiction': 'Ontario, Canada',
+             'case': f"CV-{i}", 'year': str(this_year - rng.randint(0, 15)), 'start_date': '', 'end_date': ''} for i in range(count)]
+
+def people_rows(people):
+    return [{'name': f"{first} {last}", 'First Name': first, 'Nick Name': '', 'Middle Name': '', 'Last Name': last,
+             'Affiliation': AFFILIATIONS[i % len(AFFILIATIONS)]} for i, (first, last) in enumerate(people)]
+
+# writes cv.bib and the csv files into out_dir and returns {file: rows}
+def synthesize(out_dir, scale=1.0, seed=0, template_dir=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')):
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    people = names(scaled('people', scale))
+    def header(csv_file):
+        with open(os.path.join(template_dir, csv_file), 'r', newline='', encoding='utf-8-sig') as f:
+            return next(csv.reader(f))
+    conferences = conference_rows(scaled('conferences', scale))
+    tables = {
+        'students.csv': student_rows(rng, min(scaled('students', scale), len(people)), people),
+        'conference_keys.csv': conferences,
+        'TPCs.csv': tpc_rows(rng, scaled('tpcs', scale), conferences),
+        'talks.csv': talk_rows(rng, scaled('talks', scale), people),
+        'classes.csv': class_rows(rng, scaled('classes', scale)),
+        'funding.csv': grant_rows(rng, scaled('grants', scale), people),
+        'cases.csv': case_rows(rng, scaled('cases', scale)),
+        'people.csv': people_rows(people),
+    }
+    for csv_file, rows in tables.items():
+        write_csv(os.path.join(out_dir, csv_file), header(csv_file), rows)
+    write_bib(os.path.join(out_dir, 'cv.bib'), rng, scaled('bib', scale), people)
+    sizes = {csv_file: len(rows) for csv_file, rows in tables.items()}
+    sizes['cv.bib'] = scaled('bib', scale)
+    return sizes
+
+def main():
+    parser = argparse.ArgumentParser(description='Write synthetic CV inputs at a given scale')
+    parser.add_argument('out_dir', type=str, help='Directory for cv.bib and the csv files')
+    parser.add_argument('--scale', dest='scale', type=float, default=1.0, help=f"Multiplier on the row counts {SIZES}")
+    parser.add_argument('--seed', dest='seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+    for filename, rows in synthesize(args.out_dir, args.scale, args.seed).items():
+        print(f"{filename:<22}{rows:>8}")
+
+# Start program
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from latex_format import make_format, format_arg, format_info, ENGINE
+from latex_pass import engine_command, read_passes, build_report, save_report, summary, PASSES_FILE, REPORT_FILE
+
+BUILD_DIR = 'build/'
+LATEX_RUN_RE = re.compile(r"Run number \d+ of rule '\w*latex")
+
+# compiles one variant with all of latexmk's aux, bbl and log files in its own directory
+# under build_dir, then copies the PDF next to the tex file. Generated files and cv.bib
+# are only read, so variants can compile at the same time. Every latex pass loads the
+# precompiled preamble fmt if there is one, and with report each pass is timed and its
+# rerun warnings recorded. Returns (seconds, succeeded, latex passes, report).
+def build_pdf(tex_file, build_dir, latexmk, logger, fmt=None, engine=ENGINE, report=True):
+    # a Windows latexmk, as the Makefile picks under WSL, can't run the python pass wrapper
+    report = report and not latexmk.endswith('.exe')
+    variant = os.path.splitext(os.path.basename(tex_file))[0]
+    out_dir = os.path.join(build_dir, variant)
+    os.makedirs(out_dir, exist_ok=True)
+    engine_args = [engine] + ([f"-fmt={format_arg(fmt)}"] if fmt else [])
+    passes_file = os.path.join(out_dir, PASSES_FILE)
+    if os.path.exists(passes_file):
+        os.remove(passes_file)
+    args = [latexmk, '-pdf', '-interaction=nonstopmode', f"-outdir={out_dir}"]
+    if report:
+        args.append(f"-pdflatex={engine_command(passes_file, engine_args)} %O %S")
+    elif fmt:
+        args.append(f"-pdflatex={' '.join(engine_args)} %O %S")
+    start = time.perf_counter()
+    result = subprocess.run(args + [tex_file], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    seconds = time.perf_counter() - start
+    build = None
+    if report:
+        build = build_report(tex_file, seconds, read_passes(passes_file))
+        save_report(build, os.path.join(out_dir, REPORT_FILE))
+        passes = build['passes']
+    else:
+        passes = len(LATEX_RUN_RE.findall(result.stdout))
+    if result.returncode != 0:
+        logger.error(f"latexmk failed on {tex_file}, see {os.path.join(out_dir, variant + '.log')}:\n{result.stdout[-2000:]}")
+        return seconds, False, passes, build
+    logger.debug(result.stdout)
+    shutil.copy2(os.path.join(out_dir, variant + '.pdf'), os.path.join(os.path.dirname(tex_file), variant + '.pdf'))
+    return seconds, True, passes, build
+
+# returns {tex_file: (seconds, succeeded, latex passes, report, format)}
+def build_pdfs(tex_files, build_dir, latexmk, logger, jobs=None, use_format=True, engine=ENGINE, report=True):
+    # made up front, variants with the same preamble share one format
+    formats = {tex_file: make_format(tex_file, logger, os.path.join(build_dir, 'fmt'), engine) if use_format else None
+               for tex_file in tex_files}
+    with ThreadPoolExecutor(jobs or len(tex_files)) as pool:
+        futures = {tex_file: pool.submit(build_pdf, tex_file, build_dir, latexmk, logger, formats[tex_file], engine, report) for tex_file in tex_files}
+        return {tex_file: future.result() + (formats[tex_file],) for tex_file, future in futures.items()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compile CV variants concurrently, each in its own build directory')
+    parser.add_argument('tex_files', type=str, nargs='+', help='Latex documents to compile')
+    parser.add_argument('--build_dir', dest='build_dir', type=str, default=BUILD_DIR, help='Directory holding a build directory per variant')
+    parser.add_argument('--latexmk', dest='latexmk', type=str, default='latexmk', help='latexmk command')
+    parser.add_argument('--no_format', dest='use_format', action='store_false', default=True, help="Don't precompile the static preamble into a format")
+    parser.add_argument('--engine', dest='engine', type=str, default=ENGINE, help='Latex engine latexmk runs')
+    parser.add_argument('--no_report', dest='report', action='store_false', default=True, help="Don't time each latex pass or record why it reran")
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=None, help='Number of variants to compile at once, default all of them')
+    parser.add_argument('-d', dest='debug', type=str, default='critical', choices = ['debug', 'info', 'error', 'critical'], help='Produce debug output')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=getattr(logging, args.debug.upper()))
+    logger = logging.getLogger("build_pdfs")
+
+    start = time.perf_counter()
+    results = build_pdfs(args.tex_files, args.build_dir, args.latexmk, logger, args.jobs, args.use_format, args.engine, args.report)
+    for tex_file, (seconds, succeeded, passes, build, fmt) in results.items():
+        saved = f", format saved ~{passes * format_info(fmt)['per_pass_saving']:.2f}s" if fmt and format_info(fmt) else ''
+        print(f"{tex_file:<30}{seconds:>8.2f}s  {passes} passes{saved}{'' if succeeded else '  FAILED'}")
+    print(f"{'total':<30}{time.perf_counter() - start:>8.2f}s")
+    for tex_file, (seconds, succeeded, passes, build, fmt) in results.items():
+        if build:
+            print(summary(build))
+    if not all(result[1] for result in results.values()):
+        sys.exit(1)
+
+# Start program
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import argparse
+import logging
+import os
+import csv
+import re
+from tempfile import NamedTemporaryFile
+from cv_utils import probe_url, check_urls, replace_with_backup, UrlCache, URL_CACHE_FILE, URL_CACHE_TTL_DAYS, PERMANENT_REDIRECT_CODES
+from cv_utils import HttpClient, set_default_http_client, load_url_policy, set_default_url_policy, CONNECT_TIMEOUT, READ_TIMEOUT, MAX_HOST_FAILURES, URL_POLICY_FILE
+
+# url = {...} or url = "...", in any case like bibtex's own field names
+BIB_URL_RE = re.compile(r'\burl\s*=\s*(?:\{(.*?)\}|"(.*?)")', re.IGNORECASE)
+URL_PREFIXES = ('http://', 'https://')
+
+def csv_encoding(csv_file):
+    with open(csv_file, 'rb') as f:
+        return 'utf-8-sig' if f.read(3) == b'\xef\xbb\xbf' else 'utf-8'
+
+def find_csv_urls(csv_file):
+    urls = []
+    with open(csv_file, 'r', newline='', encoding=csv_encoding(csv_file)) as csv_f:
+        for row in csv.DictReader(csv_f):
+            for value in row.values():
+                # skip templates such as conference_keys.csv's <year> urls
+                if value and value.strip().startswith(URL_PREFIXES) and '<' not in value:
+                    urls.append(value.strip())
+    return urls
+
+def find_bib_urls(bib_file):
+    with open(bib_file, 'r', encoding='utf-8') as bib_f:
+        return [bib_url(match) for match in BIB_URL_RE.finditer(bib_f.read())]
+
+def bib_url(match):
+    return (match.group(1) if match.group(1) is not None else match.group(2)).strip()
+
+def find_source_urls(filename):
+    return find_bib_urls(filename) if filename.endswith('.bib') else find_csv_urls(filename)
+
+# map each url that only redirects permanently to a working final url onto that final url.
+# A temporary redirect (302, 303, 307) anywhere in the chain may change, so the url is kept.
+def canonical_urls(urls, logger, cache=None):
+    canonical = {}
+    for url, (status, final_url, redirects) in check_urls(urls, check=probe_url, cache=cache).items():
+        if len(redirects) > 1:
+            logger.info(' -> '.join(f"{hop} ({hop_status})" for hop, hop_status in redirects))
+        if status == 200 and final_url != url and all(hop_status in PERMANENT_REDIRECT_CODES for _, hop_status in redirects[:-1]):
+            canonical[url] = final_url
+    return canonical
+
+def rewrite_csv(csv_file, canonical, logger):
+    encoding = csv_encoding(csv_file)
+    tempfile = NamedTemporaryFile('w+t', newline='', encoding=encoding, delete=False,
+                                  dir=os.path.dirname(os.path.abspath(csv_file)))
+    logger.info(f"Using temporary file {tempfile.name}")
+    updated = False
+    with open(csv_file, 'r', newline='', encoding=encoding) as csv_f:
+        rows = csv.DictReader(csv_f)
+        tempwriter = csv.DictWriter(tempfile, rows.fieldnames)
+        tempwriter.writeheader()
+        for row in rows:
+            for field, value in row.items():
+                if value and value.strip() in canonical:
+                    logger.info(f"Rewriting {field} {value.strip()} to {canonical[value.strip()]}")
+                    row[field] = value.replace(value.strip(), canonical[value.strip()])
+                    updated = True
+            tempwriter.writerow(row)
+    tempfile.close()
+    if updated:
+        replace_with_backup(csv_file, tempfile.name)
+    else:
+        os.unlink(tempfile.name)
+    return updated
+
+def rewrite_bib(bib_file, canonical, logger):
+    with open(bib_file, 'r', encoding='utf-8') as bib_f:
+        bib_text = bib_f.read()
+
+    def replace(match):
+        url = bib_url(match)
+        if url not in canonical:
+            return match.group(0)
+        logger.info(f"Rewriting url {url} to {canonical[url]}")
+        return match.group(0).replace(url, canonical[url])
+
+    new_text = BIB_URL_RE.sub(replace, bib_text)
+    if new_text == bib_text:
+        return False
+    tempfile = NamedTemporaryFile('w+t', encoding='utf-8', delete=False, dir=os.path.dirname(os.path.abspath(bib_file)))
+    logger.info(f"Using temporary file {tempfile.name}")
+    tempfile.write(new_text)
+    tempfile.close()
+    replace_with_backup(bib_file, tempfile.name)
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='Rewrite URLs in bib/csv files to the final URL they redirect to')
+    parser.add_argument('files', type=str, nargs='+', help='Input bib or csv files')
+    parser.add_argument('-d', dest='debug', type=str, default='critical', choices = ['debug', 'info', 'error', 'critical'], help='Produce debug output')
+    parser.add_argument('--dry_run', dest='dry_run', default=False, action='store_true', help='Report redirects without rewriting any file')
+    parser.add_argument('--url_cache', dest='url_cache', type=str, default=URL_CACHE_FILE, help='URL status cache file, empty to disable')
+    parser.add_argument('--url_cache_ttl', dest='url_cache_ttl', type=float, default=URL_CACHE_TTL_DAYS, help='Days before a cached URL status is rechecked')
+    parser.add_argument('--refresh_urls', dest='refresh_urls', action='store_true', default=False, help='Ignore cached URL statuses and recheck every URL')
+    parser.add_argument('--connect_timeout', dest='connect_timeout', type=float, default=CONNECT_TIMEOUT, help='Seconds to wait for a connection to a host')
+    parser.add_argument('--read_timeout', dest='read_timeout', type=float, default=READ_TIMEOUT, help='Seconds to wait for a host to answer')
+    parser.add_argument('--max_host_failures', dest='max_host_failures', type=int, default=MAX_HOST_FAILURES, help='Consecutive failures before the remaining URLs of a host fail without being fetched, 0 to never give up')
+    parser.add_argument('--url_policy', dest='url_policy', type=str, default=URL_POLICY_FILE, help='CSV of skip/allow URL prefix rules')
+    args = parser.parse_args()
+
+    if (args.debug == 'debug'):
+        logging.basicConfig(level=logging.DEBUG)
+    elif (args.debug == 'info'):
+        logging.basicConfig(level=logging.INFO)
+    elif (args.debug == 'error'):
+        logging.basicConfig(level=logging.ERROR)
+
+    logger = logging.getLogger("canonical_urls")
+
+    set_default_http_client(HttpClient(connect_timeout=args.connect_timeout, read_timeout=args.read_timeout, max_host_failures=args.max_host_failures))
+    set_default_url_policy(load_url_policy(args.url_policy))
+    cache = UrlCache(args.url_cache, ttl_days=args.url_cache_ttl, refresh=args.refresh_urls) if args.url_cache else None
+    urls = []
+    for filename in args.files:
+        urls.extend(find_source_urls(filename))
+    canonical = canonical_urls(urls, logger, cache)
+    if cache:
+        cache.close()
+
+    print(f"{len(canonical)} of {len(set(urls))} urls redirect to a working final url.")
+    if args.dry_run:
+        for url, final_url in canonical.items():
+            print(f"{url} -> {final_url}")
+        return
+    for filename in args.files:
+        if filename.endswith('.bib'):
+            updated = rewrite_bib(filename, canonical, logger)
+        else:
+            updated = rewrite_csv(filename, canonical, logger)
+        if updated:
+            print(f"Rewrote {filename}, original kept as {os.path.splitext(filename)[0] + '-bak' + os.path.splitext(filename)[1]}")
+
+# Start program
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,42 @@
 #!/usr/bin/env python3
 
-from pylatexenc.latexencode  import unicode_to_latex
-from pylatexenc.latex2text import LatexNodes2Text
-import urllib.request
-import ssl
+from collections import defaultdict, deque, OrderedDict
+from functools import partial, lru_cache
+import hashlib
+import importlib
+import io
+import locale
+import os
+import csv
+import threading
+import time
 import re
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
-from xml.sax.saxutils import escape
 import sys
-import dateutil.parser as dparser
+from phase_profile import phase, profiled, profiled_sorted, add_profile_args, check_profile_args, profile_run
+
+# stands in for a module that is only imported once one of its attributes is used, so a
+# generator only pays for the libraries it calls. import_module holds the import lock, so
+# the first use may come from any thread.
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+latexencode = LazyModule('pylatexenc.latexencode')
+latex2text = LazyModule('pylatexenc.latex2text')
+dparser = LazyModule('dateutil.parser')
+dateutil_relativedelta = LazyModule('dateutil.relativedelta')
+saxutils = LazyModule('xml.sax.saxutils')
+httplib = LazyModule('http.client')
+urllib_parse = LazyModule('urllib.parse')
+futures = LazyModule('concurrent.futures')
+shutil = LazyModule('shutil')
+socket = LazyModule('socket')
+sqlite3 = LazyModule('sqlite3')
+ssl = LazyModule('ssl')
+uuid = LazyModule('uuid')
 
 
 def ordinal(n: int):
@@ -19,38 +46,505 @@ def ordinal(n: int):
         suffix = ['th', 'st', 'nd', 'rd', 'th'][min(n % 10, 4)]
     return str(n) + suffix
 
+# the same names, venues and titles are encoded over and over, across generators and
+# across the profiles of a batch (see cvbatch.py)
+@lru_cache(maxsize=65536)
+def cached_latex_format(str):
+    return latexencode.unicode_to_latex(str.strip())
+
+# profiled outside the cache, so the latex-encode calls include cache hits
+@profiled('latex-encode')
 def latex_format(str):
-    return unicode_to_latex(str.strip())
+    return cached_latex_format(str)
+
+# parsed input files, shared by every generator run in the same process (see cvbuild.py).
+# Files are only read again once they change and only parsed again if their contents are
+# new, so profiles with identical copies of a file share one parse (see cvbatch.py).
+MAX_PARSED_CONTENTS = 64
+parsed_inputs = {}
+parsed_contents = OrderedDict()
+
+def parse_input(filename, parse):
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), parse.__name__)
+    version = (stat.st_mtime_ns, stat.st_size)
+    if key not in parsed_inputs or parsed_inputs[key][0] != version:
+        with phase('load'), open(filename, 'rb') as f:
+            parsed_inputs[key] = (version, hashlib.sha256(f.read()).hexdigest())
+    content_key = (parsed_inputs[key][1], parse.__name__)
+    if content_key in parsed_contents:
+        parsed_contents.move_to_end(content_key)
+    else:
+        with phase('parse'):
+            parsed_contents[content_key] = parse(filename)
+        if len(parsed_contents) > MAX_PARSED_CONTENTS:
+            parsed_contents.popitem(last=False)
+    return parsed_contents[content_key]
+
+def parse_csv(csv_file):
+    with open(csv_file, 'r', newline='', encoding='utf-8-sig') as csv_f:
+        return list(csv.DictReader(csv_f))
+
+# returns the rows of csv_file as dicts, copied so callers can't change each other's rows
+def read_csv(csv_file):
+    return [dict(row) for row in parse_input(csv_file, parse_csv)]
+
+# {row[field]: row} keeping the first row for each value, shared between callers so it
+# must not be modified
+csv_indexes = {}
+
+def read_csv_index(csv_file, field):
+    rows = parse_input(csv_file, parse_csv)
+    key = (id(rows), field)
+    if key not in csv_indexes or csv_indexes[key][0] is not rows:
+        index = {}
+        for row in rows:
+            index.setdefault(row[field], row)
+        csv_indexes[key] = (rows, index)
+    return csv_indexes[key][1]
+
+def parse_bib_file(bib_file):
+    from pybtex.database import parse_file
+    return parse_file(bib_file)
+
+# returns bib_file parsed by pybtex, shared between callers so it must not be modified
+def read_bib(bib_file):
+    return parse_input(bib_file, parse_bib_file)
+
+# stable CCV recordId derived from the fields that identify the record, so regenerating
+# unchanged data gives byte for byte the same xml
+def record_id(*fields):
+    return uuid.uuid5(uuid.NAMESPACE_OID, '\n'.join(str(field) for field in fields)).hex
+
+# every file opened with open_output in this process, see cvbuild.py
+opened_outputs = []
+
+class OutputFile(io.StringIO):
+    # text file that is only written on close, and only if its contents changed, so
+    # make and latexmk don't see a new timestamp on an identical file
+    def __init__(self, filename):
+        super().__init__()
+        self.filename = filename
 
-def check_url(url):
-    if url.startswith("mailto") or url.startswith('https://www.linkedin.com'):
-        return 'skipped'
+    def close(self):
+        if not self.closed:
+            write_if_changed(self.filename, self.getvalue())
+        super().close()
+
+def open_output(filename):
+    opened_outputs.append(filename)
+    return OutputFile(filename)
+
+# returns whether filename was written; text is encoded the way open(filename, 'w') would
+@profiled('write')
+def write_if_changed(filename, text):
+    data = text.replace('\n', os.linesep).encode(locale.getpreferredencoding(False))
     try:
-        req = urllib.request.Request(
-            url, 
-            data=None, 
-            headers={
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_9_3) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/35.0.1916.47 Safari/537.36'
-            }
-        )
-    except Exception as e:
-        return "check_url creation exception: " + str(e) + " on  " + url
+        with open(filename, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    with open(filename, 'wb') as f:
+        f.write(data)
+    return True
+
+URL_CACHE_FILE = '.url_cache.sqlite'
+URL_CACHE_TTL_DAYS = 30
+
+class UrlCache:
+    # on-disk record of url check results so unchanged links aren't refetched every run
+    def __init__(self, path=URL_CACHE_FILE, ttl_days=URL_CACHE_TTL_DAYS, refresh=False):
+        self.ttl = ttl_days * 24 * 60 * 60
+        self.refresh = refresh
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, status TEXT, final_url TEXT, checked REAL, redirects TEXT)')
+        # caches written before redirect chains were recorded
+        if 'redirects' not in [column[1] for column in self.db.execute('PRAGMA table_info(urls)')]:
+            self.db.execute("ALTER TABLE urls ADD COLUMN redirects TEXT DEFAULT ''")
+        self.db.commit()
+
+    # returns (status, final_url, redirects) if url was checked within the ttl, otherwise None.
+    # redirects is stored one "url status" hop per line.
+    def get(self, url):
+        if self.refresh:
+            return None
+        with self.lock:
+            row = self.db.execute('SELECT status, final_url, checked, redirects FROM urls WHERE url = ?', (url,)).fetchone()
+        if row is None or time.time() - row[2] > self.ttl:
+            return None
+        status = int(row[0]) if row[0].isdigit() else row[0]
+        return status, row[1], [cached_hop(hop) for hop in row[3].split('\n')] if row[3] else [(url, None)]
+
+    def put(self, url, status, final_url, redirects=None):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO urls (url, status, final_url, checked, redirects) VALUES (?, ?, ?, ?, ?)',
+                            (url, str(status), final_url, time.time(), '\n'.join(f"{hop} {hop_status}" for hop, hop_status in redirects or [(url, None)])))
+            self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+# caches written before hop statuses were recorded only hold the url
+def cached_hop(line):
+    hop, _, status = line.partition(' ')
+    return hop, int(status) if status.isdigit() else None
+
+URL_POLICY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'url_policy.csv')
+URL_POLICY_ACTIONS = ('skip', 'allow')
+
+class UrlPolicy:
+    # ordered (action, prefix) rules, the first rule whose prefix matches a url decides
+    # whether it is skipped; urls no rule matches are checked
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+
+    def skip(self, url):
+        for action, prefix in self.rules:
+            if url.startswith(prefix):
+                return action == 'skip'
+        return False
+
+def load_url_policy(policy_file=URL_POLICY_FILE):
+    rules = []
+    with open(policy_file, 'r', newline='', encoding="UTF-8-sig") as policy_f:
+        for row in csv.DictReader(policy_f):
+            action = row['Action'].strip()
+            if action not in URL_POLICY_ACTIONS:
+                raise ValueError(f"Unknown url policy action {action} in {policy_file}")
+            rules.append((action, row['Prefix'].strip()))
+    return UrlPolicy(rules)
+
+url_policy = None
+
+def default_url_policy():
+    global url_policy
+    if url_policy is None:
+        url_policy = load_url_policy() if os.path.exists(URL_POLICY_FILE) else UrlPolicy()
+    return url_policy
+
+# None restores the policy from URL_POLICY_FILE
+def set_default_url_policy(policy):
+    global url_policy
+    url_policy = policy
+
+def skip_url(url):
+    return default_url_policy().skip(url)
+
+TIMED_PHASES = ('dns', 'connect', 'tls', 'ttfb')
+
+def new_phases():
+    return dict.fromkeys(TIMED_PHASES, 0.0)
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_9_3) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/35.0.1916.47 Safari/537.36'
+MAX_REDIRECTS = 10
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+PERMANENT_REDIRECT_CODES = (301, 308)
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+# consecutive failed checks before the rest of a host's urls fail without being fetched
+MAX_HOST_FAILURES = 3
+CIRCUIT_OPEN = "check_url circuit open"
+
+class HttpClient:
+    # keeps idle keep-alive connections per host and shares one ssl context between them.
+    # proxy sends every request to a local (host, port) stand-in such as url_replay.ReplayServer,
+    # recorder is told about every response, see url_replay.UrlRecorder, and timer gets the
+    # dns/connect/tls/ttfb timings of every url, see url_timings.UrlTimer.
+    # Once a host fails max_host_failures checks in a row, fetch_url stops contacting it.
+    def __init__(self, proxy=None, recorder=None, timer=None, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, max_host_failures=MAX_HOST_FAILURES):
+        self.context = ssl._create_unverified_context()
+        self.lock = threading.Lock()
+        self.idle = defaultdict(list)
+        self.connections_opened = 0
+        self.proxy = proxy
+        self.recorder = recorder
+        self.timer = timer
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_host_failures = max_host_failures
+        self.host_failures = defaultdict(int)
+
+    # number of consecutive failures if the host's circuit is open, otherwise 0
+    def circuit_open(self, host):
+        with self.lock:
+            failures = self.host_failures[host]
+        return failures if self.max_host_failures and failures >= self.max_host_failures else 0
+
+    def record_outcome(self, host, failed):
+        with self.lock:
+            if failed:
+                self.host_failures[host] += 1
+            else:
+                self.host_failures[host] = 0
+
+    def _connection(self, key, phases):
+        with self.lock:
+            if self.idle[key]:
+                return self.idle[key].pop(), True
+            self.connections_opened += 1
+        scheme, host, port = key
+        if self.proxy:
+            conn = httplib.HTTPConnection(*self.proxy, timeout=self.read_timeout)
+        elif scheme == 'https':
+            conn = httplib.HTTPSConnection(host, port, timeout=self.read_timeout, context=self.context)
+        else:
+            conn = httplib.HTTPConnection(host, port, timeout=self.read_timeout)
+        self._open(conn, phases)
+        return conn, False
+
+    # connect by hand instead of leaving it to http.client so each phase can be timed
+    def _open(self, conn, phases):
+        start = time.perf_counter()
+        addresses = socket.getaddrinfo(conn.host, conn.port, type=socket.SOCK_STREAM)
+        resolved = time.perf_counter()
+        phases['dns'] += resolved - start
+        for family, socktype, proto, canonname, address in addresses:
+            try:
+                sock = socket.create_connection(address[:2], self.connect_timeout)
+                break
+            except OSError as e:
+                error = e
+        else:
+            raise error
+        connected = time.perf_counter()
+        phases['connect'] += connected - resolved
+        sock.settimeout(self.read_timeout)
+        if isinstance(conn, httplib.HTTPSConnection):
+            try:
+                sock = self.context.wrap_socket(sock, server_hostname=conn.host)
+            except Exception:
+                sock.close()
+                raise
+            phases['tls'] += time.perf_counter() - connected
+        conn.sock = sock
+
+    def _release(self, key, conn, response):
+        if response.will_close:
+            conn.close()
+        else:
+            with self.lock:
+                self.idle[key].append(conn)
+
+    def _request(self, method, url, phases):
+        parts = urllib_parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError("unknown url type: " + url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        # proxies take the whole url as the request target
+        if self.proxy:
+            path = url
+        headers = {'User-Agent': USER_AGENT}
+        if method == 'GET':
+            headers['Range'] = 'bytes=0-0'
+        while True:
+            start = time.perf_counter()
+            conn, reused = None, False
+            try:
+                conn, reused = self._connection(key, phases)
+                sent = time.perf_counter()
+                conn.request(method, path, headers=headers)
+                response = conn.getresponse()
+                phases['ttfb'] += time.perf_counter() - sent
+            except (httplib.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                if conn:
+                    conn.close()
+                # the server dropped an idle connection, retry on a fresh one
+                if not reused:
+                    if self.recorder:
+                        self.recorder.error(method, url, e, time.perf_counter() - start)
+                    raise
+                continue
+            except Exception as e:
+                if self.recorder:
+                    self.recorder.error(method, url, e, time.perf_counter() - start)
+                raise
+            if self.recorder:
+                self.recorder.response(method, url, response, time.perf_counter() - start)
+            return key, conn, response
+
+    def _follow(self, method, url, phases):
+        redirects = []
+        for _ in range(MAX_REDIRECTS + 1):
+            key, conn, response = self._request(method, url, phases)
+            if method == 'HEAD':
+                response.read()
+                self._release(key, conn, response)
+            else:
+                # only the headers matter, never download the body
+                conn.close()
+            location = response.getheader('Location')
+            redirects.append((url, response.status))
+            if response.status in REDIRECT_CODES and location:
+                url = urllib_parse.urljoin(url, location)
+                continue
+            return response, redirects
+        raise httplib.HTTPException("too many redirects")
+
+    # returns (response, (url, status) of every hop from the original to the final url), falling
+    # back to a ranged GET when HEAD isn't answered with a 2xx. Time spent in each phase is added to phases.
+    def probe(self, url, phases=None):
+        phases = phases if phases is not None else new_phases()
+        try:
+            response, redirects = self._follow('HEAD', url, phases)
+            if 200 <= response.status < 300:
+                return response, redirects
+        # errors a ranged GET won't get past either
+        except (ValueError, TimeoutError, socket.gaierror, ConnectionRefusedError):
+            raise
+        except Exception:
+            pass
+        return self._follow('GET', url, phases)
+
+    def close(self):
+        with self.lock:
+            for conns in self.idle.values():
+                for conn in conns:
+                    conn.close()
+            self.idle.clear()
+
+http_client = None
+
+def default_http_client():
+    global http_client
+    if http_client is None:
+        http_client = HttpClient()
+    return http_client
+
+# swap the client used by check_url, e.g. for recording or replaying; None restores the default
+def set_default_http_client(client):
+    global http_client
+    if http_client is not None and http_client is not client:
+        http_client.close()
+    http_client = client
+
+# returns (status, final url, (url, status) of every hop from url to the final url)
+def fetch_url(url, client=None):
+    client = client or default_http_client()
+    host = url_host(url)
+    failures = client.circuit_open(host)
+    if failures:
+        return f"{CIRCUIT_OPEN}: {failures} consecutive failures from {host} on  {url}", url, [(url, None)]
+    phases = new_phases()
+    start = time.perf_counter()
     try:
-        return urllib.request.urlopen(req, context=ssl._create_unverified_context()).getcode()
+        response, redirects = client.probe(url, phases)
+    except ValueError as e:
+        status, redirects = "check_url creation exception: " + str(e) + " on  " + url, [(url, None)]
     except Exception as e:
-        return "check_url urlopen exception: " + str(e) + " on  " + url
+        status, redirects = "check_url urlopen exception: " + str(e) + " on  " + url, [(url, None)]
+        client.record_outcome(host, True)
+    else:
+        client.record_outcome(host, False)
+        # a ranged GET answers 206 for a link that works
+        status = 200 if response.status == 206 else response.status
+        if status >= 400:
+            status = f"check_url urlopen exception: HTTP Error {status}: {response.reason} on  {url}"
+    if client.recorder:
+        client.recorder.result(url, status, redirects)
+    if client.timer:
+        client.timer.result(url, status, phases, time.perf_counter() - start)
+    return status, redirects[-1][0], redirects
+
+# whether status says something lasting about the url: it worked or the url is gone. Timeouts,
+# network errors, 5xx and tripped circuits are checked again next run instead of being cached.
+def definitive_status(status):
+    return isinstance(status, int) or re.search(r'HTTP Error (404|410):', status) is not None
+
+# like fetch_url, but honours the skip list and the cache
+def probe_url(url, cache=None):
+    if skip_url(url):
+        return 'skipped', url, [(url, None)]
+    cached = cache.get(url) if cache else None
+    if cached:
+        return cached
+    status, final_url, redirects = fetch_url(url)
+    if cache and definitive_status(status):
+        cache.put(url, status, final_url, redirects)
+    return status, final_url, redirects
+
+def check_url(url, cache=None):
+    return probe_url(url, cache)[0]
+
+# keep a copy of the original as <name>-bak<ext> and move the rewritten temporary file into its
+# place in one step, so filename is never missing or half written. The temporary file must be on
+# the same filesystem, i.e. created in the same directory.
+def replace_with_backup(filename, tempfile_name):
+    shutil.copy2(filename, os.path.splitext(filename)[0]+'-bak'+ os.path.splitext(filename)[1])
+    shutil.copymode(filename, tempfile_name)
+    os.replace(tempfile_name, filename)
+
+# global and per-host caps on simultaneous url checks
+MAX_WORKERS = 16
+MAX_PER_HOST = 4
+
+def url_host(url):
+    return urllib_parse.urlparse(url).hostname or ''
+
+# urls may be a generator, it is only consumed while workers are free so checking
+# starts before it is exhausted. on_result(url, result) is called as each check finishes.
+def check_urls(urls, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST, check=check_url, cache=None, on_result=None):
+    if cache:
+        check = partial(check, cache=cache)
+    source = iter(urls)
+    seen = set()
+    # urls waiting for their host to drop under its cap, so one slow host can't hold every worker
+    pending = defaultdict(deque)
+
+    results = {}
+    running = {}
+    active = defaultdict(int)
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+
+        def submit(host, url):
+            running[pool.submit(check, url)] = (host, url)
+            active[host] += 1
+
+        while True:
+            # hand out waiting urls round-robin across hosts that are under their cap
+            for host in list(pending):
+                while pending[host] and active[host] < max_per_host and len(running) < max_workers:
+                    submit(host, pending[host].popleft())
+                if not pending[host]:
+                    del pending[host]
+            while source and len(running) < max_workers:
+                url = next(source, None)
+                if url is None:
+                    source = None
+                elif url not in seen:
+                    seen.add(url)
+                    host = url_host(url)
+                    if active[host] < max_per_host:
+                        submit(host, url)
+                    else:
+                        pending[host].append(url)
+            if not running:
+                break
+            done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                host, url = running.pop(future)
+                active[host] -= 1
+                results[url] = future.result()
+                if on_result:
+                    on_result(url, results[url])
+    return results
     
+@profiled('date-parse')
 def extract_year(date_str,increment=0):
     if date_str:
         date = dparser.parse(date_str,fuzzy=False)
-        return (date + relativedelta(years=increment)).strftime('%Y')
+        return (date + dateutil_relativedelta.relativedelta(years=increment)).strftime('%Y')
     else:
         return ''
 
+@profiled('date-parse')
 def extract_month(date_str,increment=0):
     if date_str:
         date = dparser.parse(date_str,fuzzy=False)
-        return (date + relativedelta(months=increment)).strftime('%m')
+        return (date + dateutil_relativedelta.relativedelta(months=increment)).strftime('%m')
     else:
         return ''
     
@@ -58,12 +552,13 @@ def format_xml(str):
     # remove commas from numbers
     if re.match('^[0-9,]*$',str):
         str = str.replace(',','')
-    return escape(str.strip()) if str else ''
+    return saxutils.escape(str.strip()) if str else ''
 
 def field_present(field_name, row):
     return (field_name in row.keys() and row[field_name])
 
+@profiled('latex-decode')
 def latex2xml(str):
-    return escape(LatexNodes2Text().latex_to_text(str.strip())) if str else ''
+    return saxutils.escape(latex2text.LatexNodes2Text().latex_to_text(str.strip())) if str else ''
 
 
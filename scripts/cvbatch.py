@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import logging
+import os
+import sys
+import time
+import traceback
+import cvbuild
+from build_pdfs import build_pdfs, BUILD_DIR
+from cv_utils import check_url, check_urls, read_csv, UrlCache, URL_CACHE_FILE, URL_CACHE_TTL_DAYS
+from latex_format import ENGINE
+
+PROFILE_FILE = 'cv.bib'
+GENERATED_DIR = 'generated/'
+
+# each directory is a profile if it has a cv.bib, otherwise every subdirectory that has one is
+def find_profiles(dirs):
+    profiles = []
+    for directory in dirs:
+        if os.path.isfile(os.path.join(directory, PROFILE_FILE)):
+            profiles.append(directory)
+        else:
+            profiles += sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                               if os.path.isfile(os.path.join(directory, name, PROFILE_FILE)))
+    return profiles
+
+# builds one profile from inside its directory, like make would, so the tex files find
+# generated/ and sections/. Runs in a pool worker that goes on to build other profiles,
+# which reuse the parsed inputs, csv indexes and latex encodings it has cached. Returns
+# {profile, seconds, targets: {target: seconds}, pdfs: {tex_file: seconds}, error}.
+def build_profile(profile, targets, debug, tex_files=(), latexmk='latexmk', engine=ENGINE):
+    logger = logging.getLogger("cvbatch")
+    result = {'profile': profile, 'targets': {}, 'pdfs': {}, 'error': None}
+    start = time.perf_counter()
+    cwd = os.getcwd()
+    try:
+        os.chdir(profile)
+        result['targets'] = cvbuild.build(targets, '', GENERATED_DIR, debug, logger)
+        if tex_files:
+            built = build_pdfs(tex_files, BUILD_DIR, latexmk, logger, 1, engine=engine, report=False)
+            result['pdfs'] = {tex_file: seconds for tex_file, (seconds, succeeded, passes, report, fmt) in built.items()}
+            failed = [tex_file for tex_file, values in built.items() if not values[1]]
+            if failed:
+                result['error'] = f"latexmk failed on {', '.join(failed)}"
+    # generators exit through argparse on bad arguments
+    except (Exception, SystemExit):
+        result['error'] = traceback.format_exc()
+    finally:
+        os.chdir(cwd)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+# builds every profile, jobs at a time, and returns their results in the order they finished.
+# A profile that fails, or takes its worker down with it, is reported and the rest carry on.
+def build_profiles(profiles, targets, debug, logger, jobs=1, tex_files=(), latexmk='latexmk', engine=ENGINE):
+    results = []
+    def finished(result):
+        results.append(result)
+        if result['error']:
+            logger.error(f"{result['profile']} failed:\n{result['error']}")
+        else:
+            logger.info(f"Built {result['profile']} in {result['seconds']:.2f}s")
+
+    if jobs <= 1:
+        for profile in profiles:
+            finished(build_profile(os.path.abspath(profile), targets, debug, tex_files, latexmk, engine))
+        return results
+    with ProcessPoolExecutor(jobs) as pool:
+        futures = {pool.submit(build_profile, os.path.abspath(profile), targets, debug, tex_files, latexmk, engine): profile
+                   for profile in profiles}
+        for future in as_completed(futures):
+            try:
+                finished(future.result())
+            except Exception:
+                finished({'profile': os.path.abspath(futures[future]), 'seconds': 0.0, 'targets': {}, 'pdfs': {},
+                          'error': traceback.format_exc()})
+    return results
+
+# the conference urls in a profile's TPCs.csv, as gen_tpcs would link them
+def profile_urls(profile):
+    import gen_tpcs
+    tpcs_file, conferences_file = [os.path.join(profile, input) for input in cvbuild.TARGETS['tpcs'][1]]
+    if not os.path.exists(tpcs_file):
+        return set()
+    conferences = gen_tpcs.read_csv_index(conferences_file, gen_tpcs.CONF_SHORT_STR)
+    urls = {gen_tpcs.format_conf(tpc, conferences, tpc[gen_tpcs.CONF_STR], tpc[gen_tpcs.URL_STR])[1] for tpc in read_csv(tpcs_file)}
+    return urls - {'', 'none'}
+
+# checks the urls of every profile at once, so a conference url that appears in many
+# profiles is fetched once, and returns {profile: {url: status}} for the ones that aren't ok
+def check_profile_urls(profiles, cache=None, check=check_url):
+    urls = {profile: profile_urls(profile) for profile in profiles}
+    statuses = check_urls(sorted(set().union(*urls.values())), check=check, cache=cache)
+    return {profile: {url: statuses[url] for url in sorted(urls[profile]) if str(statuses[url]) not in ('200', 'skipped')}
+            for profile in profiles}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate the CVs of many people at once, one directory of csv files and cv.bib each')
+    parser.add_argument('profiles', type=str, nargs='+', help='Profile directories, or directories whose subdirectories are profiles')
+    parser.add_argument('--target', dest='targets', type=str, action='append', default=[], help=f"Target to build out of {', '.join(cvbuild.TARGETS)}, can be repeated, default all of them")
+    parser.add_argument('--pdf', dest='tex_files', type=str, action='append', default=[], help="Document in each profile to compile after generating, e.g. cv-new.tex, can be repeated")
+    parser.add_argument('--latexmk', dest='latexmk', type=str, default='latexmk', help='latexmk command for --pdf')
+    parser.add_argument('--engine', dest='engine', type=str, default=ENGINE, help='Latex engine latexmk runs')
+    parser.add_argument('--check_urls', dest='check_urls', action='store_true', default=False, help="Check every profile's conference urls once the CVs are built")
+    parser.add_argument('--url_cache', dest='url_cache', type=str, default=URL_CACHE_FILE, help='URL status cache file used by --check_urls, empty to disable')
+    parser.add_argument('--url_cache_ttl', dest='url_cache_ttl', type=float, default=URL_CACHE_TTL_DAYS, help='Days before a cached URL status is rechecked')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=os.cpu_count(), help='Number of profiles to build at once, default one per core')
+    parser.add_argument('-d', dest='debug', type=str, default='critical', choices = ['debug', 'info', 'error', 'critical'], help='Produce debug output')
+    args = parser.parse_args(argv)
+    unknown = [target for target in args.targets if target not in cvbuild.TARGETS]
+    if unknown:
+        parser.error(f"unknown targets {', '.join(unknown)}, choose from {', '.join(cvbuild.TARGETS)}")
+
+    logging.basicConfig(level=getattr(logging, args.debug.upper()))
+    logger = logging.getLogger("cvbatch")
+
+    start = time.perf_counter()
+    profiles = find_profiles(args.profiles)
+    targets = list(dict.fromkeys(args.targets)) or list(cvbuild.TARGETS)
+    results = build_profiles(profiles, targets, args.debug, logger, args.jobs, args.tex_files, args.latexmk, args.engine)
+    for result in sorted(results, key=lambda result: result['profile']):
+        slowest = max(result['targets'], key=result['targets'].get, default=None)
+        detail = 'FAILED ' + result['error'].strip().split('\n')[-1] if result['error'] else (f"slowest {slowest} {result['targets'][slowest]:.2f}s" if slowest else 'up to date')
+        print(f"{os.path.relpath(result['profile']):<40}{result['seconds']:>8.2f}s  {detail}")
+    failed = [result for result in results if result['error']]
+    busy = sum(result['seconds'] for result in results)
+    elapsed = time.perf_counter() - start
+    print(f"{len(results) - len(failed)} of {len(results)} profiles built in {elapsed:.2f}s, "
+          f"{busy:.2f}s of work ({busy / elapsed if elapsed else 0:.1f}x)")
+    if args.check_urls:
+        cache = UrlCache(args.url_cache, ttl_days=args.url_cache_ttl) if args.url_cache else None
+        for profile, broken in check_profile_urls(profiles, cache).items():
+            for url, status in broken.items():
+                print(f"{os.path.relpath(profile)}: {url} {status}")
+        if cache:
+            cache.close()
+    if failed:
+        sys.exit(1)
+
+# Start program
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+import argparse
+from contextlib import nullcontext
+from datetime import date
+import glob
+import hashlib
+import importlib
+import json
+import logging
+import os
+import re
+import time
+from cv_utils import LazyModule
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_FILE = '.cvbuild_manifest.json'
+SECTION_DIR = 'sections'
+WATCH_INTERVAL = 0.2
+IMPORT_RE = re.compile(r'^\s*(?:from\s+([\w.]+)\s+import|import\s+([\w., ]+))', re.MULTILINE)
+
+# only needed once there are generators to run on several cores
+futures = LazyModule('concurrent.futures')
+
+# the Makefile's target groups: the generator that builds each one and its input files.
+# Each generator runs once per build however many of its files are out of date, in a pool
+# worker when there are several jobs. Targets sharing an input (cv.bib, students.csv,
+# funding.csv) each parse it again in their own worker. Generators are imported only when they run, so a
+# build where nothing changed doesn't pay for their imports.
+TARGETS = {
+    'bib': ('gen_bibtex', ['cv.bib']),
+    'students': ('gen_students', ['students.csv']),
+    'teaching': ('gen_teaching', ['classes.csv']),
+    'talks': ('gen_talks', ['talks.csv']),
+    'tpcs': ('gen_tpcs', ['TPCs.csv', 'conference_keys.csv']),
+    'funding': ('gen_funding', ['funding.csv']),
+    'cases': ('gen_cases', ['cases.csv']),
+    'collabs': ('gen_collaborators', ['cv.bib', 'students.csv', 'funding.csv', 'people.csv']),
+}
+
+# input files a generator rewrites, any other generator reading them has to run after it
+UPDATES = {
+    'collabs': ['people.csv'],
+}
+
+# target -> the selected targets that have to finish before it can start
+def target_dependencies(targets):
+    return {target: {other for other in targets if other != target and
+                     set(UPDATES.get(other, [])) & set(TARGETS[target][1])} for target in targets}
+
+# longest chain of dependent targets weighted by how long each took, the lower bound
+# on a build no matter how many cores it gets
+def critical_path(times, dependencies):
+    finish = {}
+    path = {}
+    def visit(target):
+        if target not in finish:
+            before = max(dependencies[target], key=visit, default=None)
+            finish[target] = times.get(target, 0) + (finish[before] if before else 0)
+            path[target] = (path[before] if before else []) + [target]
+        return finish[target]
+    last = max(dependencies, key=visit, default=None)
+    return (path[last], finish[last]) if last else ([], 0)
+
+def generator_args(target, input_dir, out_dir, debug):
+    generator, inputs = TARGETS[target]
+    argv = [os.path.join(input_dir, input) for input in inputs] + ['--out_dir', out_dir]
+    # gen_bibtex's -d is a plain switch
+    if generator == 'gen_bibtex':
+        return argv + (['-d'] if debug == 'debug' else [])
+    return argv + ['-d', debug]
+
+def file_hash(filename):
+    try:
+        with open(filename, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+# module and every scripts/ module it imports, directly or through another, at module level
+# or inside a function
+def script_imports(module, found=None):
+    found = found if found is not None else set()
+    found.add(module)
+    with open(os.path.join(SCRIPTS_DIR, module + '.py'), 'r', encoding='utf-8') as f:
+        statements = IMPORT_RE.findall(f.read())
+    for from_name, names in statements:
+        for name in [from_name] if from_name else [name.split()[0] for name in names.split(',')]:
+            if name not in found and os.path.exists(os.path.join(SCRIPTS_DIR, name + '.py')):
+                script_imports(name, found)
+    return found
+
+# everything a target's outputs depend on: its inputs, the code that generates it and
+# the date, since generators compare dates against today
+def target_signature(target, input_dir):
+    generator, inputs = TARGETS[target]
+    files = [os.path.join(input_dir, input) for input in inputs]
+    files += [os.path.join(SCRIPTS_DIR, module + '.py') for module in sorted(script_imports(generator))]
+    return {'files': {filename: file_hash(filename) for filename in files}, 'date': date.today().isoformat()}
+
+def load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_FILE), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_manifest(out_dir, manifest):
+    with open(os.path.join(out_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+def up_to_date(entry, signature):
+    return (entry is not None and entry['signature'] == signature and
+            all(file_hash(output) == output_hash for output, output_hash in entry['outputs'].items()))
+
+# runs in a pool worker, or inline for a single job so inputs parsed by one generator stay
+# cached for the next
+def run_target(target, input_dir, out_dir, debug):
+    start = time.perf_counter()
+    generator = importlib.import_module(TARGETS[target][0])
+    cv_utils = importlib.import_module('cv_utils')
+    del cv_utils.opened_outputs[:]
+    generator.main(generator_args(target, input_dir, out_dir, debug))
+    return time.perf_counter() - start, list(cv_utils.opened_outputs)
+
+# runs the targets whose signature or outputs changed since the last build, up to jobs at
+# a time once the targets they depend on are done, and returns {target: seconds} for the
+# ones that ran
+def build(targets, input_dir, out_dir, debug, logger, force=False, jobs=1):
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    dependencies = target_dependencies(targets)
+    pending = list(targets)
+    running = {}
+    times = {}
+    def finished(target, seconds, outputs):
+        times[target] = seconds
+        logger.info(f"Built {target} in {seconds:.2f}s")
+        # signed after the run, gen_collaborators updates people.csv
+        manifest[target] = {'signature': target_signature(target, input_dir),
+                            'outputs': {output: file_hash(output) for output in outputs}}
+        save_manifest(out_dir, manifest)
+
+    with futures.ProcessPoolExecutor(jobs) if jobs > 1 else nullcontext() as pool:
+        while pending or running:
+            waiting = set(pending) | set(running.values())
+            ready = [target for target in pending if not dependencies[target] & waiting]
+            if not ready and not running:
+                raise ValueError(f"circular dependencies between {', '.join(pending)}")
+            for target in ready:
+                pending.remove(target)
+                if not force and up_to_date(manifest.get(target), target_signature(target, input_dir)):
+                    logger.info(f"Skipping {target}, nothing it depends on changed")
+                elif pool is None:
+                    finished(target, *run_target(target, input_dir, out_dir, debug))
+                else:
+                    running[pool.submit(run_target, target, input_dir, out_dir, debug)] = target
+            if running:
+                done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    finished(running.pop(future), *future.result())
+    return times
+
+def watched_files(targets, input_dir):
+    files = {os.path.join(input_dir, input) for target in targets for input in TARGETS[target][1]}
+    return sorted(files | set(glob.glob(os.path.join(input_dir, SECTION_DIR, '*.tex'))))
+
+def snapshot(files):
+    stats = {}
+    for filename in files:
+        try:
+            stat = os.stat(filename)
+            stats[filename] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stats[filename] = None
+    return stats
+
+# polls the inputs and sections/ and rebuilds whatever a change affects, then compiles pdfs the
+# way "make pdfs" does. Everything runs in this process so parsed inputs stay cached between
+# rebuilds and only the files that changed are parsed again.
+def watch(targets, input_dir, out_dir, debug, logger, pdfs=(), latexmk='latexmk', interval=WATCH_INTERVAL, stop=None, engine=None):
+    last = snapshot(watched_files(targets, input_dir))
+    while not (stop and stop.is_set()):
+        time.sleep(interval)
+        current = snapshot(watched_files(targets, input_dir))
+        if current == last:
+            continue
+        changed = [filename for filename in sorted(set(current) | set(last)) if current.get(filename) != last.get(filename)]
+        start = time.perf_counter()
+        try:
+            times = build(targets, input_dir, out_dir, debug, logger)
+        except Exception:
+            # keep watching, the next save will probably fix it
+            logger.exception(f"Build failed after {', '.join(changed)} changed")
+            times = {}
+        else:
+            print(f"{', '.join(changed)} changed, built {', '.join(times) or 'nothing'} in {time.perf_counter() - start:.2f}s")
+        # gen_collaborators may have rewritten people.csv, don't count that as a change
+        last = snapshot(watched_files(targets, input_dir))
+        if pdfs and (times or any(os.path.dirname(filename) == os.path.join(input_dir, SECTION_DIR) for filename in changed)):
+            from build_pdfs import build_pdfs, BUILD_DIR
+            from latex_format import ENGINE
+            for tex_file, (seconds, succeeded, passes, report, fmt) in build_pdfs(pdfs, BUILD_DIR, latexmk, logger, engine=engine or ENGINE).items():
+                if succeeded:
+                    print(f"Compiled {tex_file} in {seconds:.2f}s")
+                else:
+                    logger.error(f"Compiling {tex_file} failed, see {os.path.join(BUILD_DIR, os.path.splitext(os.path.basename(tex_file))[0])}/")
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the CV generators in parallel, skipping generators whose inputs are unchanged')
+    parser.add_argument('targets', type=str, nargs='*', help=f"Targets to build out of {', '.join(TARGETS)}, all of them if none are given")
+    parser.add_argument('-d', dest='debug', type=str, default='critical', choices = ['debug', 'info', 'error', 'critical'], help='Produce debug output')
+    parser.add_argument('--input_dir', dest='input_dir', type=str, default='', help='Directory holding cv.bib and the csv files')
+    parser.add_argument('--out_dir', dest='out_dir', type=str, default='generated/', help='Output directory')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1, help='Number of generators to run at once, each in its own process')
+    parser.add_argument('--watch', dest='watch', action='store_true', default=False, help='Keep running and rebuild whenever an input or section file changes')
+    parser.add_argument('--pdf', dest='pdfs', type=str, action='append', default=[], help='Document to compile like "make pdfs" after each rebuild in watch mode, e.g. cv-new.tex, can be repeated')
+    parser.add_argument('--latexmk', dest='latexmk', type=str, default='latexmk', help='latexmk command for --pdf')
+    parser.add_argument('--engine', dest='engine', type=str, default=None, help='Latex engine latexmk runs for --pdf')
+    parser.add_argument('--force', dest='force', action='store_true', default=False, help='Run the generators even if nothing they depend on changed')
+    args = parser.parse_args()
+    unknown = [target for target in args.targets if target not in TARGETS]
+    if unknown:
+        parser.error(f"unknown targets {', '.join(unknown)}, choose from {', '.join(TARGETS)}")
+
+    # configure logging before any generator does, they all share the root logger here
+    logging.basicConfig(level=getattr(logging, args.debug.upper()))
+    logger = logging.getLogger("cvbuild")
+
+    start = time.perf_counter()
+    targets = list(dict.fromkeys(args.targets)) or list(TARGETS)
+    times = build(targets, args.input_dir, args.out_dir, args.debug, logger, args.force, args.jobs)
+    skipped = [target for target in targets if target not in times]
+    print(f"Built {', '.join(times) or 'nothing'}" + (f", skipped {', '.join(skipped)}" if skipped else '') +
+          f" in {time.perf_counter() - start:.2f}s")
+    if times:
+        path, seconds = critical_path(times, target_dependencies(targets))
+        print(f"Critical path {' -> '.join(path)} took {seconds:.2f}s")
+    if args.watch:
+        print(f"Watching {', '.join(watched_files(targets, args.input_dir))}")
+        try:
+            watch(targets, args.input_dir, args.out_dir, args.debug, logger, args.pdfs, args.latexmk, engine=args.engine)
+        except KeyboardInterrupt:
+            pass
+
+# Start program
+if __name__ == "__main__":
+    main()
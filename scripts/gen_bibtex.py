@@ -3,8 +3,6 @@
 # Currently I don't support patent generation in XML
 
 import argparse
-from pybtex.database import parse_file
-from pylatexenc.latex2text import LatexNodes2Text
 from difflib import SequenceMatcher
 from datetime import date
 import sys
@@ -12,11 +10,10 @@ import logging
 import csv
 import os
 import re
-import uuid
-from cv_utils import latex2xml, field_present
+from cv_utils import latex2xml, field_present, read_bib, open_output, record_id, profiled, add_profile_args, check_profile_args, profile_run
      
 def parse_bib(logger, bib_in_file, debug=False):
-    bib = parse_file(bib_in_file)
+    bib = read_bib(bib_in_file)
     
     num_conf_pubs = 0
     num_journal_pubs = 0
@@ -44,11 +41,12 @@ def parse_bib(logger, bib_in_file, debug=False):
     
     return bib, num_conf_pubs, num_journal_pubs, num_patent_pubs, num_other_pubs
 
+@profiled('render')
 def output_summary(logger, summary_tex='',  
                    num_conf_pubs=0, num_journal_pubs=0, num_patent_pubs=0, num_other_pubs=0,
                    debug=False):
      if summary_tex:        
-        summary_out = open(summary_tex, 'w')
+        summary_out = open_output(summary_tex)
         summary_str = (f"\\newcommand{{\\numconfpubs}}{{{num_conf_pubs}}}\n"
                         f"\\newcommand{{\\numjournalpubs}}{{{num_journal_pubs}}}\n"
                         f"\\newcommand{{\\numpatentpubs}}{{{num_patent_pubs}}}\n"
@@ -56,12 +54,298 @@ def output_summary(logger, summary_tex='',
         summary_out.write(summary_str)
         summary_out.close()
 
+# Renders entries the way dl-cv.bst does, so a CV can \input the publication list
+# instead of running bibtex. Only the entry types in cv.bib are ported, others are
+# rendered like misc.
+BEFORE_ALL, MID_SENTENCE, AFTER_SENTENCE, AFTER_BLOCK = range(4)
+LONG_NAME = 3
+
+# add.period$
+def add_period(text):
+    stripped = text.rstrip('}')
+    return text if not stripped or stripped[-1] in '.?!' else text + '.'
+
+# control sequences change.case$ lowers inside a special character, {\OE} becomes {\oe}
+UPPER_SPECIALS = ('L', 'O', 'OE', 'AE', 'AA')
+
+# the brace group starting at start, up to its closing brace
+def brace_group(text, start):
+    depth = 0
+    for i in range(start, len(text)):
+        depth = depth + {'{': 1, '}': -1}.get(text[i], 0)
+        if depth == 0:
+            return text[start:i + 1]
+    return text[start:]
+
+# a special character, a top level brace group starting with a control sequence like {\"O},
+# is lowered apart from the names of its control sequences
+def lower_special(group):
+    return re.sub(r'\\([A-Za-z]*)|[^\\]+', lambda match: match.group(0) if match.group(0).startswith('\\') and
+                  match.group(1) not in UPPER_SPECIALS else match.group(0).lower(), group)
+
+# change.case$ "t": lower case except the first letter, letters after a colon and a space
+# and anything in braces other than special characters
+def title_case(text):
+    out = ''
+    depth = 0
+    prev_colon = False
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == '{' and depth == 0 and text[i + 1:i + 2] == '\\':
+            group = brace_group(text, i)
+            out = out + (group if i == 0 or (prev_colon and text[i - 1].isspace()) else lower_special(group))
+            prev_colon = False
+            i = i + len(group)
+            continue
+        if c == '{':
+            depth = depth + 1
+        elif c == '}':
+            depth = depth - 1
+        elif depth == 0:
+            if not (i == 0 or (prev_colon and text[i - 1].isspace())):
+                c = c.lower()
+            if c == ':':
+                prev_colon = True
+            elif not c.isspace():
+                prev_colon = False
+        out = out + c
+        i = i + 1
+    return out
+
+def emphasize(text):
+    return "{\\em " + text + "}" if text else ''
+
+# n.dashify
+def dashify(pages):
+    return re.sub(r'(?<!-)-(?!-)', '--', pages)
+
+# tie.or.space.connect
+def tie_or_space(word, text):
+    return word + ('~' if len(text) < 3 else ' ') + text
+
+# a tie before the last token of a name part and after a short first token, otherwise a space
+def join_tokens(tokens):
+    out = tokens[0]
+    for i, token in enumerate(tokens[1:], 1):
+        out = out + ('~' if i == len(tokens) - 1 or len(out) < LONG_NAME else ' ') + token
+    return out
+
+# "{ff~}{vv~}{ll}{, jj}", the ties after ff and vv become spaces once the name is long enough
+def format_name(person):
+    name = ''
+    for tokens in (person.first_names + person.middle_names, person.prelast_names):
+        if tokens:
+            name = name + join_tokens(tokens)
+            name = name + ('~' if len(name) < LONG_NAME else ' ')
+    name = name + join_tokens(person.last_names)
+    if person.lineage_names:
+        name = name + ', ' + join_tokens(person.lineage_names)
+    return name
+
+def format_names(persons):
+    names = [format_name(person) for person in persons]
+    if len(names) < 2:
+        return ''.join(names)
+    last = ' et~al.' if names[-1] == 'others' else ' and ' + names[-1]
+    return ', '.join(names[:-1]) + (',' if len(names) > 2 else '') + last
+
+class BibEntry:
+    # output.nonnull and friends: each field is written once the next one shows what
+    # punctuation goes between them
+    def __init__(self, key, entry):
+        self.key = key
+        self.entry = entry
+        self.text = ''
+        self.last = ''
+        self.state = BEFORE_ALL
+
+    def field(self, name):
+        return self.entry.fields[name] if field_present(name, self.entry.fields) else ''
+
+    def output(self, text):
+        if not text:
+            return
+        if self.state == MID_SENTENCE:
+            self.text = self.text + self.last + ', '
+        else:
+            if self.state == AFTER_BLOCK:
+                self.text = self.text + add_period(self.last) + '\n\\newblock '
+            elif self.state == BEFORE_ALL:
+                self.text = self.text + self.last
+            else:
+                self.text = self.text + add_period(self.last) + ' '
+            self.state = MID_SENTENCE
+        self.last = text
+
+    def new_block(self):
+        if self.state != BEFORE_ALL:
+            self.state = AFTER_BLOCK
+
+    def new_sentence(self):
+        if self.state not in (AFTER_BLOCK, BEFORE_ALL):
+            self.state = AFTER_SENTENCE
+
+    # bibentry leaves out fin.entry's final period, the CV adds its own punctuation
+    def finish(self):
+        return self.text + self.last
+
+    def authors(self):
+        return format_names(self.entry.persons.get('author', []))
+
+    def editors(self):
+        editors = self.entry.persons.get('editor', [])
+        if not editors:
+            return ''
+        return format_names(editors) + (', editors' if len(editors) > 1 else ', editor')
+
+    def title(self):
+        title = self.field('title')
+        if not title:
+            return ''
+        title = title_case(title)
+        url = self.field('url')
+        return "\\href{" + url + "}{" + title + "}" if url else title
+
+    def date(self):
+        year = self.field('year')
+        month = self.field('month')
+        if not year:
+            return month
+        return month + ' ' + year if month else year
+
+    def pages(self):
+        pages = self.field('pages')
+        if not pages:
+            return ''
+        if any(c in pages for c in '-,+'):
+            return tie_or_space('pages', dashify(pages))
+        return tie_or_space('page', pages)
+
+    def bvolume(self):
+        volume = self.field('volume')
+        if not volume:
+            return ''
+        series = self.field('series')
+        return tie_or_space('volume', volume) + (' of ' + emphasize(series) if series else '')
+
+    def number_series(self):
+        if self.field('volume'):
+            return ''
+        number = self.field('number')
+        series = self.field('series')
+        if not number:
+            return series
+        number = tie_or_space('number' if self.state == MID_SENTENCE else 'Number', number)
+        return number + (' in ' + series if series else '')
+
+    def vol_num_pages(self):
+        text = self.field('volume')
+        if self.field('number'):
+            text = text + '(' + self.field('number') + ')'
+        pages = self.field('pages')
+        if pages:
+            text = text + ':' + dashify(pages) if text else self.pages()
+        return text
+
+    def in_ed_booktitle(self):
+        booktitle = self.field('booktitle')
+        if not booktitle:
+            return ''
+        editors = self.editors()
+        return 'In ' + (editors + ', ' if editors else '') + emphasize(booktitle)
+
+    def tr_number(self):
+        tr_type = self.field('type') or 'Technical Report'
+        number = self.field('number')
+        return tie_or_space(tr_type, number) if number else title_case(tr_type)
+
+    def article(self):
+        self.output(self.authors())
+        self.new_block()
+        self.output(self.title())
+        self.new_block()
+        self.output(emphasize(self.field('journal')))
+        self.output(self.vol_num_pages())
+        self.output(self.date())
+        self.new_block()
+        self.output(self.field('note'))
+
+    def inproceedings(self):
+        self.output(self.authors())
+        self.new_block()
+        self.output(self.title())
+        self.new_block()
+        self.output(self.in_ed_booktitle())
+        self.output(self.bvolume())
+        self.output(self.number_series())
+        self.output(self.pages())
+        if not self.field('address'):
+            if self.field('organization') or self.field('publisher'):
+                self.new_sentence()
+            self.output(self.field('organization'))
+            self.output(self.field('publisher'))
+            self.output(self.date())
+        else:
+            self.output(self.field('address'))
+            self.output(self.date())
+            self.new_sentence()
+            self.output(self.field('organization'))
+            self.output(self.field('publisher'))
+        self.new_block()
+        self.output(self.field('note'))
+
+    def techreport(self):
+        self.output(self.authors())
+        self.new_block()
+        self.output(self.title())
+        self.new_block()
+        self.output(self.tr_number())
+        self.output(self.field('institution'))
+        self.output(self.field('address'))
+        self.output(self.date())
+        self.new_block()
+        self.output(self.field('note'))
+
+    # misc and patent
+    def misc(self):
+        self.output(self.authors())
+        if self.field('title') or self.field('howpublished'):
+            self.new_block()
+        self.output(self.title())
+        if self.field('howpublished'):
+            self.new_block()
+        self.output(self.field('howpublished'))
+        self.output(self.date())
+        self.new_block()
+        self.output(self.field('note'))
+
+    def render(self):
+        {'article': self.article, 'inproceedings': self.inproceedings, 'conference': self.inproceedings,
+         'techreport': self.techreport}.get(self.entry.type, self.misc)()
+        return self.finish()
+
+@profiled('render')
+def output_entries(logger, bib, entries_tex):
+    if entries_tex:
+        entries_out = open_output(entries_tex)
+        entries_out.write("% generated by gen_bibtex.py, formatted like dl-cv.bst so the CV doesn't need bibtex\n"
+                          "\\makeatletter\n"
+                          "\\def\\bibentry#1{\\@ifundefined{pub@#1}{\\PackageWarning{gen_bibtex}{No entry #1}\\textbf{?#1?}}"
+                          "{{\\frenchspacing\\@nameuse{pub@#1}}}}\n")
+        for key, entry in bib.entries.items():
+            logger.debug("Rendering " + key)
+            entries_out.write(f"\\@namedef{{pub@{key}}}{{{BibEntry(key, entry).render()}}}\n")
+        entries_out.write("\\makeatother\n")
+        entries_out.close()
+
 month_to_ordinal = { 'January':1, 'February':2, 'March':3, 'April':4, 'May':5, 'June':6,
                      'July':7, 'August':8, 'September':9, 'October':10, 'November':11, 'December':12}
 
+@profiled('render')
 def gen_xml(logger, bib, xml_file, ccv_years: int, debug=False):    
     
-    xml_f = open(xml_file, 'w')
+    xml_f = open_output(xml_file)
     
     gen_xml_header(xml_f)
     
@@ -116,7 +400,7 @@ def gen_xml(logger, bib, xml_file, ccv_years: int, debug=False):
         
         if (entry.type == 'inproceedings'):
             logger.debug("XML output conference paper: " + entry.fields['title'])
-            xml_f.write(f'\t\t\t<section id="4b9f909503cd4c8aa8d826c87d6d874d" label="Conference Publications" recordId="{uuid.uuid4().hex}">\n'
+            xml_f.write(f'\t\t\t<section id="4b9f909503cd4c8aa8d826c87d6d874d" label="Conference Publications" recordId="{record_id(item)}">\n'
                         '\t\t\t\t<field id="81ef87c09ded47ae8880b8d79e83406f" label="Conference Publication Type">\n'
                         '\t\t\t\t\t<lov id="00000000000000000000000100007000">Paper</lov>\n'
                         '\t\t\t\t</field>\n'
@@ -191,7 +475,7 @@ def gen_xml(logger, bib, xml_file, ccv_years: int, debug=False):
                         '\t\t\t</section>\n')
         elif (entry.type == 'article'):
             logger.debug("Found journal paper: " + entry.fields['title'])
-            xml_f.write(f'\t\t\t<section id="9a34d6b273914f18b2273e8de7c48fd6" label="Journal Articles" recordId="{uuid.uuid4().hex}">\n'
+            xml_f.write(f'\t\t\t<section id="9a34d6b273914f18b2273e8de7c48fd6" label="Journal Articles" recordId="{record_id(item)}">\n'
                         '\t\t\t\t<field id="f3fd4878d47c4e83aef6959620ba4870" label="Article Title">\n'
                         f'\t\t\t\t\t<value type="String">{title}</value>\n'
                         '\t\t\t\t</field>\n'
@@ -257,7 +541,7 @@ def gen_xml(logger, bib, xml_file, ccv_years: int, debug=False):
                         '\t\t\t\t</field>\n'
                         '\t\t\t</section>\n')            
         elif (entry.type == 'techreport'):
-            xml_f.write(f'\t\t\t<section id="7e57525337d5498a9506fdadee098b10" label="Reports" recordId="{uuid.uuid4().hex}">\n'
+            xml_f.write(f'\t\t\t<section id="7e57525337d5498a9506fdadee098b10" label="Reports" recordId="{record_id(item)}">\n'
                         '\t\t\t\t<field id="dd692787647b495fbadb038b6937950d" label="Report Title">\n'
                         f'\t\t\t\t\t<value type="String">{title}</value>\n'
                         '\t\t\t\t</field>\n'                        
@@ -327,15 +611,18 @@ def gen_xml_footer(xml_f):
                 '</generic-cv:generic-cv>\n')    
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Generate bibtex/CSV file for CV')
     parser.add_argument('file', type=str, help='Input bibtex file')
     parser.add_argument('-d', dest='debug', action='store_true', default=False, help='Produce debug output')
     parser.add_argument('--summary_out', dest='summary_tex', type=str, default='bib_summary.tex', help='Publication numbers files')
+    parser.add_argument('--entries_out', dest='entries_tex', type=str, default='', help='Also write the publication entries formatted like dl-cv.bst to this file, for a CV that \\inputs it instead of running bibtex')
     parser.add_argument('--xml', dest='pubs_xml', type=str, default='publications.xml', help='CCV XML output file')    
     parser.add_argument('--out_dir', dest='out_dir', type=str, default='', help='Output directory')
     parser.add_argument('--ccv_years', dest='ccv_years', type=int, default=6, help='How many years back to include in ccv output.')
-    args = parser.parse_args()   
+    add_profile_args(parser)
+    args = parser.parse_args(argv)   
+    check_profile_args(parser, args)
 
     num_conf_pubs = 0
     num_journal_pubs = 0
@@ -354,23 +641,28 @@ def main():
     
     if args.out_dir:
         summary_tex = os.path.join(args.out_dir, os.path.basename(args.summary_tex))
+        entries_tex = os.path.join(args.out_dir, os.path.basename(args.entries_tex)) if args.entries_tex else ''
         xml_file = os.path.join(args.out_dir, os.path.basename(args.pubs_xml))
     else:
         summary_tex = args.summary_tex
+        entries_tex = args.entries_tex
         xml_file = args.pubs_xml
     
-    bib, num_conf_pubs, num_journal_pubs, num_patent_pubs, num_other_pubs = parse_bib(logger, 
-                    bib_in_file=args.file,                    
-                    debug=args.debug)
+    with profile_run('gen_bibtex', args):
+        bib, num_conf_pubs, num_journal_pubs, num_patent_pubs, num_other_pubs = parse_bib(logger, 
+                        bib_in_file=args.file,                    
+                        debug=args.debug)
     
-    logger.info("Generating summary file")
+        logger.info("Generating summary file")
     
-    gen_xml(logger=logger, bib=bib, xml_file=xml_file, ccv_years=args.ccv_years, debug=args.debug)
+        output_entries(logger, bib=bib, entries_tex=entries_tex)
+
+        gen_xml(logger=logger, bib=bib, xml_file=xml_file, ccv_years=args.ccv_years, debug=args.debug)
     
-    retval = output_summary(logger, summary_tex=summary_tex, 
-                            num_conf_pubs=num_conf_pubs, num_journal_pubs=num_journal_pubs,
-                            num_other_pubs=num_other_pubs, num_patent_pubs=num_patent_pubs,
-                            debug=args.debug)   
+        retval = output_summary(logger, summary_tex=summary_tex, 
+                                num_conf_pubs=num_conf_pubs, num_journal_pubs=num_journal_pubs,
+                                num_other_pubs=num_other_pubs, num_patent_pubs=num_patent_pubs,
+                                debug=args.debug)   
 
 # Start program
 if __name__ == "__main__":
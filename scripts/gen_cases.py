@@ -5,8 +5,7 @@ from datetime import datetime
 from functools import cmp_to_key
 import logging
 import os
-import csv
-from cv_utils import latex_format
+from cv_utils import latex_format, read_csv, open_output, profiled, add_profile_args, check_profile_args, profile_run
 
 TITLE = 'title'
 PLAINTIFF = 'plaintiff'
@@ -16,16 +15,10 @@ JURISDICTION = 'jurisdiction'
 CASE = 'case'
 YEAR = 'year'
 
+@profiled('render')
 def gen_latex(csvfile, logger, tex_out):
-    if os.name == 'nt':
-        logger.info("Opening csv files in Windows mode")
-        cases_f = open(csvfile,'r', newline='', )
-    else:
-        logger.info(f"Opening csv files in {os.name} mode")
-        cases_f = open(csvfile,'r',encoding='utf-8-sig')
-        
-    cases = csv.DictReader(cases_f)
-    tex_f = open(tex_out, 'w')
+    cases = read_csv(csvfile)
+    tex_f = open_output(tex_out)
     
     for case in cases:
         logger.debug(f"Processing {case}")
@@ -34,16 +27,17 @@ def gen_latex(csvfile, logger, tex_out):
         case_str = case_str + ".\n\\vspace{6pt}\n\\end{minipage}\n"
         tex_f.write(case_str)
     tex_f.close()
-    cases_f.close()
     
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Generate Cases tex file for CV')
     parser.add_argument('file', type=str, help='Input csv file')
     parser.add_argument('-d', dest='debug', type=str, default='critical', choices = ['debug', 'info', 'error', 'critical'], help='Produce debug output')
     parser.add_argument('--tex_out', dest='cases_tex', type=str, default='cases.tex', help='Case Tex output file')
     parser.add_argument('--out_dir', dest='out_dir', type=str, default='', help='Output directory')
-    args = parser.parse_args()   
+    add_profile_args(parser)
+    args = parser.parse_args(argv)   
+    check_profile_args(parser, args)
 
     if (args.debug == 'debug'):
         logging.basicConfig(level=logging.DEBUG)
@@ -59,7 +53,8 @@ def main():
     else:
         cases_tex = args.cases_tex
         
-    gen_latex(csvfile=args.file, logger=logger, tex_out=cases_tex)
+    with profile_run('gen_cases', args):
+        gen_latex(csvfile=args.file, logger=logger, tex_out=cases_tex)
 
 # Start program
 if __name__ == "__main__":
@@ -1,19 +1,16 @@
 #!/usr/bin/env python3
 
 import argparse
-from  pybtex.database import parse_file
 
-from pylatexenc.latex2text import LatexNodes2Text
 from datetime import datetime
-from nameparser import HumanName
 import sys
 import logging
 import csv
 import os
 import re
-from tempfile import NamedTemporaryFile
-import shutil
-from cv_utils import check_url, latex_format, ordinal
+from cv_utils import check_url, latex_format, ordinal, read_bib, read_csv, open_output, latex2text, replace_with_backup, LazyModule, profiled, add_profile_args, check_profile_args, profile_run
+
+nameparser = LazyModule('nameparser')
 
 FIRST_NAME = 'First Name'
 LAST_NAME = 'Last Name'
@@ -60,8 +57,9 @@ month_dict = {'January': 1, 'February': 2, 'March': 3, 'April': 4, 'May': 5, 'Ju
 def month_difference(year, month, now):
     return (int(now.year)-int(year))*12 + int(now.month) - month_dict[month]+1
         
+@profiled('parse')
 def parse_bib(logger, bib_file, years, collaborators):
-    bib = parse_file(bib_file)
+    bib = read_bib(bib_file)
            
     for item in bib.entries:
         entry = bib.entries[item]
@@ -70,9 +68,9 @@ def parse_bib(logger, bib_file, years, collaborators):
         if month_difference(entry.fields['year'], month, datetime.now()) <= years*12:
             for author in entry.persons['author']:
                 # check if author is already in the list
-                first_name = LatexNodes2Text().latex_to_text(' '.join(author.first_names).strip()) if author.first_names else ''
-                last_name = LatexNodes2Text().latex_to_text(' '.join(author.last_names).strip()) if author.last_names else ''
-                middle_name = LatexNodes2Text().latex_to_text(' '.join(author.middle_names).strip()) if author.middle_names else ''                
+                first_name = latex2text.LatexNodes2Text().latex_to_text(' '.join(author.first_names).strip()) if author.first_names else ''
+                last_name = latex2text.LatexNodes2Text().latex_to_text(' '.join(author.last_names).strip()) if author.last_names else ''
+                middle_name = latex2text.LatexNodes2Text().latex_to_text(' '.join(author.middle_names).strip()) if author.middle_names else ''                
                 author_name = first_name + ' ' + last_name                
                 if author_name not in collaborators.keys() and author_name != 'David Lie':
                     collaborators[author_name] = Person(last_name=last_name, first_name=first_name, middle_name=middle_name, affiliation='')
@@ -108,19 +106,18 @@ def student_last_position(student):
     else:
         return 'Toronto'
 
+@profiled('parse')
 def parse_students(logger, student_csv, conflicts):
-    with open(student_csv, 'r', newline='') if os.name == 'nt' else open(student_csv, 'r', encoding='utf-8-sig') as csv_file:
-        csv_reader = csv.DictReader(csv_file)
-        for row in csv_reader:
-            # skip UG and MENG students
-            if not row[MS_START] and not row[PHD_START] and not row[PDF_START]:
-                continue
-            formal_name, nick_name = process_student_name(row[FIRST_NAME])
-            full_formal_name = formal_name.strip() + ' ' + row[LAST_NAME].strip()
-            full_nick_name = nick_name.strip() + ' ' + row[LAST_NAME].strip() if nick_name else ''                
-            logger.debug('formal_name: ' + full_formal_name + ', nick_name: ' + full_nick_name)
-            if full_formal_name not in conflicts.keys() and full_nick_name not in conflicts.keys():
-                conflicts[full_formal_name] = Person(last_name=row[LAST_NAME].strip(), first_name=formal_name, nick_name=nick_name, affiliation=student_last_position(row).strip())
+    for row in read_csv(student_csv):
+        # skip UG and MENG students
+        if not row[MS_START] and not row[PHD_START] and not row[PDF_START]:
+            continue
+        formal_name, nick_name = process_student_name(row[FIRST_NAME])
+        full_formal_name = formal_name.strip() + ' ' + row[LAST_NAME].strip()
+        full_nick_name = nick_name.strip() + ' ' + row[LAST_NAME].strip() if nick_name else ''                
+        logger.debug('formal_name: ' + full_formal_name + ', nick_name: ' + full_nick_name)
+        if full_formal_name not in conflicts.keys() and full_nick_name not in conflicts.keys():
+            conflicts[full_formal_name] = Person(last_name=row[LAST_NAME].strip(), first_name=formal_name, nick_name=nick_name, affiliation=student_last_position(row).strip())
     return conflicts
 
 # return dict of people
@@ -137,7 +134,7 @@ def parse_copis(str):
         if match:
             full_name = match.group(1)            
             affiliation = match.group(2)
-            name_parts = HumanName(full_name)
+            name_parts = nameparser.HumanName(full_name)
             first_name = name_parts.first
             middle_name = name_parts.middle
             last_name = name_parts.last
@@ -145,20 +142,20 @@ def parse_copis(str):
             people[name] = Person(last_name=last_name, first_name=first_name, middle_name=middle_name, affiliation=affiliation)            
     return people
 
+@profiled('parse')
 def parse_funding(logger, funding_csv, years, collaborators):
-    with open(funding_csv, 'r', newline='') if os.name == 'nt' else open(funding_csv, 'r', encoding='utf-8-sig') as csv_file:
-        csv_reader = csv.DictReader(csv_file)
-        for row in csv_reader:
-            grant_year = row[YEAR][-4:]
-            if int(datetime.now().year) - int(grant_year) <= years:                
-                co_pis = parse_copis(row[CO_PIS])
-                for full_name, co_pi in co_pis.items():
-                    if full_name not in collaborators.keys():
-                        collaborators[full_name] = co_pi                
+    for row in read_csv(funding_csv):
+        grant_year = row[YEAR][-4:]
+        if int(datetime.now().year) - int(grant_year) <= years:                
+            co_pis = parse_copis(row[CO_PIS])
+            for full_name, co_pi in co_pis.items():
+                if full_name not in collaborators.keys():
+                    collaborators[full_name] = co_pi                
     return collaborators
     
+@profiled('update-people')
 def update_people(logger, people_csv, conflicts, collaborators):
-    with open(people_csv, 'r', newline='') if os.name == 'nt' else open(people_csv, 'r', encoding='utf-8-sig') as csv_file:
+    with open(people_csv, 'r', newline='', encoding='utf-8-sig') as csv_file:
         csv_reader = csv.DictReader(csv_file)
         updated = False
         db = {}
@@ -225,19 +222,20 @@ def update_people(logger, people_csv, conflicts, collaborators):
             conflicts[key] = db[key]
         csv_file.close()
         if updated:
-            tempfile = NamedTemporaryFile('w+t', newline='', delete=False)
+            from tempfile import NamedTemporaryFile
+            tempfile = NamedTemporaryFile('w+t', newline='', delete=False, dir=os.path.dirname(os.path.abspath(people_csv)))
             logger.debug('Writing to: ' + tempfile.name)
             tempwriter = csv.DictWriter(tempfile, csv_reader.fieldnames)
             tempwriter.writeheader()
             for name in sorted(db.keys()):
                 tempwriter.writerow({NAME: name, LAST_NAME: db[name].last_name, FIRST_NAME: db[name].first_name, NICK_NAME: db[name].nick_name, MIDDLE_NAME: db[name].middle_name, AFFILIATION: db[name].affiliation})
             tempfile.close()
-            shutil.move(people_csv, os.path.splitext(people_csv)[0]+'-bak'+ os.path.splitext(people_csv)[1])
-            shutil.move(tempfile.name, people_csv)
+            replace_with_backup(people_csv, tempfile.name)
     return db
  
+@profiled('render')
 def gen_collaborators(logger, collaborators, tex_out, db ):
-    with open(tex_out, 'w') as tex_file:
+    with open_output(tex_out) as tex_file:
         first = True
         for name in sorted(collaborators.keys()):
             person = db[name]
@@ -248,16 +246,17 @@ def gen_collaborators(logger, collaborators, tex_out, db ):
             tex_file.write(latex_format(f"{name} {'(' + person.affiliation + ')' if person.affiliation else ''}"))
         tex_file.close()
         
+@profiled('render')
 def gen_conflicts(logger, conflicts, collaborators, txt_out, db ):
     # merge collaborators and conflicts
     conflicts.update(collaborators)
-    with open(txt_out, 'w') as txt_file:    
+    with open_output(txt_out) as txt_file:    
         for name in sorted(conflicts.keys()):
             person = db[name]            
             txt_file.write(f"{name} {'(' + person.affiliation + ')' if person.affiliation else ''}\n")            
         txt_file.close()
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Generate bibtex/CSV file for CV')
     parser.add_argument('bib_file', type=str, help='Input bibtex file')
     parser.add_argument('student_csv', type=str, help='Input student csv file')
@@ -268,7 +267,9 @@ def main():
     parser.add_argument('--tex_out', dest='tex_out', type=str, default='collabs.tex', help='Output collaborators tex file')
     parser.add_argument('--out_dir', dest='out_dir', type=str, default='', help='Output directory')
     parser.add_argument('-d', dest='debug', type=str, default='critical', choices = ['debug', 'info', 'error', 'critical'], help='Produce debug output')
-    args = parser.parse_args()   
+    add_profile_args(parser)
+    args = parser.parse_args(argv)   
+    check_profile_args(parser, args)
        
     if (args.debug == 'debug'):
         logging.basicConfig(level=logging.DEBUG)
@@ -289,12 +290,13 @@ def main():
     collaborators = {}
     conflicts = {}
         
-    parse_bib(logger, bib_file = args.bib_file, years = args.years, collaborators=collaborators)           
-    parse_students(logger, student_csv = args.student_csv, conflicts=conflicts)    
-    parse_funding(logger, funding_csv = args.funding_csv, years=args.years, collaborators=collaborators)    
-    db = update_people(logger, people_csv = args.people_csv, conflicts=conflicts, collaborators=collaborators)
-    gen_collaborators(logger, collaborators=collaborators, tex_out=tex_out, db=db)
-    gen_conflicts(logger, conflicts=conflicts, collaborators=collaborators,txt_out=txt_out, db=db)
+    with profile_run('gen_collaborators', args):
+        parse_bib(logger, bib_file = args.bib_file, years = args.years, collaborators=collaborators)           
+        parse_students(logger, student_csv = args.student_csv, conflicts=conflicts)    
+        parse_funding(logger, funding_csv = args.funding_csv, years=args.years, collaborators=collaborators)    
+        db = update_people(logger, people_csv = args.people_csv, conflicts=conflicts, collaborators=collaborators)
+        gen_collaborators(logger, collaborators=collaborators, tex_out=tex_out, db=db)
+        gen_conflicts(logger, conflicts=conflicts, collaborators=collaborators,txt_out=txt_out, db=db)
     
 # Start program
 if __name__ == "__main__":
@@ -2,13 +2,10 @@
 
 import argparse
 from functools import cmp_to_key
-from pylatexenc.latexencode  import unicode_to_latex
 import logging
 import os
-import csv
 import re
-import uuid
-from cv_utils import ordinal, latex_format, format_xml, field_present
+from cv_utils import ordinal, latex_format, format_xml, field_present, read_csv, open_output, record_id, profiled, add_profile_args, check_profile_args, profile_run
 
 YEAR_STR = 'year'
 STATUS_STR = 'status'
@@ -27,22 +24,16 @@ REF_NUMBER_STR = 'ref_number'
 PI_STR = 'pi'
 COMPETITIVE_STR = 'competitive'
 
+@profiled('render')
 def gen_latex_xml(funding_file, logger, debug, tex_out, total_tex_out, funding_xml):
-    if os.name == 'nt':
-        logger.info("Opening csv files in Windows mode")
-        funding_f = open(funding_file,'r', newline='', )
-    else:
-        logger.info(f"Opening csv files in {os.name} mode")
-        funding_f = open(funding_file,'r',encoding='utf-8-sig')
-        
-    funds = csv.DictReader(funding_f)
+    funds = read_csv(funding_file)
     
-    tex_f = open(tex_out, 'w')
-    total_tex_f = open(total_tex_out, 'w')
+    tex_f = open_output(tex_out)
+    total_tex_f = open_output(total_tex_out)
     total_funds = 0
     number_of_funds = 0
     
-    xml_f = open(funding_xml, 'w')
+    xml_f = open_output(funding_xml)
     gen_xml_header(xml_f)
     for fund in funds:
         logger.debug(f"Processing {fund}")
@@ -72,7 +63,6 @@ def gen_latex_xml(funding_file, logger, debug, tex_out, total_tex_out, funding_x
     gen_xml_footer(xml_f)
     xml_f.close()
     
-    funding_f.close()
     
 def gen_xml_header(xml_f):
     xml_f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
@@ -167,7 +157,7 @@ def gen_xml_funding(xml_f, fund):
     else:
          raise Exception(f'Unknown funding role: {fund[STATUS_STR]}')    
     
-    xml_f.write(f'\t<section id="aaedc5454412483d9131f7619d10279e" label="Research Funding History" recordId="{uuid.uuid4().hex}">\n'
+    xml_f.write(f'\t<section id="aaedc5454412483d9131f7619d10279e" label="Research Funding History" recordId="{record_id("funding", fund_title, ref_number, start_date)}">\n'
             '\t\t<field id="931b92a5ffed4e5aa9c7b3a0afd5f8ba" label="Funding Type">\n'
             f'\t\t\t{fund_type}\n'
             '\t\t</field>\n'
@@ -203,7 +193,7 @@ def gen_xml_funding(xml_f, fund):
             '\t\t\t</bilingual>\n'
             '\t\t</field>\n'
             
-            f'\t\t<section id="376b8991609f46059a3d66028f005360" label="Funding Sources" recordId="{uuid.uuid4().hex}">\n');
+            f'\t\t<section id="376b8991609f46059a3d66028f005360" label="Funding Sources" recordId="{record_id("funding source", fund_title, ref_number, start_date)}">\n');
     gen_xml_organization(xml_f, fund)
     xml_f.write('\t\t\t<field id="97231512141a452a82151cc162e9a59c" label="Program Name">\n'
             f'\t\t\t\t<value type="String">{program_name}</value>\n'
@@ -230,7 +220,7 @@ def gen_xml_funding(xml_f, fund):
             '\t\t\t</field>\n'
             '\t\t</section>\n')
     for co_pi in xml_parse_copis(fund):
-        xml_f.write(f'\t\t<section id="c7c473d1237b432fb7f2abd831130fb7" label="Other Investigators" recordId="{uuid.uuid4().hex}">\n'
+        xml_f.write(f'\t\t<section id="c7c473d1237b432fb7f2abd831130fb7" label="Other Investigators" recordId="{record_id("investigator", fund_title, ref_number, start_date, co_pi)}">\n'
             '\t\t\t<field id="ddd551dfb26344fbb17f07afcffc94ed" label="Investigator Name">\n'
             f'\t\t\t\t<value type="String">{format_xml(co_pi)}</value>\n'
             '\t\t\t</field>\n'
@@ -250,7 +240,7 @@ def gen_xml_funding(xml_f, fund):
 def gen_xml_footer(xml_f):
     xml_f.write('</generic-cv:generic-cv>\n')    
     
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Generate Student tex/html file for grants')
     parser.add_argument('file', type=str, help='Input funding csv file')
     parser.add_argument('-d', dest='debug', type=str, default='critical', choices = ['debug', 'info', 'error', 'critical'], help='Produce debug output')
@@ -258,7 +248,9 @@ def main():
     parser.add_argument('--total_tex_out', dest='total_tex_out', type=str, default='funding_total.tex', help='Funding Total tex output file')
     parser.add_argument('--xml', dest='funding_xml', type=str, default='funding.xml', help='CCV XML output file')    
     parser.add_argument('--out_dir', dest='out_dir', type=str, default='', help='Output directory')
-    args = parser.parse_args()   
+    add_profile_args(parser)
+    args = parser.parse_args(argv)   
+    check_profile_args(parser, args)
 
     if (args.debug == 'debug'):
         logging.basicConfig(level=logging.DEBUG)
@@ -278,7 +270,8 @@ def main():
         tex_out = args.tex_out
         total_tex_out = args.total_tex_out
         funding_xml = args.funding_xml
-    gen_latex_xml(funding_file=args.file, logger=logger, debug=args.debug, tex_out=tex_out, total_tex_out=total_tex_out, funding_xml=funding_xml)    
+    with profile_run('gen_funding', args):
+        gen_latex_xml(funding_file=args.file, logger=logger, debug=args.debug, tex_out=tex_out, total_tex_out=total_tex_out, funding_xml=funding_xml)    
 
 # Start program
 if __name__ == "__main__":
@@ -3,14 +3,10 @@
 import argparse
 from datetime import datetime
 from functools import cmp_to_key
-from pylatexenc.latexencode import unicode_to_latex
-from dateutil.relativedelta import relativedelta
-from cv_utils import extract_year, extract_month, format_xml, field_present
+from cv_utils import latex_format, extract_year, extract_month, format_xml, field_present, read_csv, open_output, record_id, latexencode, dparser, dateutil_relativedelta
+from cv_utils import profiled, profiled_sorted, add_profile_args, check_profile_args, profile_run
 import logging
 import os
-import csv
-import uuid
-import dateutil.parser as dparser
 
 LAST_KNOWN_STR = "Last known position"
 PDF_TYPE = "PDF"
@@ -149,8 +145,8 @@ def gen_tex_table(tex_file, csv, student_type, cosup_list):
     stats_current = 0
     stats_completed = 0
 
-    tex_f = open(tex_file, 'w')
-    new_tex_f = open(prefix_new(tex_file), 'w')
+    tex_f = open_output(tex_file)
+    new_tex_f = open_output(prefix_new(tex_file))
     if student_type == PDF_TYPE:                      
         tex_f.write(r"""\begin{longtable}[h]{|p{\namelength}|p{\datelength}|p{\textwidth-\datelength-\datelength-30pt}|} \hline
                     \multicolumn{1}{|c|}{\bf Name} &
@@ -176,18 +172,18 @@ def gen_tex_table(tex_file, csv, student_type, cosup_list):
                 stats_current = stats_current + 1
             # extract information
             if ('Home Page' in student.keys() and student['Home Page']):
-                name_str = f"\href{{{student['Home Page']}}}{{{unicode_to_latex(student['First Name'].strip())} {unicode_to_latex(student['Last Name'].strip())}}}"
+                name_str = f"\href{{{student['Home Page']}}}{{{latex_format(student['First Name'])} {latex_format(student['Last Name'])}}}"
             else:
-                name_str = f"{unicode_to_latex(student['First Name'].strip())} {unicode_to_latex(student['Last Name'].strip())}"
+                name_str = f"{latex_format(student['First Name'])} {latex_format(student['Last Name'])}"
             if (program_key in student.keys() and student[program_key]):
-                program_str = f"{unicode_to_latex(student[program_key].strip())}"
+                program_str = f"{latex_format(student[program_key])}"
             else:
                 program_str = ''
             if (thesis_key in student.keys() and student[thesis_key]):
                 if (thesis_url_key in student.keys() and student[thesis_url_key]):
-                    title_str = f"\href{{{student[thesis_url_key].strip()}}}{{{unicode_to_latex(student[thesis_key].strip())}}}"
+                    title_str = f"\href{{{student[thesis_url_key].strip()}}}{{{latex_format(student[thesis_key])}}}"
                 else:
-                    title_str = f"{unicode_to_latex(student[thesis_key].strip())}"
+                    title_str = f"{latex_format(student[thesis_key])}"
             else:
                 title_str = ''  
             start_date_str = dparser.parse(student[start_date_key], fuzzy=False).strftime('%m/%Y')
@@ -210,10 +206,10 @@ def gen_tex_table(tex_file, csv, student_type, cosup_list):
             
             if student_type == PDF_TYPE:                      
                 if (last_pos_key in student.keys()  and student[last_pos_key]):
-                    student_str = f"{name_str}{cosup_str} & {date_str} & {unicode_to_latex(student[last_pos_key].strip())}\\\\ \hline\n"
+                    student_str = f"{name_str}{cosup_str} & {date_str} & {latex_format(student[last_pos_key])}\\\\ \hline\n"
                     new_student_str = new_student_str + ( 
                                         f"{{\\bfseries{{{name_str}{cosup_str} \\hfill {date_str}}}}}\\\\\n" 
-                                        f"Current Position: {unicode_to_latex(student[last_pos_key].strip())}\n")
+                                        f"Current Position: {latex_format(student[last_pos_key])}\n")
                 else:
                     student_str = f"{name_str}{cosup_str} & {date_str} & \\\\ \hline\n"            
                     new_student_str = new_student_str + f"\\bfseries{{{name_str}{cosup_str} \\hfill {date_str}}}\n"
@@ -227,7 +223,7 @@ def gen_tex_table(tex_file, csv, student_type, cosup_list):
                     new_student_str = new_student_str + "\n"
             else:
                 if (last_pos_key in student.keys()  and student[last_pos_key]):
-                    student_str = f"{name_str}{cosup_str} & {title_str} & \makecell[l]{{{date_str} \\\\ {unicode_to_latex(student[last_pos_key].strip())}}}\\\\ \hline\n"                                      
+                    student_str = f"{name_str}{cosup_str} & {title_str} & \makecell[l]{{{date_str} \\\\ {latex_format(student[last_pos_key])}}}\\\\ \hline\n"                                      
                 else:
                     student_str = f"{name_str}{cosup_str} & {title_str} & {date_str} \\\\ \hline\n"                                  
                 new_student_str = new_student_str + f"{{\\bfseries{{{name_str}{cosup_str}{', ' + program_str if program_str else ''} \\hfill {date_str}}}}}" 
@@ -235,18 +231,18 @@ def gen_tex_table(tex_file, csv, student_type, cosup_list):
                     new_student_str = new_student_str + f"\\\\\n{{Thesis: {title_str}}}\n"                                         
                     if (student_type == PHD_TYPE):
                         if external_key in student.keys() and student[external_key]:
-                            new_student_str = new_student_str + f"\\\\\nExternal Examiner: {unicode_to_latex(student[external_key].strip())}"
+                            new_student_str = new_student_str + f"\\\\\nExternal Examiner: {latex_format(student[external_key])}"
                             if (last_pos_key in student.keys()  and student[last_pos_key]):
                                 new_student_str = new_student_str + ", "
                             else:
                                 new_student_str = new_student_str + "\n"
                         if (last_pos_key in student.keys()  and student[last_pos_key]):
-                            new_student_str = new_student_str +  f"Current Position: {unicode_to_latex(student[last_pos_key].strip())}\n"                                    
+                            new_student_str = new_student_str +  f"Current Position: {latex_format(student[last_pos_key])}\n"                                    
                     else:
                         if ('PhD Last Position' in student.keys() and student['PhD Last Position'] != ""):
-                            new_student_str = new_student_str +  f"\\\\\nCurrent Position: {unicode_to_latex(student['PhD Last Position'].strip())}\n"                                                                
+                            new_student_str = new_student_str +  f"\\\\\nCurrent Position: {latex_format(student['PhD Last Position'])}\n"                                                                
                         elif (last_pos_key in student.keys() and student[last_pos_key]):
-                            new_student_str = new_student_str +  f"\\\\\nCurrent Position: {unicode_to_latex(student[last_pos_key].strip())}\n"                                    
+                            new_student_str = new_student_str +  f"\\\\\nCurrent Position: {latex_format(student[last_pos_key])}\n"                                    
                 else:                                         
                     new_student_str = new_student_str + "\n"
             if title_str or (last_pos_key in student.keys()  and student[last_pos_key]):
@@ -261,12 +257,9 @@ def gen_tex_table(tex_file, csv, student_type, cosup_list):
     return (stats_completed, stats_current)
     
 
+@profiled('render')
 def gen_latex(csvfile, logger, phd_tex, phd_foot, ms_tex, ms_foot, pdf_tex, ug_tex, meng_tex, stats_tex):
-    if os.name == 'nt':
-        logger.info("Opening " + csvfile + " in Windows mode")
-        csv_in_f = open(csvfile,'r', newline='')
-    else:
-        csv_in_f = open(csvfile,'r')
+    students = read_csv(csvfile)
 
     stats_current_phd = 0
     stats_completed_phd = 0
@@ -279,9 +272,8 @@ def gen_latex(csvfile, logger, phd_tex, phd_foot, ms_tex, ms_foot, pdf_tex, ug_t
     stats_current_ug = 0
     stats_past_ug = 0
 
-    csv_in = csv.DictReader(csv_in_f)
-    phd_sorted = sorted(
-        filter(lambda student: field_present('PhD Start Date',student), csv_in), 
+    phd_sorted = profiled_sorted(
+        filter(lambda student: field_present('PhD Start Date',student), students), 
         key=cmp_to_key(lambda i, j:(student_sort_fn(i=i, j=j, type=PHD_TYPE))))
 
     cosups = []
@@ -289,53 +281,40 @@ def gen_latex(csvfile, logger, phd_tex, phd_foot, ms_tex, ms_foot, pdf_tex, ug_t
     stats_completed_phd, stats_current_phd = gen_tex_table(tex_file=phd_tex, csv=phd_sorted, student_type=PHD_TYPE, cosup_list=cosups)
     num_phd_cosups = len(cosups)
 
-    with open(phd_foot, 'w') as tex_foot:        
+    with open_output(phd_foot) as tex_foot:        
         for cosup in cosups:                            
-            tex_foot.write(f"\\footnotetext{{Co-supervised with {unicode_to_latex(cosup)}.}}\n")            
+            tex_foot.write(f"\\footnotetext{{Co-supervised with {latexencode.unicode_to_latex(cosup)}.}}\n")            
             tex_foot.write("\stepcounter{footnote}\n")            
         tex_foot.close()
 
-    # reset csv file
-    csv_in_f.seek(0)
-    csv_in.__next__()
-        
-    ms_sorted = sorted(filter(lambda student: field_present('MS Start Date', student), csv_in), 
+    ms_sorted = profiled_sorted(filter(lambda student: field_present('MS Start Date', student), students), 
         key=cmp_to_key(lambda i, j: student_sort_fn(i=i, j=j, type=MS_TYPE)))
 
     stats_completed_ms, stats_current_ms = gen_tex_table(tex_file=ms_tex, csv=ms_sorted, student_type=MS_TYPE, cosup_list=cosups)
 
-    with open(ms_foot, 'w') as tex_foot:
+    with open_output(ms_foot) as tex_foot:
         cosups_printed=False
         for cosup in cosups:
             if (cosups.index(cosup) >= num_phd_cosups):
                 if cosups_printed:
                     tex_foot.write("\stepcounter\{footnote\}\n")             
-                tex_foot.write(f"\\footnotetext{{Co-supervised with {unicode_to_latex(cosup)}.}}\n")            
+                tex_foot.write(f"\\footnotetext{{Co-supervised with {latexencode.unicode_to_latex(cosup)}.}}\n")            
                 cosups_printed=True                
         tex_foot.close() 
 
-    csv_in_f.seek(0)
-    csv_in.__next__() 
-
-    pdf_sorted = sorted(filter(lambda student: field_present('PDF Start Date',student), csv_in), 
+    pdf_sorted = profiled_sorted(filter(lambda student: field_present('PDF Start Date',student), students), 
         key=cmp_to_key(lambda i, j: student_sort_fn(i=i, j=j, type=PDF_TYPE)))
     stats_completed_pdf, stats_current_pdf = gen_tex_table(tex_file=pdf_tex, csv=pdf_sorted, student_type=PDF_TYPE, cosup_list=cosups)
 
-    csv_in_f.seek(0)
-    csv_in.__next__() 
-
-    meng_sorted = sorted(filter(lambda student: field_present('MEng Start Date',student), csv_in), 
+    meng_sorted = profiled_sorted(filter(lambda student: field_present('MEng Start Date',student), students), 
         key=cmp_to_key(lambda i, j: student_sort_fn(i=i, j=j, type=MENG_TYPE)))
     stats_completed_meng, stats_current_meng = gen_tex_table(tex_file=meng_tex, csv=meng_sorted, student_type=MENG_TYPE, cosup_list=cosups)
 
-    csv_in_f.seek(0)
-    csv_in.__next__() 
-
-    ug_sorted = sorted(filter(lambda student: field_present('UG Start Date',student), csv_in), 
+    ug_sorted = profiled_sorted(filter(lambda student: field_present('UG Start Date',student), students), 
         key=cmp_to_key(lambda i, j: student_sort_fn(i=i, j=j, type=UG_TYPE)))
     stats_past_ug, stats_current_ug = gen_tex_table(tex_file=ug_tex, csv=ug_sorted, student_type=UG_TYPE, cosup_list=cosups)
 
-    stats_f = open(stats_tex, 'w')
+    stats_f = open_output(stats_tex)
     stats_f.write(f"\\newcommand{{\\numcompletedphd}}{{{stats_completed_phd}}}\n")
     stats_f.write(f"\\newcommand{{\\numcurrentphd}}{{{stats_current_phd}}}\n")
     stats_f.write(f"\\newcommand{{\\numcompletedms}}{{{stats_completed_ms}}}\n")
@@ -393,6 +372,7 @@ def output_html_program(type, student):
     return student[program_field].strip()
 
 
+@profiled('sort')
 def sort_students(csvfile, logger):
     # sort students
     current_phd = []
@@ -406,13 +386,7 @@ def sort_students(csvfile, logger):
     past_pdf = []
     past_ug = []
 
-    if os.name == 'nt':
-        logger.info("Opening " + csvfile + " in Windows mode")
-        csv_in_f = open(csvfile,'r', newline='')
-    else:
-        csv_in_f = open(csvfile,'r')
-    csv_in = csv.DictReader(csv_in_f)
-    for student in csv_in:
+    for student in read_csv(csvfile):
         # current PDF
         if (field_present('PDF Start Date',student) and not field_present('PDF End Date',student)):
             current_pdf.append(student)
@@ -439,12 +413,12 @@ def sort_students(csvfile, logger):
             past_meng.append(student)
         if (field_present('UG End Date',student)):
             past_ug.append(student)
-    csv_in_f.close()
 
     return current_phd, current_ms, current_meng, current_pdf, current_ug, past_phd, past_ms, past_meng, past_pdf, past_ug
 
+@profiled('render')
 def gen_html(current_phd, current_ms, current_pdf, current_ug, past_phd, past_ms, past_pdf, logger, students_html):
-    html = open(students_html, 'w')
+    html = open_output(students_html)
   
     html.write('<div class="elementor-element elementor-element-7cc73994 elementor-drop-cap-yes student elementor-drop-cap-view-default elementor-widget elementor-widget-text-editor" data-id="7cc73994" data-element_type="widget" data-settings="{&quot;drop_cap&quot;:&quot;yes&quot;}" data-widget_type="text-editor.default">')
     html.write('<div class="elementor-text-editor elementor-clearfix">')
@@ -452,7 +426,7 @@ def gen_html(current_phd, current_ms, current_pdf, current_ug, past_phd, past_ms
     # current PDFs
     if len(current_pdf):
         html.write('<h3>Post-Doctoral Fellows</h3>\n<ul>\n')
-        for student in sorted(current_pdf,key=cmp_to_key(    
+        for student in profiled_sorted(current_pdf,key=cmp_to_key(    
             lambda i, j: (-sort_by_start_date(i=i , j=j, type=PDF_TYPE) if 
                 sort_by_start_date(i=i , j=j, type=PDF_TYPE) else sort_by_last_name(i=i, j=j)))):
             html.write("<li>" + output_html_name(student) + output_html_cosup(PDF_TYPE, student)+"</li>\n")        
@@ -461,7 +435,7 @@ def gen_html(current_phd, current_ms, current_pdf, current_ug, past_phd, past_ms
     # current PhD students
     if len(current_phd):
         html.write('<h3>PhD Students</h3>\n<ul>\n')
-        for student in sorted(current_phd,key=cmp_to_key(
+        for student in profiled_sorted(current_phd,key=cmp_to_key(
             lambda i, j: (-sort_by_start_date(i=i , j=j, type=PHD_TYPE) if 
                 sort_by_start_date(i=i , j=j, type=PHD_TYPE) else sort_by_last_name(i=i, j=j)))):
             if field_present('PhD Co-Supervisor', student):
@@ -473,7 +447,7 @@ def gen_html(current_phd, current_ms, current_pdf, current_ug, past_phd, past_ms
     # current MS students
     if len(current_ms):
         html.write('<h3>Master\'s Students</h3>\n<ul>\n')
-        for student in sorted(current_ms,key=cmp_to_key(    
+        for student in profiled_sorted(current_ms,key=cmp_to_key(    
             lambda i, j: (-sort_by_start_date(i=i , j=j, type=MS_TYPE) if 
                 sort_by_start_date(i=i , j=j, type=MS_TYPE) else sort_by_last_name(i=i, j=j)))):
             if field_present('MS Co-Supervisor', student):
@@ -485,7 +459,7 @@ def gen_html(current_phd, current_ms, current_pdf, current_ug, past_phd, past_ms
      # current UG
     if len(current_ug):
         html.write('<h3>Undergraduate Students and Research Interns</h3>\n<ul>\n')
-        for student in sorted(current_ug,key=cmp_to_key(    
+        for student in profiled_sorted(current_ug,key=cmp_to_key(    
             lambda i, j: (-sort_by_start_date(i=i , j=j, type=UG_TYPE) if 
                 sort_by_start_date(i=i , j=j, type=UG_TYPE) else sort_by_last_name(i=i, j=j)))):
             html.write(f"<li>{output_html_name(student)} ({output_html_program(UG_TYPE, student)})</li>\n")                    
@@ -495,7 +469,7 @@ def gen_html(current_phd, current_ms, current_pdf, current_ug, past_phd, past_ms
     # past PDFs
     if len(past_pdf):
         html.write('<h4>Post-Doctoral Fellows</h4>\n<ul>\n')
-        for student in sorted(past_pdf,key=cmp_to_key(    
+        for student in profiled_sorted(past_pdf,key=cmp_to_key(    
             lambda i, j: (-sort_by_end_date(i=i , j=j, type=PDF_TYPE) if 
                 sort_by_end_date(i=i , j=j, type=PDF_TYPE) else sort_by_last_name(i=i, j=j)))):
             if (field_present('PDF Last Position', student)):
@@ -507,7 +481,7 @@ def gen_html(current_phd, current_ms, current_pdf, current_ug, past_phd, past_ms
     # past PhD
     if len(past_phd):
         html.write('<h4>PhD Students</h4>\n<ul>\n')
-        for student in sorted(past_phd,key=cmp_to_key(    
+        for student in profiled_sorted(past_phd,key=cmp_to_key(    
             lambda i, j: (-sort_by_end_date(i=i , j=j, type=PHD_TYPE) if 
                 sort_by_end_date(i=i , j=j, type=PHD_TYPE) else sort_by_last_name(i=i, j=j)))):
             if (field_present('PhD Last Position', student)):
@@ -519,7 +493,7 @@ def gen_html(current_phd, current_ms, current_pdf, current_ug, past_phd, past_ms
     # past MS
     if len(past_phd):
         html.write('<h4>Master\'s Students</h4>\n<ul>\n')
-        for student in sorted(past_ms,key=cmp_to_key(    
+        for student in profiled_sorted(past_ms,key=cmp_to_key(    
             lambda i, j: (-sort_by_end_date(i=i , j=j, type=MS_TYPE) if 
                 sort_by_end_date(i=i , j=j, type=MS_TYPE) else sort_by_last_name(i=i, j=j)))):
             # Current PhD students don't have a post-master's position
@@ -547,12 +521,12 @@ def anticipated_completion_date(student):
     else:
         raise Exception('Unknown student type: ' + student_type(student))
     start_date = dparser.parse(student[start_date_str], fuzzy=False)
-    expected_completion_date = start_date + relativedelta(years=degree_length)
+    expected_completion_date = start_date + dateutil_relativedelta.relativedelta(years=degree_length)
     
     if expected_completion_date > datetime.now():
         return expected_completion_date
     else:
-        return datetime.now() + relativedelta(years=1)
+        return datetime.now() + dateutil_relativedelta.relativedelta(years=1)
     
 def students2ccv(fid,students,type,status,ccv_years):
  
@@ -567,9 +541,8 @@ def students2ccv(fid,students,type,status,ccv_years):
             continue   		
         count += 1
         
-        # generates a random uuid
         fid.write('			<section id="4b36fa1eef2549f6ab3a3df7c1c81e0b" label="Student/Postdoctoral Supervision" recordId="{}">\n'.format(
-            uuid.uuid4().hex))
+            record_id(type, status, student['First Name'], student['Last Name'], student[start_date_key])))
         fid.write('				<field id="78a3e68f1ab74f31b9284c2acdb70739" label="Supervision Role">\n')
         # COsupervision or not
         if field_present(cosup_key,student):
@@ -681,8 +654,9 @@ def students2ccv(fid,students,type,status,ccv_years):
 
     return (count)
 
+@profiled('render')
 def gen_ccv(current_phd, current_ms, current_meng, current_pdf, current_ug, past_phd, past_ms, past_meng, past_pdf, past_ug, logger, students_xml,ccv_years):
-    xml_f = open(students_xml, 'w')
+    xml_f = open_output(students_xml)
     xml_f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
     xml_f.write('<generic-cv:generic-cv dateTimeGenerated="2016-03-26 09:43:18" lang="en" xmlns:generic-cv="http://www.cihr-irsc.gc.ca/generic-cv/1.0.0">\n')
     xml_f.write('	<section id="95c29504d0aa4b51b84659cafaf2b38d" label="Activities">\n')
@@ -703,10 +677,11 @@ def gen_ccv(current_phd, current_ms, current_meng, current_pdf, current_ug, past
     xml_f.write('		</section>\n')
     xml_f.write('	</section>\n')
     xml_f.write('</generic-cv:generic-cv>\n')    
+    xml_f.close()
 
     return
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Generate Student tex/html file for CV')
     parser.add_argument('file', type=str, help='Input csv file')
     parser.add_argument('-d', dest='debug', type=str, default='critical', choices = ['debug', 'info', 'error', 'critical'], help='Produce debug output')
@@ -722,7 +697,9 @@ def main():
     parser.add_argument('--xml', dest='students_xml', type=str, default='students.xml', help='CCV XML output file')    
     parser.add_argument('--out_dir', dest='out_dir', type=str, default='', help='Output directory')
     parser.add_argument('--ccv_years', dest='ccv_years', type=int, default=6, help='How many years back to include in ccv output.')
-    args = parser.parse_args()   
+    add_profile_args(parser)
+    args = parser.parse_args(argv)   
+    check_profile_args(parser, args)
 
     if (args.debug == 'debug'):
         logging.basicConfig(level=logging.DEBUG)
@@ -756,15 +733,16 @@ def main():
         students_html = args.students_html
         students_xml = args.students_xml
 
-    gen_latex(csvfile=args.file, logger=logger, phd_tex=phd_tex, phd_foot=phd_footnote_tex, 
-        ms_tex=ms_tex, ms_foot=ms_footnote_tex, pdf_tex=pdf_tex, 
-        meng_tex=meng_tex, ug_tex=ug_tex, stats_tex=stats_tex)
+    with profile_run('gen_students', args):
+        gen_latex(csvfile=args.file, logger=logger, phd_tex=phd_tex, phd_foot=phd_footnote_tex, 
+            ms_tex=ms_tex, ms_foot=ms_footnote_tex, pdf_tex=pdf_tex, 
+            meng_tex=meng_tex, ug_tex=ug_tex, stats_tex=stats_tex)
 
-    current_phd, current_ms, current_meng, current_pdf, current_ug, past_phd, past_ms, past_meng, past_pdf, past_ug = sort_students(csvfile=args.file, logger=logger)
+        current_phd, current_ms, current_meng, current_pdf, current_ug, past_phd, past_ms, past_meng, past_pdf, past_ug = sort_students(csvfile=args.file, logger=logger)
 
-    gen_html(current_phd=current_phd, current_ms=current_ms, current_pdf=current_pdf, current_ug=current_ug, past_phd=past_phd, past_ms=past_ms, past_pdf=past_pdf, logger=logger, students_html=students_html)
+        gen_html(current_phd=current_phd, current_ms=current_ms, current_pdf=current_pdf, current_ug=current_ug, past_phd=past_phd, past_ms=past_ms, past_pdf=past_pdf, logger=logger, students_html=students_html)
 
-    gen_ccv(current_phd=current_phd, current_ms=current_ms, current_meng=current_meng, current_pdf=current_pdf, current_ug=current_ug, past_phd=past_phd, past_ms=past_ms, past_meng=past_meng, past_pdf=past_pdf, past_ug=past_ug, logger=logger, students_xml=students_xml, ccv_years=args.ccv_years)
+        gen_ccv(current_phd=current_phd, current_ms=current_ms, current_meng=current_meng, current_pdf=current_pdf, current_ug=current_ug, past_phd=past_phd, past_ms=past_ms, past_meng=past_meng, past_pdf=past_pdf, past_ug=past_ug, logger=logger, students_xml=students_xml, ccv_years=args.ccv_years)
 
 # Start program
 if __name__ == "__main__":
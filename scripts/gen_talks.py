@@ -3,11 +3,8 @@
 import argparse
 from datetime import datetime
 from functools import cmp_to_key
-from pylatexenc.latexencode  import unicode_to_latex
 import logging
 import os
-import csv
-import uuid
 from cv_utils import *
 
 TITLE = 'Title'
@@ -24,7 +21,7 @@ INVITED = 'Invited'
 KEYNOTE = 'Keynote'
 
 def format(plain_str):
-    return unicode_to_latex(plain_str.strip())
+    return latex_format(plain_str)
 
 def field_present(field_name, dict):
     return (field_name in dict.keys() and dict[field_name])
@@ -52,32 +49,22 @@ def gen_talks_latex(tex_f, talks):
         tex_f.write(talk_row)        
     tex_f.write(r"\end{innerenum}")
 
+@profiled('render')
 def gen_latex(csvfile, logger, conference_tex, invited_tex):
-    #if os.name == 'nt':
-    logger.info("Opening " + csvfile + " in Windows mode")
-    csv_in_f = open(csvfile,'r', newline='', encoding="UTF-8-sig")
-    #else:
-    #    csv_in_f = open(csvfile,'r')
-
-    csv_in = csv.DictReader(csv_in_f)
-    conference_sorted = sorted(
-        filter(lambda course: course[TYPE].strip() == CONFERENCE, csv_in), 
+    talks = read_csv(csvfile)
+    conference_sorted = profiled_sorted(
+        filter(lambda course: course[TYPE].strip() == CONFERENCE, talks), 
         key=cmp_to_key(lambda i, j:(talk_sort_fn(i=i, j=j))))
-    tex_f = open(conference_tex, 'w')    
+    tex_f = open_output(conference_tex)    
     gen_talks_latex(tex_f, conference_sorted)    
     tex_f.close()
 
-    # reset csv file
-    csv_in_f.seek(0)
-    csv_in.__next__()    
-
-    invited_sorted = sorted(
-        filter(lambda course: course[TYPE].strip() == INVITED, csv_in), 
+    invited_sorted = profiled_sorted(
+        filter(lambda course: course[TYPE].strip() == INVITED, talks), 
         key=cmp_to_key(lambda i, j:(talk_sort_fn(i=i, j=j))))
-    tex_f = open(invited_tex, 'w')    
+    tex_f = open_output(invited_tex)    
     gen_talks_latex(tex_f, invited_sorted)    
     tex_f.close()
-    csv_in_f.close()
     
 def gen_xml_header(xml_f):
     xml_f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
@@ -104,18 +91,12 @@ ccv_format_audience = {
     'General Public' : '<lov id="00000000000000000000000100005003">General Public</lov>'
 }
     
+@profiled('render')
 def gen_xml(csvfile, logger, talks_xml):
-    #if os.name == 'nt':
-    logger.info("Opening " + csvfile + " in Windows mode")
-    csv_in_f = open(csvfile,'r', newline='', encoding="UTF-8-sig")
-    #else:
-    #    csv_in_f = open(csvfile,'r')
-
-    xml_f = open(talks_xml, 'w')
+    xml_f = open_output(talks_xml)
     gen_xml_header(xml_f)
-    csv_in = csv.DictReader(csv_in_f)
     
-    for talk in csv_in:
+    for talk in read_csv(csvfile):
         if not field_present(COUNTRY,talk) or not field_present(AUDIENCE,talk) or not field_present(TITLE,talk) or not field_present(VENUE,talk) or not field_present(YEAR,talk) or not field_present(TYPE,talk):
             continue
         
@@ -149,7 +130,7 @@ def gen_xml(csvfile, logger, talks_xml):
         url = format_xml(talk[URL]) if field_present(URL,talk) else ''
         copresenters = format_xml(talk['Co-Presenters']) if field_present('Co-Presenters',talk) else ''      
         
-        xml_f.write(f'\t\t<section id="c7ce6f054e0941ea8b27127dbd4a26d0" label="Presentations" recordId="{uuid.uuid4().hex}">\n'
+        xml_f.write(f'\t\t<section id="c7ce6f054e0941ea8b27127dbd4a26d0" label="Presentations" recordId="{record_id(title, venue, year, talk[TYPE])}">\n'
                     '\t\t\t<field id="3f6a7ac56ee64b7dbd84dba9d6e3302d" label="Presentation Title">\n'
                     f'\t\t\t\t<value type="String">{title}</value>\n'
                     '\t\t\t</field>\n'
@@ -191,10 +172,9 @@ def gen_xml(csvfile, logger, talks_xml):
                     '\t\t</section>\n')
                     
     gen_xml_footer(xml_f)
-    csv_in_f.close()
     xml_f.close()
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Generate Talks tex file for CV')
     parser.add_argument('file', type=str, help='Input csv file')
     parser.add_argument('-d', dest='debug', type=str, default='critical', choices = ['debug', 'info', 'error', 'critical'], help='Produce debug output')
@@ -202,7 +182,9 @@ def main():
     parser.add_argument('--invited_tex', dest='invited_tex', type=str, default='invited_talks.tex', help='Invited Talks Tex output file')
     parser.add_argument('--xml', dest='talks_xml', type=str, default='talks.xml', help='CCV XML output file')    
     parser.add_argument('--out_dir', dest='out_dir', type=str, default='', help='Output directory')
-    args = parser.parse_args()   
+    add_profile_args(parser)
+    args = parser.parse_args(argv)   
+    check_profile_args(parser, args)
 
     if (args.debug == 'debug'):
         logging.basicConfig(level=logging.DEBUG)
@@ -222,8 +204,9 @@ def main():
         invited_tex = args.invited_tex
         talks_xml = args.talks_xml
 
-    gen_latex(csvfile=args.file, logger=logger, conference_tex=conference_tex, invited_tex=invited_tex)
-    gen_xml(csvfile=args.file, logger=logger, talks_xml=talks_xml)
+    with profile_run('gen_talks', args):
+        gen_latex(csvfile=args.file, logger=logger, conference_tex=conference_tex, invited_tex=invited_tex)
+        gen_xml(csvfile=args.file, logger=logger, talks_xml=talks_xml)
 
 # Start program
 if __name__ == "__main__":
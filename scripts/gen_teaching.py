@@ -3,10 +3,9 @@
 import argparse
 from datetime import datetime
 from functools import cmp_to_key
-from pylatexenc.latexencode  import unicode_to_latex
 import logging
 import os
-import csv
+from cv_utils import read_csv, open_output, profiled, profiled_sorted, add_profile_args, check_profile_args, profile_run
 
 def field_present(field_name, dict):
     return (field_name in dict.keys() and dict[field_name])
@@ -24,44 +23,37 @@ def gen_course_latex(tex_f, courses):
         tex_f.write(course_str)
 
 
+@profiled('render')
 def gen_latex(csvfile, logger, grad_tex, ug_tex):
-    if os.name == 'nt':
-        logger.info("Opening " + csvfile + " in Windows mode")
-        csv_in_f = open(csvfile,'r', newline='', fileEncoding="UTF-8-BOM")
-    else:
-        csv_in_f = open(csvfile,'r')
-
-    csv_in = csv.DictReader(csv_in_f)
-    grad_sorted = sorted(
-        filter(lambda course: course['Type'].strip() == 'Grad', csv_in), 
+    courses = read_csv(csvfile)
+    grad_sorted = profiled_sorted(
+        filter(lambda course: course['Type'].strip() == 'Grad', courses), 
         key=cmp_to_key(lambda i, j:(class_sort_fn(i=i, j=j))))
-    tex_f = open(grad_tex, 'w')
+    tex_f = open_output(grad_tex)
     tex_f.write(r"""\begin{classtab}""" +"\n")
     gen_course_latex(tex_f, grad_sorted)
     tex_f.write(r"""\end{classtab}"""+ "\n")
     tex_f.close()
 
-    # reset csv file
-    csv_in_f.seek(0)
-    csv_in.__next__()    
-
-    ug_sorted = sorted(
-        filter(lambda course: course['Type'].strip() == 'UG', csv_in), 
+    ug_sorted = profiled_sorted(
+        filter(lambda course: course['Type'].strip() == 'UG', courses), 
         key=cmp_to_key(lambda i, j:(class_sort_fn(i=i, j=j))))
-    tex_f = open(ug_tex, 'w')
+    tex_f = open_output(ug_tex)
     tex_f.write(r"""\begin{classtab}""" +"\n")
     gen_course_latex(tex_f, ug_sorted)
     tex_f.write(r"""\end{classtab}"""+ "\n")
     tex_f.close()
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Generate Teaching tex file for CV')
     parser.add_argument('file', type=str, help='Input csv file')
     parser.add_argument('-d', dest='debug', type=str, default='critical', choices = ['debug', 'info', 'error', 'critical'], help='Produce debug output')
     parser.add_argument('--grad_tex', dest='grad_tex', type=str, default='grad_teaching.tex', help='Grad Teaching Tex output file')
     parser.add_argument('--ug_tex', dest='ug_tex', type=str, default='ug_teaching.tex', help='UG Teaching Tex output file')
     parser.add_argument('--out_dir', dest='out_dir', type=str, default='', help='Output directory')
-    args = parser.parse_args()   
+    add_profile_args(parser)
+    args = parser.parse_args(argv)   
+    check_profile_args(parser, args)
 
     if (args.debug == 'debug'):
         logging.basicConfig(level=logging.DEBUG)
@@ -79,7 +71,8 @@ def main():
         grad_tex = args.grad_tex
         ug_tex = args.ug_tex
 
-    gen_latex(csvfile=args.file, logger=logger, grad_tex=grad_tex, ug_tex=ug_tex)
+    with profile_run('gen_teaching', args):
+        gen_latex(csvfile=args.file, logger=logger, grad_tex=grad_tex, ug_tex=ug_tex)
 
     
 
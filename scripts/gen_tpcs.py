@@ -1,16 +1,16 @@
 #!/usr/bin/env python3
 
 import argparse
+from collections import defaultdict
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
 from functools import cmp_to_key
 import logging
 import os
 import csv
-from tempfile import NamedTemporaryFile
-import shutil
-import uuid
-from cv_utils import ordinal, latex_format, check_url, field_present
+from cv_utils import ordinal, latex_format, check_urls, field_present, replace_with_backup, UrlCache, URL_CACHE_FILE, URL_CACHE_TTL_DAYS
+from cv_utils import MAX_WORKERS, MAX_PER_HOST, CIRCUIT_OPEN, read_csv, read_csv_index, open_output, record_id, dateutil_relativedelta
+from cv_utils import profiled, add_profile_args, check_profile_args, profile_run
+from cv_utils import HttpClient, set_default_http_client, load_url_policy, set_default_url_policy, CONNECT_TIMEOUT, READ_TIMEOUT, MAX_HOST_FAILURES, URL_POLICY_FILE
 
 CONF_SHORT_STR = 'conf_short'
 CONF_FULL_STR = 'conf_full'
@@ -23,10 +23,9 @@ START_NUM_STR = 'start_num'
 ROLE_STR = 'role'
 NOTES_STR = 'notes'
 
+# conferences is {short name: row}, see read_csv_index
 def lookup_conf(conferences, conf_short):    
-    for conference in conferences:
-        if conference[CONF_SHORT_STR] == conf_short:
-            return conference
+    return conferences.get(conf_short)
 
 def format_conf(tpc, conferences, conf_short, url=''):
     conference = lookup_conf(conferences, conf_short)
@@ -47,26 +46,16 @@ def format_conf(tpc, conferences, conf_short, url=''):
     else:
         return (f"The {latex_format(conf_short)}",url)
 
+@profiled('render')
 def gen_latex(tpcs_file, conferences_file, logger, debug, tex_out):
-    if os.name == 'nt':
-        logger.info("Opening csv files in Windows mode")
-        tpcs_f = open(tpcs_file,'r', newline='', )
-        conferences_f = open(conferences_file,'r', newline='')
-    else:
-        logger.info(f"Opening csv files in {os.name} mode")
-        tpcs_f = open(tpcs_file,'r',encoding='utf-8-sig')
-        conferences_f = open(conferences_file,'r',encoding='utf-8-sig')
-        
-    tpcs = csv.DictReader(tpcs_f)
-    conferences = csv.DictReader(conferences_f)
+    tpcs = read_csv(tpcs_file)
+    conferences = read_csv_index(conferences_file, CONF_SHORT_STR)
     
-    tex_f = open(tex_out, 'w')
+    tex_f = open_output(tex_out)
     
     tex_f.write(r"\begin{innerenum}" + "\n")
     for tpc in tpcs:
         logger.debug(f"Processing {tpc}")
-        # reset csv file
-        conferences_f.seek(0)
         conf_name, url_str = format_conf(tpc, conferences, tpc[CONF_STR], tpc[URL_STR])
         if url_str and url_str != 'none':
             tpc_row = f"\\item \\textit{{\\href{{{url_str}}}{{{latex_format(conf_name)}}}}}, {tpc[YEAR_STR].strip()}{' (' + latex_format(tpc[NOTES_STR]) + ')' if tpc[NOTES_STR] else ''}.\n"
@@ -76,23 +65,13 @@ def gen_latex(tpcs_file, conferences_file, logger, debug, tex_out):
     tex_f.write(r"\end{innerenum}")
     
     tex_f.close()
-    tpcs_f.close()
-    conferences_f.close()
     
+@profiled('render')
 def gen_html(tpcs_file, conferences_file, logger, debug, html_out):
-    if os.name == 'nt':
-        logger.info("Opening csv files in Windows mode")
-        tpcs_f = open(tpcs_file,'r', newline='', )
-        conferences_f = open(conferences_file,'r', newline='')
-    else:
-        logger.info(f"Opening csv files in {os.name} mode")
-        tpcs_f = open(tpcs_file,'r',encoding='utf-8-sig')
-        conferences_f = open(conferences_file,'r',encoding='utf-8-sig')
-        
-    tpcs = csv.DictReader(tpcs_f)
-    conferences = csv.DictReader(conferences_f)
+    tpcs = read_csv(tpcs_file)
+    conferences = read_csv_index(conferences_file, CONF_SHORT_STR)
     
-    html_f = open(html_out, 'w')
+    html_f = open_output(html_out)
     
     # html_f.write(r'<div class="accordion"><input type="radio" name="select" class="accordion-select" checked /><div class="accordion-title"><span><b>Current Program Committees</b></span></div><div class="accordion-content"><ul>'+ "\n")
     
@@ -106,8 +85,6 @@ def gen_html(tpcs_file, conferences_file, logger, debug, html_out):
     current_tpcs = True
     for tpc in tpcs:
         logger.debug(f"Processing {tpc}")
-        # reset csv file
-        conferences_f.seek(0)
         conf_name, url_str = format_conf(tpc, conferences, tpc[CONF_STR], tpc[URL_STR])
         if current_tpcs and int(tpc[YEAR_STR]) < int(datetime.now().year):
             # html_f.write(r'</ul></div><input type="radio" name="select" class="accordion-select" /><div class="accordion-title"><span><b>Past Program Committees</span></b></span></div><div class="accordion-content"><ul>'+ "\n")
@@ -129,29 +106,19 @@ def gen_html(tpcs_file, conferences_file, logger, debug, html_out):
     html_f.write(r'</ul></div></div></div>')
     
     html_f.close()
-    tpcs_f.close()
-    conferences_f.close()
     
+@profiled('render')
 def gen_xml(tpcs_file, conferences_file, logger, debug, xml_out):   
-    if os.name == 'nt':
-        logger.info("Opening csv files in Windows mode")
-        tpcs_f = open(tpcs_file,'r', newline='', )
-        conferences_f = open(conferences_file,'r', newline='')
-    else:
-        logger.info(f"Opening csv files in {os.name} mode")
-        tpcs_f = open(tpcs_file,'r',encoding='utf-8-sig')
-        conferences_f = open(conferences_file,'r',encoding='utf-8-sig')
-        
-    tpcs = csv.DictReader(tpcs_f)
-    conferences = csv.DictReader(conferences_f)
+    tpcs = read_csv(tpcs_file)
+    conferences = read_csv_index(conferences_file, CONF_SHORT_STR)
     
-    xml_f = open(xml_out, 'w')
+    xml_f = open_output(xml_out)
     
     gen_xml_header(xml_f)
     
     for tpc in tpcs:
         logger.debug(f"Processing {tpc} for CCV")
-        xml_f.write(f'\t\t\t<section id="7564fc922478441c97c9857809028895" label="Event Administration" recordId="{uuid.uuid4().hex}">\n')
+        xml_f.write(f'\t\t\t<section id="7564fc922478441c97c9857809028895" label="Event Administration" recordId="{record_id(tpc[CONF_STR], tpc[YEAR_STR], tpc[ROLE_STR])}">\n')
         
         if field_present(ROLE_STR, tpc):
             if tpc[ROLE_STR] == 'TPC Chair':
@@ -163,12 +130,10 @@ def gen_xml(tpcs_file, conferences_file, logger, debug, xml_out):
         else:
             role = 'Technical Program Committee Member'
             
-         # reset csv file
-        conferences_f.seek(0)
         conf_name, url_str = format_conf(tpc, conferences, tpc[CONF_STR], tpc[URL_STR])
         
         conf_date = datetime(int(tpc[YEAR_STR]),int(tpc[MONTH_STR]) if field_present(MONTH_STR,tpc) else 1,1)
-        tpc_start_date = conf_date - relativedelta(years=1)
+        tpc_start_date = conf_date - dateutil_relativedelta.relativedelta(years=1)
                        
         xml_f.write('\t\t\t\t<field id="31cdeb30328e410cb6b78fa48435be08" label="Role">\n'
                     f'\t\t\t\t\t<value type="String">{role}</value>\n'
@@ -204,6 +169,7 @@ def gen_xml(tpcs_file, conferences_file, logger, debug, xml_out):
         xml_f.write('\t\t\t</section>\n')                 
         
     gen_xml_footer(xml_f)
+    xml_f.close()
     return
     
 def gen_xml_header(xml_f):
@@ -217,48 +183,77 @@ def gen_xml_footer(xml_f):
     xml_f.write('\t</section>\n')
     xml_f.write('</generic-cv:generic-cv>\n')  
     
-def fix_urls(tpcs_file, conferences_file, logger, debug):
-    if os.name == 'nt':
-        logger.info("Opening csv files in Windows mode")
-        tpcs_f = open(tpcs_file,'r', newline='', )
-        conferences_f = open(conferences_file,'r', newline='')
-    else:
-        logger.info(f"Opening csv files in {os.name} mode")
-        tpcs_f = open(tpcs_file,'r',encoding='utf-8-sig')
-        conferences_f = open(conferences_file,'r',encoding='utf-8-sig')
-    tempfile = NamedTemporaryFile('w+t', newline='', delete=False)
-    logger.info(f"Using temporary file {tempfile.name}")
-    
-    tpcs = csv.DictReader(tpcs_f)
-    conferences = csv.DictReader(conferences_f)
-    tempwriter = csv.DictWriter(tempfile, tpcs.fieldnames)
-    tempwriter.writeheader()
-    updated = False
+# rows whose url check finished, as {row number: (url, status)}
+def load_checkpoint(checkpoint_file):
+    if not os.path.exists(checkpoint_file):
+        return {}
+    with open(checkpoint_file, 'r', newline='') as checkpoint_f:
+        return {int(row['row']): (row['url'], int(row['status']) if row['status'].isdigit() else row['status']) for row in csv.DictReader(checkpoint_f)}
 
-    for tpc in tpcs:
-        logger.debug(f"Processing {tpc}")
-        # reset csv file
-        conferences_f.seek(0)
+@profiled('fix-urls')
+def fix_urls(tpcs_file, conferences_file, logger, debug, cache=None, checkpoint_file='', max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST):
+    rows = read_csv(tpcs_file)
+    conferences = read_csv_index(conferences_file, CONF_SHORT_STR)
+
+    row_urls = defaultdict(list)
+    for i, tpc in enumerate(rows):
         conf_name, url_str = format_conf(tpc, conferences, tpc[CONF_STR], tpc[URL_STR])
-        logger.debug(f"Got URL {url_str}")
+        logger.debug(f"Got URL {url_str} for {tpc}")
         if url_str and url_str != 'none':
-            logger.debug(f"Checking URL {url_str}")
-            status = check_url(url_str)
-            if (status != 200 and status != 'skipped'):
-                logger.info(f"Removing {url_str} for {tpc}.")                
-                tpc[URL_STR] = 'none'
+            row_urls[url_str].append(i)
+
+    # resume from the rows an interrupted run already checked, as long as their url is unchanged
+    checkpoint_file = checkpoint_file or tpcs_file + '.checkpoint'
+    statuses = {}
+    for i, (url, status) in load_checkpoint(checkpoint_file).items():
+        if url in row_urls and i in row_urls[url]:
+            statuses[url] = status
+    if statuses:
+        logger.info(f"Resuming from {checkpoint_file}, {len(statuses)} of {len(row_urls)} urls already checked")
+
+    new_checkpoint = not os.path.exists(checkpoint_file)
+    with open(checkpoint_file, 'a', newline='') as checkpoint_f:
+        checkpoint = csv.writer(checkpoint_f)
+        if new_checkpoint:
+            checkpoint.writerow(['row', 'url', 'status'])
+
+        def checked(url, status):
+            logger.debug(f"Checked URL {url}: {status}")
+            # a tripped circuit breaker says nothing about the url, leave it for the next run
+            if str(status).startswith(CIRCUIT_OPEN):
+                return
+            statuses[url] = status
+            for i in row_urls[url]:
+                checkpoint.writerow([i, url, status])
+            checkpoint_f.flush()
+
+        check_urls([url for url in row_urls if url not in statuses], max_workers=max_workers, max_per_host=max_per_host,
+                   cache=cache, on_result=checked)
+
+    updated = False
+    for url, status in statuses.items():
+        if (status != 200 and status != 'skipped'):
+            for i in row_urls[url]:
+                logger.info(f"Removing {url} for {rows[i]}.")
+                rows[i][URL_STR] = 'none'
                 updated = True
-        tempwriter.writerow(tpc)                  
-           
-    tpcs_f.close()
-    conferences_f.close()
-    tempfile.close()
-    
+    unchecked = len(row_urls) - len(statuses)
+    if unchecked:
+        logger.error(f"{unchecked} urls were not checked because their host kept failing, rerun to check them")
+
     if updated:
-        shutil.move(tpcs_file, os.path.splitext(tpcs_file)[0]+'-bak'+ os.path.splitext(tpcs_file)[1])
-        shutil.move(tempfile.name, tpcs_file)
-            
-def main():
+        from tempfile import NamedTemporaryFile
+        tempfile = NamedTemporaryFile('w+t', newline='', delete=False, dir=os.path.dirname(os.path.abspath(tpcs_file)))
+        logger.info(f"Using temporary file {tempfile.name}")
+        tempwriter = csv.DictWriter(tempfile, list(rows[0]))
+        tempwriter.writeheader()
+        tempwriter.writerows(rows)
+        tempfile.close()
+        replace_with_backup(tpcs_file, tempfile.name)
+    if not unchecked:
+        os.unlink(checkpoint_file)
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Generate Student tex/html file for TPCs')
     parser.add_argument('file', type=str, help='Input TPCs csv file')
     parser.add_argument('conferences', type=str, help='Conference names csv file')    
@@ -268,7 +263,19 @@ def main():
     parser.add_argument('--fix_urls', dest='fix_urls', default=False, action='store_true', help='Fix URLs in csv file')
     parser.add_argument('--xml', dest='tpcs_xml', type=str, default='tpcs.xml', help='CCV XML output file')    
     parser.add_argument('--out_dir', dest='out_dir', type=str, default='', help='Output directory')
-    args = parser.parse_args()   
+    parser.add_argument('--url_cache', dest='url_cache', type=str, default=URL_CACHE_FILE, help='URL status cache file used by --fix_urls, empty to disable')
+    parser.add_argument('--url_cache_ttl', dest='url_cache_ttl', type=float, default=URL_CACHE_TTL_DAYS, help='Days before a cached URL status is rechecked')
+    parser.add_argument('--refresh_urls', dest='refresh_urls', action='store_true', default=False, help='Ignore cached URL statuses and recheck every URL')
+    parser.add_argument('--connect_timeout', dest='connect_timeout', type=float, default=CONNECT_TIMEOUT, help='Seconds to wait for a connection to a host')
+    parser.add_argument('--read_timeout', dest='read_timeout', type=float, default=READ_TIMEOUT, help='Seconds to wait for a host to answer')
+    parser.add_argument('--max_host_failures', dest='max_host_failures', type=int, default=MAX_HOST_FAILURES, help='Consecutive failures before the remaining URLs of a host fail without being fetched, 0 to never give up')
+    parser.add_argument('--url_policy', dest='url_policy', type=str, default=URL_POLICY_FILE, help='CSV of skip/allow URL prefix rules')
+    parser.add_argument('--checkpoint', dest='checkpoint', type=str, default='', help='File recording checked rows so an interrupted --fix_urls resumes, defaults to <file>.checkpoint')
+    parser.add_argument('--max_workers', dest='max_workers', type=int, default=MAX_WORKERS, help='Maximum number of URLs checked at once')
+    parser.add_argument('--max_per_host', dest='max_per_host', type=int, default=MAX_PER_HOST, help='Maximum number of URLs checked at once on a single host')
+    add_profile_args(parser)
+    args = parser.parse_args(argv)   
+    check_profile_args(parser, args)
 
     if (args.debug == 'debug'):
         logging.basicConfig(level=logging.DEBUG)
@@ -288,12 +295,18 @@ def main():
         html_out = args.html_out
         xml_out = args.tpcs_xml
 
-    if args.fix_urls:
-        fix_urls(args.file, args.conferences, logger, args.debug)
-    else:
-        gen_latex(tpcs_file=args.file, conferences_file=args.conferences, logger=logger, debug=args.debug, tex_out=tex_out)
-        gen_html(tpcs_file=args.file, conferences_file=args.conferences, logger=logger, debug=args.debug, html_out=html_out)
-        gen_xml(tpcs_file=args.file, conferences_file=args.conferences, logger=logger, debug=args.debug, xml_out=xml_out)
+    with profile_run('gen_tpcs', args):
+        if args.fix_urls:
+            set_default_http_client(HttpClient(connect_timeout=args.connect_timeout, read_timeout=args.read_timeout, max_host_failures=args.max_host_failures))
+            set_default_url_policy(load_url_policy(args.url_policy))
+            cache = UrlCache(args.url_cache, ttl_days=args.url_cache_ttl, refresh=args.refresh_urls) if args.url_cache else None
+            fix_urls(args.file, args.conferences, logger, args.debug, cache, args.checkpoint, args.max_workers, args.max_per_host)
+            if cache:
+                cache.close()
+        else:
+            gen_latex(tpcs_file=args.file, conferences_file=args.conferences, logger=logger, debug=args.debug, tex_out=tex_out)
+            gen_html(tpcs_file=args.file, conferences_file=args.conferences, logger=logger, debug=args.debug, html_out=html_out)
+            gen_xml(tpcs_file=args.file, conferences_file=args.conferences, logger=logger, debug=args.debug, xml_out=xml_out)
 
 # Start program
 if __name__ == "__main__":
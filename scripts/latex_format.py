@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import subprocess
+import time
+import tex_deps
+
+FORMAT_DIR = 'build/fmt/'
+ENGINE = 'pdflatex'
+# mylatexformat dumps the preamble up to \endofdump, or all of it
+END_OF_DUMP_RE = re.compile(r"\\csname\s*endofdump\s*\\endcsname|\\endofdump\b|\\begin\{document\}")
+PROBE_DOCUMENT = "\\begin{document}\nx\n\\end{document}\n"
+
+def static_preamble(text):
+    match = END_OF_DUMP_RE.search(text)
+    return text[:match.start()] if match else text
+
+def engine_version(engine):
+    try:
+        result = subprocess.run([engine, '--version'], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, text=True)
+    except FileNotFoundError:
+        return None
+    return result.stdout.split('\n')[0]
+
+# hash of everything that ends up in the format: the static preamble, ignoring comments and
+# whitespace so variants with the same preamble share a format, the local files it loads and
+# the engine that has to read the format back
+def format_key(tex_file, version):
+    text = static_preamble(tex_deps.read_tex(tex_file))
+    digest = hashlib.sha256((version + '\n' + ' '.join(text.split())).encode())
+    for dep in tex_deps.referenced_in(text, os.path.dirname(tex_file)):
+        for filename in tex_deps.scan_deps(dep)[1]:
+            with open(filename, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+# -fmt takes a name to search for, so relative paths have to be explicitly relative
+def format_arg(fmt):
+    return fmt if os.path.isabs(fmt) else os.path.join('.', fmt)
+
+def run_engine(args):
+    start = time.perf_counter()
+    result = subprocess.run(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    return time.perf_counter() - start, result
+
+# times a one page document with just the static preamble with and without the format
+def per_pass_saving(tex_file, fmt, engine, format_dir):
+    with open(tex_file, 'r', encoding='utf-8', errors='replace') as f:
+        probe_text = static_preamble(f.read()) + PROBE_DOCUMENT
+    probe = fmt + '-probe.tex'
+    with open(probe, 'w', encoding='utf-8') as f:
+        f.write(probe_text)
+    args = ['-interaction=nonstopmode', f"-output-directory={format_dir}", probe]
+    plain, _ = run_engine([engine] + args)
+    with_format, _ = run_engine([engine, f"-fmt={format_arg(fmt)}"] + args)
+    return max(0.0, plain - with_format)
+
+def format_info(fmt):
+    try:
+        with open(fmt + '.json', 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+# returns the format for tex_file's static preamble, dumping it with mylatexformat unless
+# one with the same key already exists, or None if it can't be made
+def make_format(tex_file, logger, format_dir=FORMAT_DIR, engine=ENGINE):
+    version = engine_version(engine)
+    if version is None:
+        logger.warning(f"{engine} not found, compiling without a preamble format")
+        return None
+    name = 'preamble-' + format_key(tex_file, version)
+    fmt = os.path.join(format_dir, name)
+    if os.path.exists(fmt + '.fmt'):
+        logger.info(f"Reusing {fmt}.fmt for {tex_file}")
+        return fmt
+    os.makedirs(format_dir, exist_ok=True)
+    # dumped under a temporary name so a concurrent build never loads a half written format
+    job = f"{name}-{os.getpid()}"
+    base_format = os.path.splitext(os.path.basename(engine))[0]
+    dump, result = run_engine([engine, '-ini', '-interaction=nonstopmode', f"-jobname={job}", f"-output-directory={format_dir}",
+                               f"&{base_format}", 'mylatexformat.ltx', tex_file])
+    if result.returncode != 0 or not os.path.exists(os.path.join(format_dir, job + '.fmt')):
+        logger.warning(f"Dumping the preamble of {tex_file} failed, compiling without a format, see {os.path.join(format_dir, job + '.log')}")
+        return None
+    os.replace(os.path.join(format_dir, job + '.fmt'), fmt + '.fmt')
+    info = {'tex_file': tex_file, 'dump': dump, 'per_pass_saving': per_pass_saving(tex_file, fmt, engine, format_dir)}
+    with open(fmt + '.json', 'w') as f:
+        json.dump(info, f, indent=1, sort_keys=True)
+    logger.info(f"Dumped {fmt}.fmt in {dump:.2f}s, it saves {info['per_pass_saving']:.2f}s per pass")
+    return fmt
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Precompile the static preamble of latex documents into a format file')
+    parser.add_argument('tex_files', type=str, nargs='+', help='Latex documents')
+    parser.add_argument('--format_dir', dest='format_dir', type=str, default=FORMAT_DIR, help='Directory for the format files')
+    parser.add_argument('--engine', dest='engine', type=str, default=ENGINE, help='Latex engine')
+    parser.add_argument('-d', dest='debug', type=str, default='critical', choices = ['debug', 'info', 'error', 'critical'], help='Produce debug output')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=getattr(logging, args.debug.upper()))
+    logger = logging.getLogger("latex_format")
+
+    for tex_file in args.tex_files:
+        fmt = make_format(tex_file, logger, args.format_dir, args.engine)
+        if fmt:
+            print(f"{tex_file}: {fmt}.fmt, saves {format_info(fmt).get('per_pass_saving', 0):.2f}s per pass")
+
+# Start program
+if __name__ == "__main__":
+    main()
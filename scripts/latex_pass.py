@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import time
+
+PASSES_FILE = 'passes.jsonl'
+REPORT_FILE = 'build_report.json'
+# warnings that make latexmk (or the user) run latex again
+RERUN_RE = re.compile(r"[Rr]erun|have changed|may have changed|undefined references")
+WARNING_RE = re.compile(r"^(?:LaTeX|Package|Class) .*Warning: ")
+CONTINUATION_RE = re.compile(r"^\([\w@.-]+\)\s+")
+
+# LaTeX warnings, joined across the lines latex wraps them onto
+def log_warnings(log_file):
+    try:
+        with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
+            lines = f.read().split('\n')
+    except FileNotFoundError:
+        return []
+    warnings = []
+    for i, line in enumerate(lines):
+        if not WARNING_RE.match(line):
+            continue
+        warning = line
+        for next_line in lines[i + 1:]:
+            if CONTINUATION_RE.match(next_line):
+                warning = warning + ' ' + CONTINUATION_RE.sub('', next_line)
+            elif next_line.strip() and not WARNING_RE.match(next_line) and not warning.rstrip().endswith('.'):
+                warning = warning + next_line
+            else:
+                break
+        warnings.append(re.sub(r'\s+on input line \d+', '', ' '.join(warning.split())))
+    return warnings
+
+def rerun_warnings(log_file):
+    return [warning for warning in log_warnings(log_file) if RERUN_RE.search(warning)]
+
+def option(args, name):
+    values = [arg[len(name):] for arg in args if arg.startswith(name)]
+    return values[-1] if values else ''
+
+def log_file(args):
+    jobname = option(args, '-jobname=') or os.path.splitext(os.path.basename(args[-1]))[0]
+    out_dir = option(args, '-output-directory=') or option(args, '--output-directory=') or '.'
+    return os.path.join(out_dir, jobname + '.log')
+
+# the command latexmk runs instead of the engine: runs one pass and appends its time and
+# rerun warnings to passes_file
+def engine_command(passes_file, engine_args):
+    return ' '.join(shlex.quote(arg) for arg in [sys.executable, os.path.abspath(__file__), passes_file] + engine_args)
+
+def read_passes(passes_file):
+    try:
+        with open(passes_file, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+# each pass after the first was caused by the warnings of the pass before it
+def build_report(tex_file, seconds, passes):
+    report = {'tex_file': tex_file, 'seconds': seconds, 'passes': len(passes),
+              'latex_seconds': sum(latex_pass['seconds'] for latex_pass in passes), 'runs': []}
+    for i, latex_pass in enumerate(passes):
+        cause = passes[i - 1]['rerun_warnings'] if i > 0 else ['first pass']
+        report['runs'].append({'pass': i + 1, 'seconds': latex_pass['seconds'], 'cause': cause or ['latexmk found changed files']})
+    return report
+
+def save_report(report, report_file):
+    with open(report_file, 'w') as f:
+        json.dump(report, f, indent=1)
+
+def summary(report):
+    lines = [f"{report['tex_file']}: {report['passes']} latex passes, {report['latex_seconds']:.2f}s of {report['seconds']:.2f}s"]
+    for run in report['runs']:
+        lines.append(f"  pass {run['pass']} {run['seconds']:>6.2f}s  {'; '.join(run['cause'])}")
+    return '\n'.join(lines)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    passes_file, engine_args = argv[0], argv[1:]
+    start = time.perf_counter()
+    returncode = subprocess.call(engine_args)
+    latex_pass = {'seconds': time.perf_counter() - start, 'returncode': returncode,
+                  'rerun_warnings': rerun_warnings(log_file(engine_args))}
+    with open(passes_file, 'a') as f:
+        f.write(json.dumps(latex_pass) + '\n')
+    sys.exit(returncode)
+
+# Start program
+if __name__ == "__main__":
+    main()
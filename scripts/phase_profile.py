@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+import sys
+import time
+
+TOP_SITES = 10
+
+# time and calls of each named phase of a run, a nested phase's time only counting once.
+# With memory also its peak, retained memory and top allocation sites (first call only).
+class PhaseProfiler:
+    def __init__(self, memory=False):
+        self.phases = {}
+        self.stack = []
+        self.memory = memory
+        self.peak = 0
+
+    def enter(self, name):
+        now = time.perf_counter()
+        if self.stack:
+            self.phases[self.stack[-1][0]]['seconds'] += now - self.stack[-1][1]
+        if name not in self.phases:
+            self.phases[name] = {'seconds': 0.0, 'calls': 0}
+            if self.memory:
+                self.phases[name].update(peak_bytes=0, peak_increase_bytes=0, retained_bytes=0, top_sites=[])
+        phase = self.phases[name]
+        phase['calls'] += 1
+        entry = [name, now]
+        if self.memory:
+            import tracemalloc
+            current = self.traced()
+            sites = allocation_sites() if phase['calls'] == 1 else None
+            tracemalloc.reset_peak()
+            # [name, start, memory at start, peak so far, allocation sites at start]
+            entry = [name, time.perf_counter(), current, current, sites]
+        self.stack.append(entry)
+
+    def exit(self):
+        now = time.perf_counter()
+        entry = self.stack[-1]
+        phase = self.phases[entry[0]]
+        phase['seconds'] += now - entry[1]
+        if self.memory:
+            current = self.traced()
+            phase['peak_bytes'] = max(phase['peak_bytes'], entry[3])
+            phase['peak_increase_bytes'] = max(phase['peak_increase_bytes'], entry[3] - entry[2])
+            phase['retained_bytes'] += current - entry[2]
+            if entry[4] is not None:
+                phase['top_sites'] = top_sites(entry[4], allocation_sites())
+        self.stack.pop()
+        if self.stack:
+            if self.memory:
+                import tracemalloc
+                # the parent was running all along, so its peak includes this one's
+                self.stack[-1][3] = max(self.stack[-1][3], entry[3])
+                tracemalloc.reset_peak()
+            self.stack[-1][1] = time.perf_counter()
+
+    # traced memory now, charging its peak since the last reset to the running phase
+    def traced(self):
+        import tracemalloc
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        if self.stack:
+            self.stack[-1][3] = max(self.stack[-1][3], peak)
+        return current
+
+    @contextmanager
+    def phase(self, name):
+        self.enter(name)
+        try:
+            yield
+        finally:
+            self.exit()
+
+# traced memory by allocating line, without tracemalloc's and this module's own
+def allocation_sites():
+    import tracemalloc
+    snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)))
+    return snapshot.statistics('lineno')
+
+# the TOP_SITES lines whose allocations grew the most from before to after
+def top_sites(before, after):
+    before = {stat.traceback: stat for stat in before}
+    grown = [(stat.size - (before[stat.traceback].size if stat.traceback in before else 0),
+              stat.count - (before[stat.traceback].count if stat.traceback in before else 0), str(stat.traceback[0])) for stat in after]
+    return [{'site': site, 'bytes': size, 'blocks': blocks} for size, blocks, site in sorted(grown, reverse=True)[:TOP_SITES] if size > 0]
+
+# the profiler of the current run, None unless it was started with --profile or --pstats
+profiler = None
+
+def phase(name):
+    return profiler.phase(name) if profiler else nullcontext()
+
+# times every call of the decorated function as the phase name when profiling. Generators
+# share load, parse, sort, latex-encode, render and write, and may add their own phases.
+def profiled(name):
+    def decorate(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if profiler is None:
+                return f(*args, **kwargs)
+            profiler.enter(name)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                profiler.exit()
+        return wrapper
+    return decorate
+
+# sorted() timed as the sort phase, rather than each call of a cmp_to_key comparator
+def profiled_sorted(iterable, key=None, reverse=False):
+    with phase('sort'):
+        return sorted(iterable, key=key, reverse=reverse)
+
+def add_profile_args(parser):
+    parser.add_argument('--profile', dest='profile', type=str, default='', help='Write the time and calls of each phase of the run to this JSON file')
+    parser.add_argument('--pstats', dest='pstats', type=str, default='', help='Also write cProfile stats of the run to this file')
+    parser.add_argument('--memory', dest='memory', action='store_true', default=False, help='Also record the peak memory and top allocation sites of each phase in the --profile file, several times slower')
+
+# call after parse_args, usage errors exit like argparse's own
+def check_profile_args(parser, args):
+    if args.memory and not args.profile:
+        parser.error('--memory is recorded in the --profile file, give one')
+
+# profiles the body of a generator's main, see add_profile_args
+@contextmanager
+def profile_run(script, args):
+    global profiler
+    if not (args.profile or args.pstats):
+        yield
+        return
+    profiler = PhaseProfiler(args.memory)
+    if args.memory:
+        import tracemalloc
+        # a caller such as bench_generators.py may already be tracing
+        tracing = not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+    if args.pstats:
+        import cProfile
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        if args.pstats:
+            cprofile.disable()
+            cprofile.dump_stats(args.pstats)
+        if args.memory:
+            profiler.traced()
+            if tracing:
+                tracemalloc.stop()
+        phases = dict(sorted(profiler.phases.items(), key=lambda item: item[1]['seconds'], reverse=True))
+        result = {'script': script, 'argv': sys.argv[1:], 'python': sys.version.split()[0], 'seconds': seconds,
+                  'phases': phases, 'other_seconds': seconds - sum(phase['seconds'] for phase in phases.values())}
+        if args.memory:
+            result['peak_bytes'] = profiler.peak
+        profiler = None
+        if args.profile:
+            import json
+            with open(args.profile, 'w') as f:
+                json.dump(result, f, indent=1)
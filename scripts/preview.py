@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import argparse
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from latex_format import ENGINE
+
+PREVIEW_DIR = 'build/preview/'
+SECTION_DIRS = ['sections', 'generated']
+DOCUMENTCLASS_RE = re.compile(r"\\documentclass\s*(?:\[[^\]]*\])?\s*\{(?P<cls>[^}]*)\}")
+BIBENTRIES = 'generated/bibentries.tex'
+
+# awards, sections/awards.tex, phd_students ... -> the file under sections/ or generated/
+def resolve_section(name, root_dir=''):
+    candidates = [name] + [os.path.join(section_dir, os.path.splitext(name)[0] + '.tex') for section_dir in SECTION_DIRS]
+    for candidate in candidates:
+        if os.path.isfile(os.path.join(root_dir, candidate)):
+            return candidate
+    return None
+
+# the section on its own with tex_file's preamble, the class in draft mode
+def preview_tex(tex_file, section, root_dir=''):
+    with open(os.path.join(root_dir, tex_file), 'r', encoding='utf-8') as f:
+        preamble = f.read().split('\\begin{document}')[0]
+    match = DOCUMENTCLASS_RE.search(preamble)
+    draft = f"\\PassOptionsToClass{{draft}}{{{match['cls']}}}\n" if match else ''
+    bibentries = f"\\input{{{os.path.splitext(BIBENTRIES)[0]}}}\n" if os.path.exists(os.path.join(root_dir, BIBENTRIES)) else ''
+    return (draft + preamble + "\\begin{document}\n" + bibentries +
+            f"\\input{{{os.path.splitext(section)[0]}}}\n\\end{{document}}\n")
+
+# one latex pass, there are no citations or page references worth resolving in a preview
+def preview(section, tex_file, preview_dir, engine, logger):
+    os.makedirs(preview_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(section))[0]
+    preview_file = os.path.join(preview_dir, name + '.tex')
+    with open(preview_file, 'w', encoding='utf-8') as f:
+        f.write(preview_tex(tex_file, section))
+    start = time.perf_counter()
+    result = subprocess.run([engine, '-interaction=nonstopmode', '-halt-on-error', f"-output-directory={preview_dir}", preview_file],
+                            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        logger.error(f"{engine} failed on {preview_file}:\n{result.stdout[-2000:]}")
+        return None, seconds
+    return os.path.join(preview_dir, name + '.pdf'), seconds
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compile a single section of the CV for a quick look')
+    parser.add_argument('section', type=str, help='Section to preview, a file in sections/ or generated/, e.g. awards or phd_students')
+    parser.add_argument('--tex', dest='tex_file', type=str, default='cv-new.tex', help='CV whose preamble to use')
+    parser.add_argument('--preview_dir', dest='preview_dir', type=str, default=PREVIEW_DIR, help='Output directory')
+    parser.add_argument('--engine', dest='engine', type=str, default=ENGINE, help='Latex engine')
+    parser.add_argument('-d', dest='debug', type=str, default='critical', choices = ['debug', 'info', 'error', 'critical'], help='Produce debug output')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=getattr(logging, args.debug.upper()))
+    logger = logging.getLogger("preview")
+
+    section = resolve_section(args.section)
+    if section is None:
+        parser.error(f"no section {args.section} in {' or '.join(SECTION_DIRS)}")
+    pdf, seconds = preview(section, args.tex_file, args.preview_dir, args.engine, logger)
+    if pdf is None:
+        sys.exit(1)
+    print(f"{pdf} in {seconds:.2f}s")
+
+# Start program
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+import argparse
+import logging
+import os
+import re
+
+GENERATED_DIR = 'generated/'
+# files that can \input others
+SCANNED_EXTENSIONS = ('.tex', '.sty', '.cls')
+
+# \input{file}, \include{file}, \bibliography{a,b}, \usepackage[options]{a,b} ...
+DEP_RE = re.compile(r"\\(?P<command>input|include|bibliography|nobibliography|bibliographystyle|usepackage|documentclass)\s*(?:\[[^\]]*\])?\s*\{(?P<names>[^}]*)\}")
+COMMENT_RE = re.compile(r"(?<!\\)%.*")
+# extension added to names given without one, and whether a file that doesn't exist
+# (yet) is still a dependency. Missing packages and styles come from the tex distribution.
+EXTENSIONS = {
+    'input': ('.tex', True),
+    'include': ('.tex', True),
+    'bibliography': ('.bib', True),
+    'nobibliography': ('.bib', True),
+    'bibliographystyle': ('.bst', False),
+    'usepackage': ('.sty', False),
+    'documentclass': ('.cls', False),
+}
+
+def read_tex(tex_file):
+    with open(tex_file, 'r', encoding='utf-8', errors='replace') as f:
+        return COMMENT_RE.sub('', f.read())
+
+def referenced_files(tex_file, root_dir):
+    return referenced_in(read_tex(tex_file), root_dir)
+
+def referenced_in(text, root_dir):
+    for match in DEP_RE.finditer(text):
+        extension, always = EXTENSIONS[match['command']]
+        for name in match['names'].split(','):
+            name = name.strip()
+            if not name:
+                continue
+            if not os.path.splitext(name)[1] or match['command'] not in ('input', 'include'):
+                name = name + extension
+            filename = os.path.normpath(os.path.join(root_dir, name))
+            if always or os.path.exists(filename):
+                yield filename
+
+# returns every file tex_file pulls in, following \input and \include through the files
+# that exist, and the files that were scanned. Generated files are dependencies but aren't
+# scanned, so the dependency list doesn't need them to exist.
+def scan_deps(tex_file, generated_dir=GENERATED_DIR):
+    root_dir = os.path.dirname(tex_file)
+    generated_dir = os.path.normpath(os.path.join(root_dir, generated_dir))
+    deps = [os.path.normpath(tex_file)]
+    scanned = []
+    for filename in deps:
+        if (not os.path.exists(filename) or os.path.dirname(filename) == generated_dir or
+                os.path.splitext(filename)[1] not in SCANNED_EXTENSIONS):
+            continue
+        scanned.append(filename)
+        for dep in referenced_files(filename, root_dir):
+            if dep not in deps:
+                deps.append(dep)
+    return deps, scanned
+
+# make rules for target, plus dep_file so it's regenerated when an \input changes. The
+# empty rules for the scanned files keep make from failing after one of them is deleted.
+def make_rules(target, deps, scanned, dep_file=''):
+    rules = f"{target}: {' '.join(deps)}\n"
+    if dep_file:
+        rules += f"{dep_file}: {' '.join(scanned)}\n"
+    rules += ''.join(f"{filename}:\n" for filename in scanned)
+    return rules
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='List the files each latex document includes as make dependencies of its PDF')
+    parser.add_argument('tex_files', type=str, nargs='+', help='Latex documents to scan')
+    parser.add_argument('-o', dest='output', type=str, default='', help='Write the make rules to this file instead of printing them')
+    parser.add_argument('--generated_dir', dest='generated_dir', type=str, default=GENERATED_DIR, help='Directory of generated files, listed but not scanned')
+    parser.add_argument('-d', dest='debug', type=str, default='critical', choices = ['debug', 'info', 'error', 'critical'], help='Produce debug output')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=getattr(logging, args.debug.upper()))
+    logger = logging.getLogger("tex_deps")
+
+    rules = ''
+    for tex_file in args.tex_files:
+        deps, scanned = scan_deps(tex_file, args.generated_dir)
+        logger.info(f"{tex_file} depends on {len(deps)} files, scanned {len(scanned)}")
+        rules += make_rules(os.path.splitext(tex_file)[0] + '.pdf', deps, scanned, args.output)
+    if args.output:
+        # always written, make compares its timestamp with the files it lists
+        with open(args.output, 'w') as f:
+            f.write(rules)
+    else:
+        print(rules, end='')
+
+# Start program
+if __name__ == "__main__":
+    main()
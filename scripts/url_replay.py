@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# headers that describe the recorded connection rather than the response
+SKIPPED_HEADERS = ('connection', 'keep-alive', 'transfer-encoding', 'content-length')
+
+class UrlRecorder:
+    # collects every response HttpClient sees so it can be replayed offline
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hops = {}
+        self.urls = {}
+
+    def response(self, method, url, response, latency):
+        with self.lock:
+            self.hops[f"{method} {url}"] = {'status': response.status, 'reason': response.reason,
+                                            'headers': response.getheaders(), 'latency': latency}
+
+    def error(self, method, url, error, latency):
+        with self.lock:
+            self.hops[f"{method} {url}"] = {'error': str(error), 'latency': latency}
+
+    def result(self, url, status, redirects):
+        with self.lock:
+            self.urls[url] = {'status': status, 'redirects': redirects}
+
+    def save(self, fixture_file):
+        # merge into an existing recording so files can be recorded one at a time
+        try:
+            with open(fixture_file, 'r') as f:
+                fixtures = json.load(f)
+        except FileNotFoundError:
+            fixtures = {'hops': {}, 'urls': {}}
+        fixtures['hops'].update(self.hops)
+        fixtures['urls'].update(self.urls)
+        with open(fixture_file, 'w') as f:
+            json.dump(fixtures, f, indent=1, sort_keys=True)
+
+def load_fixtures(fixture_file):
+    with open(fixture_file, 'r') as f:
+        return json.load(f)
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def replay(self):
+        # requests arrive proxy style, so self.path is the original url
+        hop = self.server.fixtures['hops'].get(f"{self.command} {self.path}")
+        if hop is None:
+            self.send_response(502, 'Not recorded')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        time.sleep(hop['latency'] * self.server.latency_scale)
+        if 'error' in hop:
+            # the recorded request never got a response
+            self.close_connection = True
+            return
+        self.send_response(hop['status'], hop['reason'])
+        for name, value in hop['headers']:
+            if name.lower() not in SKIPPED_HEADERS:
+                self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_GET = replay
+    do_HEAD = replay
+
+    def log_message(self, format, *args):
+        pass
+
+class ReplayServer(ThreadingHTTPServer):
+    # local stand-in that answers HttpClient(proxy=server.server_address) from a recording
+    daemon_threads = True
+
+    def __init__(self, fixture_file, latency_scale=1.0, address=('127.0.0.1', 0)):
+        super().__init__(address, ReplayHandler)
+        self.fixtures = load_fixtures(fixture_file)
+        self.latency_scale = latency_scale
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+import json
+import math
+import threading
+from collections import defaultdict
+from cv_utils import url_host, TIMED_PHASES
+
+SLOWEST_URLS = 10
+STATS = ('p50', 'p95', 'max')
+
+# nearest-rank percentile of a non-empty list
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def latency_stats(values):
+    return {'p50': percentile(values, 50), 'p95': percentile(values, 95), 'max': max(values)}
+
+class UrlTimer:
+    # collects the per-phase timings HttpClient measures for each url it fetches
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.urls = {}
+
+    def result(self, url, status, phases, total):
+        with self.lock:
+            self.urls[url] = dict(phases, total=total, status=str(status), host=url_host(url))
+
+    def report(self, slowest=SLOWEST_URLS):
+        by_host = defaultdict(list)
+        for timing in self.urls.values():
+            by_host[timing['host']].append(timing)
+        hosts = {}
+        for host, timings in by_host.items():
+            hosts[host] = {'urls': len(timings)}
+            for phase in TIMED_PHASES + ('total',):
+                hosts[host][phase] = latency_stats([timing[phase] for timing in timings])
+        slowest_urls = sorted(self.urls.items(), key=lambda item: item[1]['total'], reverse=True)[:slowest]
+        return {'hosts': hosts, 'slowest': [dict(timing, url=url) for url, timing in slowest_urls]}
+
+    def save(self, json_file, slowest=SLOWEST_URLS):
+        with open(json_file, 'w') as f:
+            json.dump(self.report(slowest), f, indent=1, sort_keys=True)
+
+    # flat (name, value) pairs for pytest's record_testsuite_property
+    def junit_properties(self, slowest=SLOWEST_URLS):
+        report = self.report(slowest)
+        properties = []
+        for host, stats in sorted(report['hosts'].items()):
+            for stat in STATS:
+                properties.append((f"url_latency.{host}.{stat}", f"{stats['total'][stat]:.3f}"))
+        for i, timing in enumerate(report['slowest'], 1):
+            properties.append((f"url_slowest.{i}", f"{timing['total']:.3f} {timing['url']}"))
+        return properties
+
+    def summary(self, slowest=SLOWEST_URLS):
+        report = self.report(slowest)
+        lines = [f"{'host':<40}{'urls':>6}{'p50':>8}{'p95':>8}{'max':>8}"]
+        for host, stats in sorted(report['hosts'].items(), key=lambda item: item[1]['total']['max'], reverse=True):
+            lines.append(f"{host:<40}{stats['urls']:>6}" + ''.join(f"{stats['total'][stat]:>8.2f}" for stat in STATS))
+        lines.append(f"Slowest {len(report['slowest'])} urls (total = dns + connect + tls + ttfb + redirects):")
+        for timing in report['slowest']:
+            lines.append(f"{timing['total']:>8.2f}s  dns {timing['dns']:.2f}  connect {timing['connect']:.2f}  tls {timing['tls']:.2f}  ttfb {timing['ttfb']:.2f}  {timing['url']}")
+        return '\n'.join(lines)
@@ -1,63 +1,153 @@
 #!/usr/bin/env python3
 
 import argparse
+from collections import defaultdict
+import mmap
+import os
 import re
-import urllib.request
-import ssl
 import sys
 
+# share the url checking code with the generator scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'scripts'))
+from cv_utils import check_urls, probe_url, set_default_http_client, HttpClient, UrlCache, MAX_WORKERS, MAX_PER_HOST, URL_CACHE_FILE, URL_CACHE_TTL_DAYS
+from cv_utils import load_url_policy, set_default_url_policy, CONNECT_TIMEOUT, READ_TIMEOUT, MAX_HOST_FAILURES, URL_POLICY_FILE
+from url_replay import UrlRecorder, ReplayServer
+from url_timings import UrlTimer
+
+# bibtex url fields, latex \href and html links, matched in a single pass. Matches stop at the
+# end of a line, and negated classes rather than lazy .*? keep the combined pattern as fast as
+# the separate literal ones were.
+URL_RE = re.compile(rb"url\s*=\s*\{(?P<bib>[^}\n]*)\}|href\{(?P<tex>[^}\n]*)\}|a href=[\"\'](?P<html>[^\"\'\n]*)[\"\']")
+
+# lazily yields (url, file, line, kind) for every url in the file, kind being bib, tex or html.
+# The file is mapped rather than read so large inputs are never held in memory as a string.
+def iter_url_locations(filename):
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as text:
+            line, counted = 1, 0
+            for match in URL_RE.finditer(text):
+                kind = match.lastgroup
+                start = match.start(kind)
+                line += text[counted:start].count(b'\n')
+                counted = start
+                yield match.group(kind).decode('utf-8', errors='replace'), filename, line, kind
+
+def iter_urls(filenames):
+    for filename in filenames:
+        yield from iter_url_locations(filename)
+
+# returns (url, line number) for every url in the file
+def find_url_locations(filename):
+    return [(url, line) for url, _, line, _ in iter_url_locations(filename)]
+
 def find_urls(filename):
-    f = open(filename, 'r')
-    f_text = f.read()
-    bib_urls = re.findall("url\s*=\s*\{(.*?)\}", f_text)            
-    href_urls = re.findall("href\{(.*?)\}", f_text)            
-    html_urls = re.findall("a href=[\"\'](.*?)[\"\']", f_text)        
-    return bib_urls + href_urls + html_urls
-
-def check_url(url):
-    if url.startswith("mailto") or url.startswith('https://www.linkedin.com'):
-        return 'skipped'
-    try:
-        req = urllib.request.Request(
-            url, 
-            data=None, 
-            headers={
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_9_3) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/35.0.1916.47 Safari/537.36'
-            }
-        )
-    except Exception as e:
-        return "check_url creation exception: " + str(e) + " on  " + url
-    try:
-        return urllib.request.urlopen(req, context=ssl._create_unverified_context()).getcode()
-    except Exception as e:
-        return "check_url urlopen exception: " + str(e) + " on  " + url
-
-
-def check_tex_url(filename, debug=False, quiet=False):
+    return [url for url, _, _, _ in iter_url_locations(filename)]
+
+def check_tex_url(filename, debug=False, quiet=False, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST, cache=None):
     retval = 0
-    urls = find_urls(filename)     
+    urls = []
+
+    # checking starts while the rest of the file is still being scanned
+    def extracted_urls():
+        for url, _, _, _ in iter_url_locations(filename):
+            urls.append(url)
+            yield url
+
+    statuses = check_urls(extracted_urls(), max_workers=max_workers, max_per_host=max_per_host, cache=cache)
     for url in urls:
-        status = check_url(url)                        
+        status = statuses[url]
         if (status != 200 and status != 'skipped'):
             print ("Failed: " + url + ": " + str(status))
-            retval = -1                
+            retval = -1
         elif (debug):
-            print ("Passed: " + url + ": " + str(status)) 
+            print ("Passed: " + url + ": " + str(status))
     if (not quiet):
-        print("Checked", len(url), "urls.")
+        print("Checked", len(urls), "urls.")
         if (retval != 0):
             print("Failures were detected.")
-            
+
     return retval
 
+# check the urls of several files in one pass, fetching each unique url once
+def check_tex_urls(filenames, debug=False, quiet=False, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST, cache=None):
+    references = defaultdict(list)
+
+    def referenced_urls():
+        for url, filename, line, _ in iter_urls(filenames):
+            references[url].append((filename, line))
+            yield url
+
+    results = check_urls(referenced_urls(), max_workers=max_workers, max_per_host=max_per_host, check=probe_url, cache=cache)
+
+    retvals = {filename: 0 for filename in filenames}
+    num_redirected = 0
+    for url, locations in references.items():
+        status, final_url, redirects = results[url]
+        if len(redirects) > 1:
+            num_redirected += 1
+            if (debug):
+                print(f"Redirected: {' -> '.join(hop for hop, _ in redirects)}")
+        if (status != 200 and status != 'skipped'):
+            for filename, line in locations:
+                print(f"Failed: {filename}:{line}: {url}: {status}")
+                retvals[filename] = -1
+        elif (debug):
+            print(f"Passed: {url}: {status} ({len(locations)} references)")
+    if (not quiet):
+        num_references = sum(len(locations) for locations in references.values())
+        print(f"Checked {len(references)} unique urls from {num_references} references in {len(filenames)} files, avoiding {num_references - len(references)} duplicate fetches.")
+        if num_redirected:
+            print(f"{num_redirected} urls redirect, scripts/canonical_urls.py can rewrite them to their final url.")
+        if any(retvals.values()):
+            print("Failures were detected.")
+
+    return retvals
+
 def main():
     parser = argparse.ArgumentParser(description='Check URLs in latex file')
-    parser.add_argument('file', type=str, help='File to process')
+    parser.add_argument('files', type=str, nargs='+', help='Files to process, urls shared between files are checked once')
     parser.add_argument('-d', dest='debug', action='store_true', default=False, help='Produce debug output')
     parser.add_argument('-q', dest='quiet', action='store_true', default=False, help='Produce summary output')
-    args = parser.parse_args()    
-    retval = check_tex_url(args.file, args.debug, args.quiet)     
-    
+    parser.add_argument('--max_workers', dest='max_workers', type=int, default=MAX_WORKERS, help='Maximum number of URLs checked at once')
+    parser.add_argument('--max_per_host', dest='max_per_host', type=int, default=MAX_PER_HOST, help='Maximum number of URLs checked at once on a single host')
+    parser.add_argument('--url_cache', dest='url_cache', type=str, default=URL_CACHE_FILE, help='URL status cache file, empty to disable')
+    parser.add_argument('--url_cache_ttl', dest='url_cache_ttl', type=float, default=URL_CACHE_TTL_DAYS, help='Days before a cached URL status is rechecked')
+    parser.add_argument('--refresh_urls', dest='refresh_urls', action='store_true', default=False, help='Ignore cached URL statuses and recheck every URL')
+    parser.add_argument('--record', dest='record', type=str, default='', help='Record every response into this fixture file')
+    parser.add_argument('--replay', dest='replay', type=str, default='', help='Answer every request from this fixture file instead of the network')
+    parser.add_argument('--replay_latency_scale', dest='replay_latency_scale', type=float, default=1.0, help='Multiplier on recorded latencies when replaying')
+    parser.add_argument('--timings', dest='timings', type=str, default='', help='Write per-host and slowest url latencies to this JSON file')
+    parser.add_argument('--connect_timeout', dest='connect_timeout', type=float, default=CONNECT_TIMEOUT, help='Seconds to wait for a connection to a host')
+    parser.add_argument('--read_timeout', dest='read_timeout', type=float, default=READ_TIMEOUT, help='Seconds to wait for a host to answer')
+    parser.add_argument('--max_host_failures', dest='max_host_failures', type=int, default=MAX_HOST_FAILURES, help='Consecutive failures before the remaining URLs of a host fail without being fetched, 0 to never give up')
+    parser.add_argument('--url_policy', dest='url_policy', type=str, default=URL_POLICY_FILE, help='CSV of skip/allow URL prefix rules')
+    args = parser.parse_args()
+    recorder = UrlRecorder() if args.record else None
+    replay_server = ReplayServer(args.replay, args.replay_latency_scale).start() if args.replay else None
+    timer = UrlTimer() if args.timings else None
+    set_default_http_client(HttpClient(proxy=replay_server.server_address if replay_server else None, recorder=recorder, timer=timer,
+                                       connect_timeout=args.connect_timeout, read_timeout=args.read_timeout, max_host_failures=args.max_host_failures))
+    set_default_url_policy(load_url_policy(args.url_policy))
+    # recording needs real fetches and replaying must not mix in live results
+    use_cache = args.url_cache and not args.replay
+    cache = UrlCache(args.url_cache, ttl_days=args.url_cache_ttl, refresh=args.refresh_urls or bool(args.record)) if use_cache else None
+    if len(args.files) == 1:
+        retval = check_tex_url(args.files[0], args.debug, args.quiet, args.max_workers, args.max_per_host, cache)
+    else:
+        retval = -1 if any(check_tex_urls(args.files, args.debug, args.quiet, args.max_workers, args.max_per_host, cache).values()) else 0
+    if cache:
+        cache.close()
+    if recorder:
+        recorder.save(args.record)
+    if timer:
+        timer.save(args.timings)
+        if not args.quiet:
+            print(timer.summary())
+    if replay_server:
+        replay_server.stop()
+
     sys.exit(retval)
 
 
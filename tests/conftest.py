@@ -0,0 +1,122 @@
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from cv_utils import UrlCache, HttpClient, default_http_client, set_default_http_client, URL_CACHE_FILE, URL_CACHE_TTL_DAYS
+from url_replay import UrlRecorder, ReplayServer
+from url_timings import UrlTimer
+
+def pytest_addoption(parser):
+    parser.addoption('--url-cache', dest='url_cache', default=URL_CACHE_FILE, help='URL status cache file, empty to disable')
+    parser.addoption('--url-cache-ttl', dest='url_cache_ttl', type=float, default=URL_CACHE_TTL_DAYS, help='Days before a cached URL status is rechecked')
+    parser.addoption('--refresh-urls', dest='refresh_urls', action='store_true', default=False, help='Ignore cached URL statuses and recheck every URL')
+    parser.addoption('--record-urls', dest='record_urls', default='', help='Record every URL response into this fixture file')
+    parser.addoption('--replay-urls', dest='replay_urls', default='', help='Answer URL checks from this fixture file instead of the network')
+    parser.addoption('--replay-latency-scale', dest='replay_latency_scale', type=float, default=0.0, help='Multiplier on recorded latencies when replaying')
+    parser.addoption('--url-timings', dest='url_timings', default='', help='Write per-host and slowest URL latencies to this JSON file')
+
+# routes the default http client through a recorder or a replay server for the session
+@pytest.fixture(scope='session')
+def url_replay(pytestconfig):
+    option = pytestconfig.option
+    if option.record_urls:
+        recorder = UrlRecorder()
+        set_default_http_client(HttpClient(recorder=recorder))
+        yield 'record'
+        recorder.save(option.record_urls)
+    elif option.replay_urls:
+        server = ReplayServer(option.replay_urls, option.replay_latency_scale).start()
+        set_default_http_client(HttpClient(proxy=server.server_address))
+        yield 'replay'
+        server.stop()
+    else:
+        yield None
+    set_default_http_client(None)
+
+@pytest.fixture(scope='session')
+def url_cache(pytestconfig, url_replay):
+    # replayed results must not land in (or come from) the live cache
+    if not pytestconfig.option.url_cache or url_replay == 'replay':
+        yield None
+        return
+    cache = UrlCache(pytestconfig.option.url_cache, ttl_days=pytestconfig.option.url_cache_ttl,
+                     refresh=pytestconfig.option.refresh_urls or url_replay == 'record')
+    yield cache
+    cache.close()
+
+# times every url the default client fetches, reported as junit properties and optionally JSON
+@pytest.fixture(scope='session')
+def url_timer(pytestconfig, url_replay, record_testsuite_property):
+    timer = UrlTimer()
+    client = default_http_client()
+    client.timer = timer
+    yield timer
+    client.timer = None
+    for name, value in timer.junit_properties():
+        record_testsuite_property(name, value)
+    if pytestconfig.option.url_timings:
+        timer.save(pytestconfig.option.url_timings)
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # /ok answers 200, /missing 404, /nohead rejects HEAD, /redirect moves to /ok for good,
+    # /temp moves to /redirect for now, anything else 500
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def respond(self):
+        time.sleep(self.server.latency)
+        self.server.hits.append(self.path)
+        self.server.requests.append((self.command, self.path, self.headers.get('Range')))
+        location = None
+        if self.path.startswith('/nohead'):
+            status = 405 if self.command == 'HEAD' else 206
+        elif self.path.startswith('/ok'):
+            status = 200
+        elif self.path.startswith('/missing'):
+            status = 404
+        elif self.path.startswith('/redirect'):
+            status = 301
+            location = '/ok' + self.path[len('/redirect'):]
+        elif self.path.startswith('/temp'):
+            status = 302
+            location = '/redirect' + self.path[len('/temp'):]
+        else:
+            status = 500
+        body = b'x' * 1024
+        self.send_response(status)
+        if location:
+            self.send_header('Location', location)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command == 'GET':
+            try:
+                self.wfile.write(body)
+            except OSError:
+                pass
+
+    do_GET = respond
+    do_HEAD = respond
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def url_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.latency = 0
+    server.hits = []
+    server.requests = []
+    server.connections = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
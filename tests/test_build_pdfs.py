@@ -0,0 +1,47 @@
+import logging
+import os
+import sys
+import time
+import build_pdfs
+
+# stands in for latexmk: takes a while, then writes the pdf into -outdir
+FAKE_LATEXMK = '''import os, sys, time
+out_dir = [arg for arg in sys.argv if arg.startswith('-outdir=')][0][len('-outdir='):]
+variant = os.path.splitext(os.path.basename(sys.argv[-1]))[0]
+time.sleep(0.5)
+if variant == 'broken':
+    sys.exit(12)
+with open(os.path.join(out_dir, variant + '.pdf'), 'w') as f:
+    f.write(variant)
+'''
+
+def fake_latexmk(tmp_path):
+    script = tmp_path / 'latexmk.py'
+    script.write_text(FAKE_LATEXMK)
+    latexmk = tmp_path / 'latexmk'
+    latexmk.write_text(f"#!/bin/sh\nexec {sys.executable} {script} \"$@\"\n")
+    latexmk.chmod(0o755)
+    return str(latexmk)
+
+def test_variants_build_concurrently(tmp_path):
+    tex_files = [str(tmp_path / (variant + '.tex')) for variant in ['cv-new', 'cv-expert-witness', 'broken']]
+    start = time.perf_counter()
+    results = build_pdfs.build_pdfs(tex_files, str(tmp_path / 'build'), fake_latexmk(tmp_path), logging.getLogger("test_build_pdfs"), use_format=False)
+    # about as long as one variant, not three
+    assert time.perf_counter() - start < 1.2
+    assert [succeeded for seconds, succeeded, passes, build, fmt in results.values()] == [True, True, False]
+    assert all(seconds >= 0.5 for seconds, succeeded, passes, build, fmt in results.values())
+    for variant in ['cv-new', 'cv-expert-witness']:
+        assert (tmp_path / 'build' / variant / (variant + '.pdf')).exists()
+        assert (tmp_path / (variant + '.pdf')).read_text() == variant
+    assert not (tmp_path / 'broken.pdf').exists()
+
+def test_windows_latexmk_skips_the_pass_report(tmp_path):
+    latexmk = tmp_path / 'latexmk.exe'
+    # fails so no pdf is expected, the arguments are all that matters
+    latexmk.write_text(f"#!/bin/sh\necho \"$@\" > {tmp_path / 'args'}\nexit 1\n")
+    latexmk.chmod(0o755)
+    seconds, succeeded, passes, build = build_pdfs.build_pdf(str(tmp_path / 'cv-new.tex'), str(tmp_path / 'build'), str(latexmk),
+                                                             logging.getLogger("test_build_pdfs"))
+    assert build is None
+    assert 'latex_pass' not in (tmp_path / 'args').read_text()
@@ -0,0 +1,52 @@
+import logging
+import canonical_urls
+from cv_utils import probe_url, UrlCache
+
+logger = logging.getLogger("test_canonical_urls")
+
+def test_redirect_chain_is_cached(url_server, tmp_path):
+    url = url_server.base_url + '/redirect/conf'
+    cache = UrlCache(str(tmp_path / 'cache.sqlite'))
+    chain = [(url, 301), (url_server.base_url + '/ok/conf', 200)]
+    assert probe_url(url, cache) == (200, url_server.base_url + '/ok/conf', chain)
+    hits = len(url_server.hits)
+    assert cache.get(url) == (200, url_server.base_url + '/ok/conf', chain)
+    assert probe_url(url, cache)[2] == chain
+    assert len(url_server.hits) == hits
+    cache.close()
+
+def test_rewrite_sources(url_server, tmp_path):
+    base = url_server.base_url
+    tpcs = tmp_path / 'TPCs.csv'
+    tpcs.write_bytes(f"﻿conf,year,URL\nCCS,2024,{base}/redirect/ccs\nSOSP,2023,{base}/ok/sosp\nOSDI,2022,{base}/missing\n".encode('utf-8'))
+    bib = tmp_path / 'cv.bib'
+    bib.write_text(f"@inproceedings{{a,\n  url = {{{base}/redirect/paper.pdf}},\n}}\n")
+
+    urls = canonical_urls.find_source_urls(str(tpcs)) + canonical_urls.find_source_urls(str(bib))
+    canonical = canonical_urls.canonical_urls(urls, logger)
+    assert canonical == {f"{base}/redirect/ccs": f"{base}/ok/ccs", f"{base}/redirect/paper.pdf": f"{base}/ok/paper.pdf"}
+
+    assert canonical_urls.rewrite_csv(str(tpcs), canonical, logger)
+    assert canonical_urls.rewrite_bib(str(bib), canonical, logger)
+    assert tpcs.read_bytes().startswith(b'\xef\xbb\xbf')
+    assert f"CCS,2024,{base}/ok/ccs" in tpcs.read_text(encoding='utf-8-sig')
+    assert f"OSDI,2022,{base}/missing" in tpcs.read_text(encoding='utf-8-sig')
+    assert f"url = {{{base}/ok/paper.pdf}}" in bib.read_text()
+    assert (tmp_path / 'TPCs-bak.csv').exists() and (tmp_path / 'cv-bak.bib').exists()
+
+def test_temporary_redirects_are_kept(url_server):
+    base = url_server.base_url
+    # /temp answers 302 to /redirect, which moves to /ok for good
+    assert canonical_urls.canonical_urls([f"{base}/temp/paper.pdf", f"{base}/redirect/talk.pdf"], logger) == {f"{base}/redirect/talk.pdf": f"{base}/ok/talk.pdf"}
+
+def test_bib_url_forms(url_server, tmp_path):
+    base = url_server.base_url
+    bib = tmp_path / 'cv.bib'
+    bib.write_text(f"@inproceedings{{a,\n  author = {{J{{\\\"o}}rg Schr\u00f6der}},\n  URL = {{{base}/redirect/a}},\n}}\n"
+                   f"@misc{{b,\n  Url=\"{base}/redirect/b\",\n  pdfurl = {{{base}/redirect/c}},\n}}\n", encoding='utf-8')
+    assert canonical_urls.find_bib_urls(str(bib)) == [f"{base}/redirect/a", f"{base}/redirect/b"]
+    canonical = canonical_urls.canonical_urls(canonical_urls.find_bib_urls(str(bib)), logger)
+    assert canonical_urls.rewrite_bib(str(bib), canonical, logger)
+    text = bib.read_text(encoding='utf-8')
+    assert f"URL = {{{base}/ok/a}}" in text and f'Url="{base}/ok/b"' in text and f"pdfurl = {{{base}/redirect/c}}" in text
+    assert "Schr\u00f6der" in text
@@ -0,0 +1,169 @@
+import socket
+import threading
+import time
+from cv_utils import check_urls, fetch_url, probe_url, skip_url, load_url_policy, set_default_url_policy, HttpClient, UrlCache, CIRCUIT_OPEN
+from check_tex_url import check_tex_url
+
+def test_check_urls_statuses(url_server):
+    urls = [url_server.base_url + '/ok/1', url_server.base_url + '/missing', url_server.base_url + '/ok/1', 'mailto:someone@example.com']
+    statuses = check_urls(urls)
+    assert statuses[url_server.base_url + '/ok/1'] == 200
+    assert statuses[url_server.base_url + '/missing'] != 200
+    assert statuses['mailto:someone@example.com'] == 'skipped'
+    # duplicates are only fetched once
+    assert url_server.hits.count('/ok/1') == 1
+
+def test_check_urls_per_host_limit():
+    lock = threading.Lock()
+    active = {'now': 0, 'max': 0}
+
+    def slow_check(url):
+        with lock:
+            active['now'] += 1
+            active['max'] = max(active['max'], active['now'])
+        time.sleep(0.02)
+        with lock:
+            active['now'] -= 1
+        return 200
+
+    urls = [f"https://example.org/{i}" for i in range(12)]
+    statuses = check_urls(urls, max_workers=8, max_per_host=3, check=slow_check)
+    assert len(statuses) == 12
+    assert active['max'] == 3
+
+def test_check_tex_url_retval(url_server, tmp_path):
+    tex = tmp_path / 'links.tex'
+    tex.write_text(f"\\href{{{url_server.base_url}/ok/a}}{{a}}\n\\href{{{url_server.base_url}/ok/b}}{{b}}\n")
+    assert check_tex_url.check_tex_url(str(tex)) == 0
+    tex.write_text(f"\\href{{{url_server.base_url}/ok/a}}{{a}}\n\\href{{{url_server.base_url}/missing}}{{b}}\n")
+    assert check_tex_url.check_tex_url(str(tex)) == -1
+
+def test_url_cache_skips_network(url_server, tmp_path):
+    urls = [url_server.base_url + '/ok/1', url_server.base_url + '/missing']
+    cache = UrlCache(str(tmp_path / 'cache.sqlite'))
+    first = check_urls(urls, cache=cache)
+    cache.close()
+    hits = len(url_server.hits)
+    cache = UrlCache(str(tmp_path / 'cache.sqlite'))
+    assert check_urls(urls, cache=cache) == first
+    assert len(url_server.hits) == hits
+    assert cache.get(url_server.base_url + '/ok/1') == (200, url_server.base_url + '/ok/1', [(url_server.base_url + '/ok/1', 200)])
+    cache.close()
+
+def test_url_cache_ttl_and_refresh(url_server, tmp_path):
+    url = url_server.base_url + '/ok/1'
+    cache = UrlCache(str(tmp_path / 'cache.sqlite'), ttl_days=0)
+    check_urls([url], cache=cache)
+    check_urls([url], cache=cache)
+    assert url_server.hits.count('/ok/1') == 2
+    cache.close()
+    cache = UrlCache(str(tmp_path / 'cache.sqlite'), refresh=True)
+    check_urls([url], cache=cache)
+    assert url_server.hits.count('/ok/1') == 3
+    cache.close()
+
+def test_url_cache_keeps_only_definitive_statuses(url_server, tmp_path):
+    urls = [url_server.base_url + '/ok/1', url_server.base_url + '/missing', url_server.base_url + '/broken']
+    cache = UrlCache(str(tmp_path / 'cache.sqlite'))
+    check_urls(urls, cache=cache)
+    assert cache.get(url_server.base_url + '/ok/1')
+    assert cache.get(url_server.base_url + '/missing')
+    # a 500 may be gone by the next run
+    assert cache.get(url_server.base_url + '/broken') is None
+    cache.close()
+
+def test_http_client_reuses_connections(url_server):
+    client = HttpClient()
+    urls = [f"{url_server.base_url}/ok/{i}" for i in range(40)]
+    statuses = check_urls(urls, max_per_host=2, check=lambda url: fetch_url(url, client)[0])
+    assert set(statuses.values()) == {200}
+    assert client.connections_opened <= 2
+    assert url_server.connections <= 2
+    assert all(method == 'HEAD' for method, path, _ in url_server.requests)
+    client.close()
+
+def test_http_client_head_fallback_and_redirects(url_server):
+    client = HttpClient()
+    assert fetch_url(url_server.base_url + '/nohead/thesis.pdf', client)[0] == 200
+    assert ('GET', '/nohead/thesis.pdf', 'bytes=0-0') in url_server.requests
+    assert fetch_url(url_server.base_url + "/redirect/a", client)[:2] == (200, url_server.base_url + "/ok/a")
+    assert fetch_url(url_server.base_url + '/missing', client)[0].startswith('check_url urlopen exception: HTTP Error 404')
+    assert fetch_url('notaurl', client)[0].startswith('check_url creation exception')
+    client.close()
+
+def test_check_tex_urls_dedups_across_files(url_server, tmp_path, capsys):
+    bib = tmp_path / 'cv.bib'
+    bib.write_text(f"@misc{{a,\n  url = {{{url_server.base_url}/ok/home}}\n}}\n")
+    tex = tmp_path / 'students.tex'
+    tex.write_text(f"\\href{{{url_server.base_url}/ok/home}}{{home}}\n\n\\href{{{url_server.base_url}/missing}}{{gone}}\n")
+    html = tmp_path / 'students.html'
+    html.write_text(f'<a href="{url_server.base_url}/missing">gone</a>\n')
+    retvals = check_tex_url.check_tex_urls([str(bib), str(tex), str(html)])
+    assert retvals == {str(bib): 0, str(tex): -1, str(html): -1}
+    assert url_server.hits.count('/ok/home') == 1
+    out = capsys.readouterr().out
+    assert f"{tex}:3: {url_server.base_url}/missing" in out
+    assert f"{html}:1: {url_server.base_url}/missing" in out
+    assert "avoiding 2 duplicate fetches" in out
+
+def test_read_timeout_and_circuit_breaker():
+    # accepts connections but never answers
+    black_hole = socket.socket()
+    black_hole.bind(('127.0.0.1', 0))
+    black_hole.listen(16)
+    base = f"http://127.0.0.1:{black_hole.getsockname()[1]}"
+    urls = [base + f"/page{i}" for i in range(6)]
+    client = HttpClient(read_timeout=0.2, max_host_failures=2)
+    start = time.perf_counter()
+    statuses = check_urls(urls, max_per_host=1, check=lambda url: fetch_url(url, client)[0])
+    client.close()
+    black_hole.close()
+    assert time.perf_counter() - start < 2
+    assert sum('timed out' in status for status in statuses.values()) == 2
+    assert sum(status.startswith(CIRCUIT_OPEN) for status in statuses.values()) == 4
+
+def test_url_policy(tmp_path):
+    policy_file = tmp_path / 'url_policy.csv'
+    policy_file.write_text("Action,Prefix,Reason\n"
+                           "allow,https://www.linkedin.com/in/public,Public profile\n"
+                           "skip,https://www.linkedin.com,Blocks scripts\n")
+    set_default_url_policy(load_url_policy(str(policy_file)))
+    try:
+        assert skip_url('https://www.linkedin.com/company/x')
+        assert not skip_url('https://www.linkedin.com/in/public')
+        assert not skip_url('mailto:someone@example.com')
+    finally:
+        set_default_url_policy(None)
+    # the policy shipped with the repo
+    assert probe_url('mailto:someone@example.com')[0] == 'skipped'
+
+def test_iter_url_locations(tmp_path):
+    source = tmp_path / 'mixed.tex'
+    source.write_text("@misc{a,\n  url = {https://a.example/x}\n}\n"
+                      "See \\href{https://b.example/y}{here} and\n"
+                      "<a href='https://c.example/z'>c</a>\n")
+    locations = check_tex_url.iter_url_locations(str(source))
+    assert next(locations) == ('https://a.example/x', str(source), 2, 'bib')
+    assert list(locations) == [('https://b.example/y', str(source), 4, 'tex'), ('https://c.example/z', str(source), 5, 'html')]
+    empty = tmp_path / 'empty.tex'
+    empty.write_text('')
+    assert list(check_tex_url.iter_url_locations(str(empty))) == []
+
+def test_check_urls_consumes_generator_lazily(url_server):
+    consumed = []
+
+    def urls():
+        for i in range(20):
+            consumed.append(i)
+            yield url_server.base_url + f"/ok/{i}"
+
+    started = []
+
+    def check(url):
+        # the first check runs before the generator is exhausted
+        started.append(len(consumed))
+        return 200
+
+    results = check_urls(urls(), max_workers=2, check=check)
+    assert len(results) == 20
+    assert started[0] < 20
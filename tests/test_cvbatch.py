@@ -0,0 +1,49 @@
+import logging
+import os
+import shutil
+import pybtex.database
+import cv_utils
+import cvbatch
+import cvbuild
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+INPUTS = ['cv.bib', 'students.csv', 'classes.csv', 'talks.csv', 'TPCs.csv', 'conference_keys.csv', 'funding.csv', 'cases.csv', 'people.csv']
+
+def make_profiles(tmp_path, names):
+    for name in names:
+        os.makedirs(tmp_path / name)
+        for input in INPUTS:
+            shutil.copy(os.path.join(ROOT, input), tmp_path / name)
+    return cvbatch.find_profiles([str(tmp_path)])
+
+def test_failing_profile_does_not_stop_the_rest(tmp_path, monkeypatch):
+    profiles = make_profiles(tmp_path, ['alice', 'bob', 'carol'])
+    assert [os.path.basename(profile) for profile in profiles] == ['alice', 'bob', 'carol']
+    os.remove(tmp_path / 'bob' / 'students.csv')
+    parsed = []
+    parse_file = pybtex.database.parse_file
+    monkeypatch.setattr(pybtex.database, 'parse_file', lambda bib_file: parsed.append(bib_file) or parse_file(bib_file))
+    monkeypatch.setattr(cv_utils, 'parsed_contents', cv_utils.OrderedDict())
+
+    cwd = os.getcwd()
+    results = cvbatch.build_profiles(profiles, list(cvbuild.TARGETS), 'critical', logging.getLogger("test_cvbatch"))
+    assert os.getcwd() == cwd
+    results = {os.path.basename(result['profile']): result for result in results}
+    assert 'students.csv' in results['bob']['error']
+    for name in ['alice', 'carol']:
+        assert results[name]['error'] is None
+        assert list(results[name]['targets']) == list(cvbuild.TARGETS)
+        assert (tmp_path / name / 'generated' / 'collabs.tex').exists()
+    # every profile has the same cv.bib, it is parsed once for all of them
+    assert len(parsed) == 1
+
+def test_check_profile_urls_once(tmp_path):
+    profiles = make_profiles(tmp_path, ['alice', 'bob'])
+    checked = []
+    def check(url, cache=None):
+        checked.append(url)
+        return 404 if 'sigsac' in url else 200
+    broken = cvbatch.check_profile_urls(profiles, check=check)
+    assert len(checked) == len(set(checked)) == len(cvbatch.profile_urls(profiles[0]))
+    assert broken[profiles[0]] == broken[profiles[1]]
+    assert broken[profiles[0]] and all('sigsac' in url for url in broken[profiles[0]])
@@ -0,0 +1,135 @@
+import logging
+import os
+import shutil
+import threading
+import time
+import pybtex.database
+import cv_utils
+import cvbuild
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+INPUTS = ['cv.bib', 'students.csv', 'classes.csv', 'talks.csv', 'TPCs.csv', 'conference_keys.csv', 'funding.csv', 'cases.csv', 'people.csv']
+
+def test_build_parses_each_input_once(tmp_path, monkeypatch):
+    for input in INPUTS:
+        shutil.copy(os.path.join(ROOT, input), tmp_path)
+    parsed = []
+    parse_file = pybtex.database.parse_file
+    monkeypatch.setattr(pybtex.database, 'parse_file', lambda bib_file: parsed.append(bib_file) or parse_file(bib_file))
+    monkeypatch.setattr(cv_utils, 'parsed_inputs', {})
+    monkeypatch.setattr(cv_utils, 'parsed_contents', cv_utils.OrderedDict())
+
+    out_dir = tmp_path / 'generated'
+    times = cvbuild.build(list(cvbuild.TARGETS), str(tmp_path), str(out_dir), 'critical', logging.getLogger("test_cvbuild"))
+    assert list(times) == list(cvbuild.TARGETS)
+    # gen_bibtex and gen_collaborators share one parse of cv.bib
+    assert len(parsed) == 1
+    for output in ['bib_summary.tex', 'phd_students.tex', 'new_phd_students.tex', 'grad_teaching.tex', 'talks.xml',
+                   'TPCs.tex', 'funding.tex', 'cases.tex', 'collabs.tex', 'conflicts.txt']:
+        assert (out_dir / output).exists(), output
+
+def test_build_selected_targets(tmp_path):
+    out_dir = tmp_path / 'generated'
+    cvbuild.build(['talks'], ROOT, str(out_dir), 'critical', logging.getLogger("test_cvbuild"))
+    assert sorted(os.listdir(out_dir)) == [cvbuild.MANIFEST_FILE, 'conference_talks.tex', 'invited_talks.tex', 'talks.xml']
+
+def test_build_skips_unchanged_targets(tmp_path):
+    for input in ['talks.csv', 'cases.csv']:
+        shutil.copy(os.path.join(ROOT, input), tmp_path)
+    out_dir = tmp_path / 'generated'
+    logger = logging.getLogger("test_cvbuild")
+    assert list(cvbuild.build(['talks', 'cases'], str(tmp_path), str(out_dir), 'critical', logger)) == ['talks', 'cases']
+    mtime = os.stat(out_dir / 'talks.xml').st_mtime_ns
+    assert cvbuild.build(['talks', 'cases'], str(tmp_path), str(out_dir), 'critical', logger) == {}
+
+    with open(tmp_path / 'cases.csv', 'a') as f:
+        f.write('\n')
+    assert list(cvbuild.build(['talks', 'cases'], str(tmp_path), str(out_dir), 'critical', logger)) == ['cases']
+    # a deleted or edited output is regenerated
+    os.remove(out_dir / 'invited_talks.tex')
+    assert list(cvbuild.build(['talks', 'cases'], str(tmp_path), str(out_dir), 'critical', logger)) == ['talks']
+    # with deterministic recordIds the rerun leaves the unchanged xml alone
+    assert os.stat(out_dir / 'talks.xml').st_mtime_ns == mtime
+    assert list(cvbuild.build(['talks'], str(tmp_path), str(out_dir), 'critical', logger, force=True)) == ['talks']
+
+def test_write_if_changed(tmp_path):
+    filename = str(tmp_path / 'out.tex')
+    assert cv_utils.write_if_changed(filename, 'a\n')
+    assert not cv_utils.write_if_changed(filename, 'a\n')
+    assert cv_utils.write_if_changed(filename, 'b\n')
+    with cv_utils.open_output(filename) as f:
+        f.write('b\n')
+    with open(filename) as f:
+        assert f.read() == 'b\n'
+
+def test_parallel_build_matches_serial(tmp_path):
+    logger = logging.getLogger("test_cvbuild")
+    cvbuild.build(list(cvbuild.TARGETS), ROOT, str(tmp_path / 'serial'), 'critical', logger, jobs=1)
+    times = cvbuild.build(list(cvbuild.TARGETS), ROOT, str(tmp_path / 'parallel'), 'critical', logger, jobs=3)
+    assert sorted(times) == sorted(cvbuild.TARGETS)
+    for output in os.listdir(tmp_path / 'serial'):
+        if output != cvbuild.MANIFEST_FILE:
+            assert (tmp_path / 'serial' / output).read_bytes() == (tmp_path / 'parallel' / output).read_bytes(), output
+
+def test_critical_path(monkeypatch):
+    # students has to wait for collabs once collabs rewrites students.csv
+    monkeypatch.setitem(cvbuild.UPDATES, 'collabs', ['people.csv', 'students.csv'])
+    dependencies = cvbuild.target_dependencies(['students', 'collabs', 'bib'])
+    assert dependencies == {'students': {'collabs'}, 'collabs': set(), 'bib': set()}
+    assert cvbuild.critical_path({'students': 1, 'collabs': 2, 'bib': 2.5}, dependencies) == (['collabs', 'students'], 3)
+    assert cvbuild.critical_path({'bib': 2.5}, dependencies) == (['bib'], 2.5)
+
+def test_watch_rebuilds_changed_inputs(tmp_path):
+    for input in ['talks.csv', 'cases.csv']:
+        shutil.copy(os.path.join(ROOT, input), tmp_path)
+    out_dir = tmp_path / 'generated'
+    logger = logging.getLogger("test_cvbuild")
+    cvbuild.build(['talks', 'cases'], str(tmp_path), str(out_dir), 'critical', logger)
+    cases_tex = (out_dir / 'cases.tex').read_text()
+    stop = threading.Event()
+    watcher = threading.Thread(target=cvbuild.watch, args=(['talks', 'cases'], str(tmp_path), str(out_dir), 'critical', logger),
+                               kwargs={'interval': 0.01, 'stop': stop})
+    watcher.start()
+    try:
+        # let the watcher take its first snapshot
+        time.sleep(0.2)
+        cases_csv = (tmp_path / 'cases.csv').read_text(encoding='utf-8-sig')
+        (tmp_path / 'cases.csv').write_text(cases_csv.replace('Example case', 'Another case'), encoding='utf-8-sig')
+        deadline = time.time() + 5
+        while (out_dir / 'cases.tex').read_text() == cases_tex and time.time() < deadline:
+            time.sleep(0.01)
+        assert 'Another case' in (out_dir / 'cases.tex').read_text()
+    finally:
+        stop.set()
+        watcher.join()
+
+def test_watch_compiles_pdfs_like_build_pdfs(tmp_path, monkeypatch):
+    from test_build_pdfs import fake_latexmk
+    shutil.copy(os.path.join(ROOT, 'cases.csv'), tmp_path)
+    (tmp_path / 'cv-new.tex').write_text("\\documentclass{article}\n\\begin{document}\n\\end{document}\n")
+    monkeypatch.chdir(tmp_path)
+    logger = logging.getLogger("test_cvbuild")
+    cvbuild.build(['cases'], '', 'generated', 'critical', logger)
+    stop = threading.Event()
+    watcher = threading.Thread(target=cvbuild.watch, args=(['cases'], '', 'generated', 'critical', logger),
+                               kwargs={'pdfs': ['cv-new.tex'], 'latexmk': fake_latexmk(tmp_path), 'interval': 0.01, 'stop': stop})
+    watcher.start()
+    try:
+        time.sleep(0.2)
+        cases_csv = (tmp_path / 'cases.csv').read_text(encoding='utf-8-sig')
+        (tmp_path / 'cases.csv').write_text(cases_csv.replace('Example case', 'Another case'), encoding='utf-8-sig')
+        deadline = time.time() + 5
+        while not (tmp_path / 'cv-new.pdf').exists() and time.time() < deadline:
+            time.sleep(0.01)
+        # compiled in its own build directory, then copied next to the tex file
+        assert (tmp_path / 'build' / 'cv-new' / 'cv-new.pdf').exists()
+        assert (tmp_path / 'cv-new.pdf').exists()
+    finally:
+        stop.set()
+        watcher.join()
+
+def test_signature_covers_imported_scripts():
+    files = cvbuild.target_signature('cases', ROOT)['files']
+    for module in ['gen_cases', 'cv_utils', 'phase_profile']:
+        assert os.path.join(cvbuild.SCRIPTS_DIR, module + '.py') in files
+    assert os.path.join(cvbuild.SCRIPTS_DIR, 'cvbuild.py') not in files
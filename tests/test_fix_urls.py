@@ -0,0 +1,42 @@
+import logging
+import gen_tpcs
+
+logger = logging.getLogger("test_fix_urls")
+
+def write_inputs(tmp_path, base):
+    tpcs = tmp_path / 'TPCs.csv'
+    tpcs.write_text("conf,year,month,URL,role,notes\n"
+                    f"SOSP,2023,10,{base}/ok/sosp,,\n"
+                    f"OSDI,2022,7,{base}/missing/osdi,,\n"
+                    f"NSDI,2021,4,{base}/missing/nsdi,,\n"
+                    "CCS,2024,11,,TPC Chair,\n")
+    conferences = tmp_path / 'conference_keys.csv'
+    conferences.write_text("conf_short,conf_full,start_year,start_num,annual,URL,Note\n"
+                           f"CCS,ACM Conference on Computer and Communications Security (CCS),1994,1,,{base}/ok/ccs<year>,\n")
+    return tpcs, conferences
+
+def test_fix_urls(url_server, tmp_path):
+    base = url_server.base_url
+    tpcs, conferences = write_inputs(tmp_path, base)
+    gen_tpcs.fix_urls(str(tpcs), str(conferences), logger, 'info')
+    text = tpcs.read_text()
+    assert f"SOSP,2023,10,{base}/ok/sosp,," in text
+    assert "OSDI,2022,7,none,," in text and "NSDI,2021,4,none,," in text
+    # urls filled in from conference_keys.csv are checked but not written back
+    assert '/ok/ccs2024' in url_server.hits
+    assert "CCS,2024,11,,TPC Chair," in text
+    assert (tmp_path / 'TPCs-bak.csv').read_text().count('/missing/') == 2
+    assert not (tmp_path / 'TPCs.csv.checkpoint').exists()
+
+def test_fix_urls_resumes_from_checkpoint(url_server, tmp_path):
+    base = url_server.base_url
+    tpcs, conferences = write_inputs(tmp_path, base)
+    # an interrupted run that got through the first two rows
+    (tmp_path / 'TPCs.csv.checkpoint').write_text("row,url,status\n"
+                                                  f"0,{base}/ok/sosp,200\n"
+                                                  f"1,{base}/missing/osdi,check_url urlopen exception: HTTP Error 404: Not Found\n")
+    gen_tpcs.fix_urls(str(tpcs), str(conferences), logger, 'info')
+    assert '/ok/sosp' not in url_server.hits and '/missing/osdi' not in url_server.hits
+    assert '/missing/nsdi' in url_server.hits
+    assert "OSDI,2022,7,none,," in tpcs.read_text() and "NSDI,2021,4,none,," in tpcs.read_text()
+    assert not (tmp_path / 'TPCs.csv.checkpoint').exists()
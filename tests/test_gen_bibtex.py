@@ -0,0 +1,44 @@
+import os
+from pybtex.database import parse_string
+import gen_bibtex
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+BIB = '''
+@article{article, author={Alice Smith and Bob Jones}, title={A Study: The Results}, journal={Journal of Things},
+         volume={12}, number={3}, pages={1-10}, year={2020}, month={March}}
+@techreport{report, author={Carol King}, title={{TPM} Attacks}, institution={University of Toronto}, number={CSRG-1}, year={2019}}
+@patent{patent, author={Dan Brown and Eve Adams and Frank Li}, title={Secure Thing}, howpublished={US Patent 1,234},
+        year={2018}, note={Filed 2016}}
+@misc{misc, author={G. H. Hardy and others}, title={Talk}, year={2017}}
+@inproceedings{paper, author={Ann Lee and Jean de la Fontaine}, title={X}, booktitle={Proc. of Y}, pages={7},
+               address={Toronto}, publisher={ACM}, year={2021}, url={https://example.com/x.pdf}}
+'''
+
+# expected output worked out by hand from the dl-cv.bst functions
+EXPECTED = {
+    'article': "Alice Smith and Bob Jones.\n\\newblock A study: The results.\n\\newblock {\\em Journal of Things}, 12(3):1--10, March 2020",
+    'report': "Carol King.\n\\newblock {TPM} attacks.\n\\newblock Technical Report CSRG-1, University of Toronto, 2019",
+    'patent': "Dan Brown, Eve Adams, and Frank Li.\n\\newblock Secure thing.\n\\newblock US Patent 1,234, 2018.\n\\newblock Filed 2016",
+    'misc': "G.~H. Hardy et~al.\n\\newblock Talk, 2017",
+    'paper': "Ann Lee and Jean de~la Fontaine.\n\\newblock \\href{https://example.com/x.pdf}{X}.\n"
+             "\\newblock In {\\em Proc. of Y}, page~7, Toronto, 2021. ACM",
+}
+
+def test_render_like_bst():
+    bib = parse_string(BIB, 'bibtex')
+    for key, expected in EXPECTED.items():
+        assert gen_bibtex.BibEntry(key, bib.entries[key]).render() == expected, key
+
+# special characters are lowered like change.case$ does, other brace groups are kept
+def test_title_case():
+    assert gen_bibtex.title_case('The {\\"O}BB Attack: {\\"U}ber {TPM} {\\OE}uvres {\\em A}') == 'The {\\"o}bb attack: {\\"U}ber {TPM} {\\oe}uvres {\\em a}'
+
+def test_entries_tex(tmp_path):
+    gen_bibtex.main([os.path.join(ROOT, 'cv.bib'), '--out_dir', str(tmp_path)])
+    # only written when asked for, the CVs use bibtex
+    assert not (tmp_path / 'bibentries.tex').exists()
+    gen_bibtex.main([os.path.join(ROOT, 'cv.bib'), '--out_dir', str(tmp_path), '--entries_out', 'bibentries.tex'])
+    entries = (tmp_path / 'bibentries.tex').read_text()
+    assert "\\@namedef{pub@lie:asplos_xom}{David Lie, Chandramohan~A. Thekkath, Mark Mitchell," in entries
+    assert "pages 168--177, November 2000.\n\\newblock (Acceptance: 24/114, 21\\%)}\n" in entries
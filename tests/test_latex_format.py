@@ -0,0 +1,65 @@
+import logging
+import os
+import sys
+import latex_format
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# stands in for pdflatex: -ini writes the format, a normal run is slower without one
+FAKE_ENGINE = '''import os, sys, time
+args = sys.argv[1:]
+if args == ['--version']:
+    print('pdfTeX 3.141592653-2.6-1.40.25 (fake)')
+    sys.exit(0)
+with open(os.path.join(os.path.dirname(sys.argv[0]), 'runs.log'), 'a') as f:
+    f.write(' '.join(args) + '\\n')
+option = lambda name: [arg[len(name):] for arg in args if arg.startswith(name)]
+if '-ini' in args:
+    with open(os.path.join(option('-output-directory=')[0], option('-jobname=')[0] + '.fmt'), 'w') as f:
+        f.write('format')
+else:
+    time.sleep(0.05 if option('-fmt=') else 0.3)
+'''
+
+def fake_engine(tmp_path):
+    (tmp_path / 'engine.py').write_text(FAKE_ENGINE)
+    engine = tmp_path / 'pdflatex'
+    engine.write_text(f"#!/bin/sh\nexec {sys.executable} {tmp_path / 'engine.py'} \"$@\"\n")
+    engine.chmod(0o755)
+    return str(engine)
+
+def test_variants_share_a_format():
+    version = 'pdfTeX 3.141592653-2.6-1.40.25'
+    key = latex_format.format_key(os.path.join(ROOT, 'cv-new.tex'), version)
+    assert key == latex_format.format_key(os.path.join(ROOT, 'cv-expert-witness.tex'), version)
+    assert key != latex_format.format_key(os.path.join(ROOT, 'cv-new.tex'), version + ' newer')
+    assert '\\usepackage{DLresume}' not in latex_format.static_preamble(open(os.path.join(ROOT, 'cv-new.tex')).read())
+
+def test_make_format(tmp_path):
+    engine = fake_engine(tmp_path)
+    logger = logging.getLogger("test_latex_format")
+    (tmp_path / 'local.sty').write_text('% v1\n')
+    tex_file = str(tmp_path / 'cv.tex')
+    with open(tex_file, 'w') as f:
+        f.write('\\documentclass{article}\n\\usepackage{local}\n\\csname endofdump\\endcsname\n\\usepackage{hyperref}\n'
+                '\\begin{document}\nhi\n\\end{document}\n')
+    format_dir = str(tmp_path / 'fmt')
+    fmt = latex_format.make_format(tex_file, logger, format_dir, engine)
+    assert os.path.exists(fmt + '.fmt')
+    assert latex_format.format_info(fmt)['per_pass_saving'] > 0.1
+    with open(fmt + '-probe.tex') as f:
+        assert 'hyperref' not in f.read()
+
+    # reused until something in the static preamble changes
+    runs = len((tmp_path / 'runs.log').read_text().splitlines())
+    (tmp_path / 'local.sty').touch()
+    with open(tex_file, 'a') as f:
+        f.write('more text\n')
+    assert latex_format.make_format(tex_file, logger, format_dir, engine) == fmt
+    assert len((tmp_path / 'runs.log').read_text().splitlines()) == runs
+    (tmp_path / 'local.sty').write_text('% v2\n')
+    assert latex_format.make_format(tex_file, logger, format_dir, engine) != fmt
+
+def test_missing_engine(tmp_path):
+    assert latex_format.make_format(os.path.join(ROOT, 'cv-new.tex'), logging.getLogger("test_latex_format"),
+                                    str(tmp_path), str(tmp_path / 'no-such-latex')) is None
@@ -0,0 +1,69 @@
+import json
+import logging
+import os
+import sys
+import build_pdfs
+import latex_pass
+
+LOG = '''This is pdfTeX, Version 3.141592653
+LaTeX Warning: Reference `fig:1' on page 1 undefined on input line 12.
+
+Package longtable Warning: Table widths have changed. Rerun LaTeX.
+
+
+LaTeX Warning: Label(s) may have changed. Rerun to get cross-references righ
+t.
+
+Package hyperref Warning: Token not allowed in a PDF string (Unicode):
+(hyperref)                removing `\\\\' on input line 40.
+
+'''
+
+# stands in for latexmk: runs the -pdflatex command until the log asks for no more reruns
+FAKE_LATEXMK = '''import os, shlex, subprocess, sys
+out_dir = [arg for arg in sys.argv if arg.startswith('-outdir=')][0][len('-outdir='):]
+command = [arg for arg in sys.argv if arg.startswith('-pdflatex=')][0][len('-pdflatex='):]
+tex_file = sys.argv[-1]
+for i in range(3):
+    subprocess.check_call(command.replace('%O', '-output-directory=' + shlex.quote(out_dir)).replace('%S', tex_file), shell=True)
+with open(os.path.join(out_dir, os.path.splitext(os.path.basename(tex_file))[0] + '.pdf'), 'w') as f:
+    f.write('pdf')
+'''
+
+# stands in for pdflatex: the first pass warns about table widths, the second about labels
+FAKE_ENGINE = '''import os, sys
+out_dir = [arg for arg in sys.argv if arg.startswith('-output-directory=')][0][len('-output-directory='):]
+log = os.path.join(out_dir, os.path.splitext(os.path.basename(sys.argv[-1]))[0] + '.log')
+runs = open(log).read().count('pass') if os.path.exists(log) else 0
+warnings = ['Package longtable Warning: Table widths have changed. Rerun LaTeX.', 'LaTeX Warning: Label(s) may have changed. Rerun to get cross-references right.', '']
+with open(log, 'w') as f:
+    f.write('pass\\n' * (runs + 1) + warnings[runs] + '\\n')
+'''
+
+def script(tmp_path, name, source):
+    (tmp_path / (name + '.py')).write_text(source)
+    command = tmp_path / name
+    command.write_text(f"#!/bin/sh\nexec {sys.executable} {tmp_path / (name + '.py')} \"$@\"\n")
+    command.chmod(0o755)
+    return str(command)
+
+def test_rerun_warnings(tmp_path):
+    (tmp_path / 'cv.log').write_text(LOG)
+    assert latex_pass.rerun_warnings(str(tmp_path / 'cv.log')) == [
+        'Package longtable Warning: Table widths have changed. Rerun LaTeX.',
+        'LaTeX Warning: Label(s) may have changed. Rerun to get cross-references right.']
+    assert latex_pass.log_warnings(str(tmp_path / 'cv.log'))[-1] == "Package hyperref Warning: Token not allowed in a PDF string (Unicode): removing `\\\\'."
+    assert latex_pass.log_file(['pdflatex', '-output-directory=build/cv', 'cv.tex']) == os.path.join('build/cv', 'cv.log')
+
+def test_build_report(tmp_path):
+    tex_file = str(tmp_path / 'cv.tex')
+    results = build_pdfs.build_pdfs([tex_file], str(tmp_path / 'build'), script(tmp_path, 'latexmk', FAKE_LATEXMK),
+                                    logging.getLogger("test_latex_pass"), use_format=False, engine=script(tmp_path, 'pdflatex', FAKE_ENGINE))
+    seconds, succeeded, passes, report, fmt = results[tex_file]
+    assert succeeded and passes == 3
+    with open(tmp_path / 'build' / 'cv' / latex_pass.REPORT_FILE) as f:
+        assert json.load(f) == report
+    assert [run['cause'] for run in report['runs']] == [
+        ['first pass'], ['Package longtable Warning: Table widths have changed. Rerun LaTeX.'],
+        ['LaTeX Warning: Label(s) may have changed. Rerun to get cross-references right.']]
+    assert 'pass 2' in latex_pass.summary(report)
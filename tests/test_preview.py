@@ -0,0 +1,50 @@
+import logging
+import os
+import sys
+import preview
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# stands in for pdflatex, logs its arguments and writes the pdf
+FAKE_ENGINE = '''import os, sys
+with open(os.path.join(os.path.dirname(sys.argv[0]), 'runs.log'), 'a') as f:
+    f.write(' '.join(sys.argv[1:]) + '\\n')
+out_dir = [arg for arg in sys.argv if arg.startswith('-output-directory=')][0][len('-output-directory='):]
+with open(os.path.join(out_dir, os.path.splitext(os.path.basename(sys.argv[-1]))[0] + '.pdf'), 'w') as f:
+    f.write('pdf')
+'''
+
+def cv_tree(tmp_path):
+    for section_dir in preview.SECTION_DIRS:
+        (tmp_path / section_dir).mkdir()
+    (tmp_path / 'sections' / 'awards.tex').write_text('')
+    (tmp_path / 'generated' / 'grad_teaching.tex').write_text('')
+    (tmp_path / 'generated' / 'bibentries.tex').write_text('')
+    (tmp_path / 'cv-new.tex').write_text(open(os.path.join(ROOT, 'cv-new.tex')).read())
+    return str(tmp_path)
+
+def test_resolve_section(tmp_path):
+    root = cv_tree(tmp_path)
+    assert preview.resolve_section('awards', root) == 'sections/awards.tex'
+    assert preview.resolve_section('sections/awards.tex', root) == 'sections/awards.tex'
+    assert preview.resolve_section('grad_teaching', root) == 'generated/grad_teaching.tex'
+    assert preview.resolve_section('no_such_section', root) is None
+
+def test_preview_tex(tmp_path):
+    tex = preview.preview_tex('cv-new.tex', 'sections/awards.tex', cv_tree(tmp_path))
+    assert tex.startswith('\\PassOptionsToClass{draft}{article}\n')
+    assert '\\usepackage{DLresume}' in tex
+    assert tex.endswith('\\begin{document}\n\\input{generated/bibentries}\n\\input{sections/awards}\n\\end{document}\n')
+    # none of the rest of the CV
+    assert 'academic_appointments' not in tex
+
+def test_preview_runs_one_pass(tmp_path, monkeypatch):
+    monkeypatch.chdir(cv_tree(tmp_path))
+    (tmp_path / 'engine.py').write_text(FAKE_ENGINE)
+    engine = tmp_path / 'pdflatex'
+    engine.write_text(f"#!/bin/sh\nexec {sys.executable} {tmp_path / 'engine.py'} \"$@\"\n")
+    engine.chmod(0o755)
+    pdf, seconds = preview.preview('sections/awards.tex', 'cv-new.tex', str(tmp_path / 'preview'), str(engine), logging.getLogger("test_preview"))
+    assert pdf == str(tmp_path / 'preview' / 'awards.pdf')
+    assert os.path.exists(pdf)
+    assert len((tmp_path / 'runs.log').read_text().splitlines()) == 1
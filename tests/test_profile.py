@@ -0,0 +1,84 @@
+import json
+import pstats
+import pytest
+import tracemalloc
+import types
+import cv_utils
+import gen_talks
+import phase_profile
+
+def test_nested_phases_count_once(monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr(phase_profile, 'time', types.SimpleNamespace(perf_counter=lambda: next(clock)))
+    profiler = phase_profile.PhaseProfiler()
+    # outer runs 0-5 with inner taking 1-3 of it, then inner again 6-7
+    with profiler.phase('outer'):
+        with profiler.phase('inner'):
+            next(clock)
+        next(clock)
+    with profiler.phase('inner'):
+        pass
+    assert profiler.phases == {'outer': {'seconds': 3, 'calls': 1}, 'inner': {'seconds': 3, 'calls': 2}}
+
+def test_profiled_only_records_when_profiling():
+    double = phase_profile.profiled('double')(lambda x: 2 * x)
+    assert double(2) == 4
+    phase_profile.profiler = phase_profile.PhaseProfiler()
+    try:
+        assert double(3) == 6
+        assert phase_profile.profiler.phases['double']['calls'] == 1
+    finally:
+        phase_profile.profiler = None
+
+# the repo's talks.csv has a single talk of each type, which sorting never compares
+def write_talks(talks):
+    talks.write_text("Title,Venue,Year,Type,Header,URL,Country,City,Audience,Keynote,Co-Presenters\n" +
+                     ''.join(f"Talk {year},Venue,{year},Conference,,,Canada,Toronto,Researcher,,\n" for year in (2019, 2021, 2020)))
+
+def test_generator_profile(tmp_path, monkeypatch):
+    monkeypatch.setattr(cv_utils, 'parsed_inputs', {})
+    monkeypatch.setattr(cv_utils, 'parsed_contents', cv_utils.OrderedDict())
+    write_talks(tmp_path / 'talks.csv')
+    profile = tmp_path / 'talks.json'
+    stats = tmp_path / 'talks.pstats'
+    gen_talks.main([str(tmp_path / 'talks.csv'), '--out_dir', str(tmp_path), '--profile', str(profile), '--pstats', str(stats)])
+    assert phase_profile.profiler is None
+    with open(profile) as f:
+        result = json.load(f)
+    assert result['script'] == 'gen_talks'
+    assert {'load', 'parse', 'sort', 'latex-encode', 'render', 'write'} <= set(result['phases'])
+    # gen_latex and gen_xml
+    assert result['phases']['render']['calls'] == 2
+    # conference and invited talks
+    assert result['phases']['sort']['calls'] == 2
+    assert result['phases']['write']['calls'] == 3
+    assert sum(phase['seconds'] for phase in result['phases'].values()) <= result['seconds']
+    assert 'peak_bytes' not in result
+    assert pstats.Stats(str(stats)).total_calls > 0
+    assert (tmp_path / 'talks.xml').exists()
+
+def test_generator_memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(cv_utils, 'parsed_inputs', {})
+    monkeypatch.setattr(cv_utils, 'parsed_contents', cv_utils.OrderedDict())
+    write_talks(tmp_path / 'talks.csv')
+    profile = tmp_path / 'talks.json'
+    gen_talks.main([str(tmp_path / 'talks.csv'), '--out_dir', str(tmp_path), '--profile', str(profile), '--memory'])
+    assert not tracemalloc.is_tracing()
+    with open(profile) as f:
+        result = json.load(f)
+    parse = result['phases']['parse']
+    # the parsed rows stay cached after the run
+    assert 0 < parse['retained_bytes'] <= parse['peak_increase_bytes']
+    assert parse['top_sites'] and all(site['bytes'] > 0 for site in parse['top_sites'])
+    assert not any(phase_profile.__file__ in site['site'] for phase in result['phases'].values() for site in phase['top_sites'])
+    # render runs the parse, so its peak covers it
+    assert result['phases']['render']['peak_bytes'] >= parse['peak_bytes']
+    assert result['peak_bytes'] >= result['phases']['render']['peak_bytes']
+
+def test_memory_needs_profile(tmp_path, capsys):
+    write_talks(tmp_path / 'talks.csv')
+    with pytest.raises(SystemExit) as exit:
+        gen_talks.main([str(tmp_path / 'talks.csv'), '--out_dir', str(tmp_path), '--memory'])
+    assert exit.value.code == 2
+    assert 'usage:' in capsys.readouterr().err
+    assert not (tmp_path / 'talks.xml').exists()
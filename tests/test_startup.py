@@ -0,0 +1,18 @@
+import os
+import subprocess
+import sys
+import cv_utils
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+GENERATORS = ['gen_bibtex', 'gen_cases', 'gen_collaborators', 'gen_funding', 'gen_students', 'gen_talks', 'gen_teaching', 'gen_tpcs', 'cvbuild']
+HEAVY_MODULES = ['pylatexenc', 'dateutil', 'nameparser', 'pybtex', 'http.client', 'ssl', 'sqlite3', 'concurrent.futures', 'tempfile']
+
+def test_generators_import_no_heavy_modules():
+    code = f"import sys\nimport {', '.join(GENERATORS)}\nprint(' '.join(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules)))"
+    result = subprocess.run([sys.executable, '-c', code], cwd=SCRIPTS_DIR, stdout=subprocess.PIPE, text=True, check=True)
+    assert result.stdout.split() == []
+
+def test_lazy_module():
+    textwrap = cv_utils.LazyModule('textwrap')
+    assert textwrap.dedent('  a\n  b') == 'a\nb'
+    assert cv_utils.latex_format(' Café & co ') == "Caf\\'e \\& co"
@@ -0,0 +1,31 @@
+import os
+import tex_deps
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+def test_cv_variants(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    deps, scanned = tex_deps.scan_deps('cv-new.tex')
+    for dep in ['_header.tex', 'cv.bib', 'dl-cv.bst', 'DLresume.sty', 'sections/pubs.tex', 'generated/TPCs.tex',
+                'generated/collabs.tex', 'generated/student_stats.tex']:
+        assert dep in deps, dep
+    # followed through sections/student_stats.tex
+    assert 'sections/student_stats.tex' in scanned
+    for dep in ['generated/tpcs.xml', 'generated/students.html', 'generated/phd_students.tex', 'generated/cases.tex']:
+        assert dep not in deps, dep
+    assert 'generated/cases.tex' in tex_deps.scan_deps('cv-expert-witness.tex')[0]
+    assert 'generated/phd_students.tex' in tex_deps.scan_deps('cv.tex')[0]
+
+def test_scan_deps(tmp_path):
+    (tmp_path / 'sections').mkdir()
+    (tmp_path / 'main.tex').write_text('\\usepackage[numbers]{natbib,local}\n\\input{sections/a}\n'
+                                       '% \\input{sections/commented}\n\\include{generated/b.tex} 100\\% \\bibliography{x, y}\n')
+    (tmp_path / 'local.sty').write_text('')
+    (tmp_path / 'sections' / 'a.tex').write_text('\\input{sections/c}\\input{sections/a}\n')
+    deps, scanned = tex_deps.scan_deps(str(tmp_path / 'main.tex'))
+    names = [os.path.relpath(dep, tmp_path) for dep in deps]
+    # natbib comes from the tex distribution, sections/c doesn't exist yet
+    assert names == ['main.tex', 'local.sty', 'sections/a.tex', 'generated/b.tex', 'x.bib', 'y.bib', 'sections/c.tex']
+    assert [os.path.relpath(filename, tmp_path) for filename in scanned] == ['main.tex', 'local.sty', 'sections/a.tex']
+    rules = tex_deps.make_rules('main.pdf', ['main.tex', 'a.tex'], ['main.tex'], 'main.d')
+    assert rules == 'main.pdf: main.tex a.tex\nmain.d: main.tex\nmain.tex:\n'
@@ -0,0 +1,31 @@
+from cv_utils import check_urls, fetch_url, HttpClient
+from url_replay import UrlRecorder, ReplayServer
+
+def test_record_and_replay(url_server, tmp_path):
+    base = url_server.base_url
+    urls = [base + '/ok/a', base + '/nohead/thesis.pdf', base + '/redirect/b', base + '/missing']
+    recorder = UrlRecorder()
+    client = HttpClient(recorder=recorder)
+    live = check_urls(urls, check=lambda url: fetch_url(url, client))
+    client.close()
+    fixtures = tmp_path / 'fixtures.json'
+    recorder.save(str(fixtures))
+    assert recorder.urls[base + '/redirect/b']['redirects'] == [(base + '/redirect/b', 301), (base + '/ok/b', 200)]
+
+    hits = len(url_server.hits)
+    server = ReplayServer(str(fixtures), latency_scale=0).start()
+    client = HttpClient(proxy=server.server_address)
+    replayed = check_urls(urls, check=lambda url: fetch_url(url, client))
+    client.close()
+    server.stop()
+    assert replayed == live
+    assert len(url_server.hits) == hits
+
+def test_replay_unrecorded_url_fails(tmp_path):
+    fixtures = tmp_path / 'fixtures.json'
+    UrlRecorder().save(str(fixtures))
+    server = ReplayServer(str(fixtures), latency_scale=0).start()
+    client = HttpClient(proxy=server.server_address)
+    assert fetch_url('https://www.usenix.org/conference', client)[0].startswith('check_url urlopen exception: HTTP Error 502')
+    client.close()
+    server.stop()
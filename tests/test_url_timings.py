@@ -0,0 +1,34 @@
+import json
+from cv_utils import check_urls, fetch_url, url_host, HttpClient, TIMED_PHASES
+from url_timings import UrlTimer, percentile
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 21))
+    assert percentile(values, 50) == 10
+    assert percentile(values, 95) == 19
+    assert percentile([3.0], 95) == 3.0
+
+def test_timings_report(url_server, tmp_path):
+    url_server.latency = 0.05
+    base = url_server.base_url
+    urls = [base + f"/ok/{i}" for i in range(4)] + [base + '/missing']
+    timer = UrlTimer()
+    client = HttpClient(timer=timer)
+    check_urls(urls, max_per_host=2, check=lambda url: fetch_url(url, client))
+    client.close()
+    url_server.latency = 0
+
+    report = timer.report(slowest=3)
+    host = report['hosts'][url_host(base)]
+    assert host['urls'] == 5
+    assert host['ttfb']['p50'] >= 0.05
+    assert host['total']['p50'] <= host['total']['p95'] <= host['total']['max']
+    assert len(report['slowest']) == 3
+    assert all(phase in report['slowest'][0] for phase in TIMED_PHASES)
+
+    names = dict(timer.junit_properties(slowest=3))
+    assert f"url_latency.{url_host(base)}.p95" in names
+    assert 'url_slowest.3' in names
+    timings = tmp_path / 'timings.json'
+    timer.save(str(timings))
+    assert json.loads(timings.read_text())['hosts'][url_host(base)]['urls'] == 5
@@ -1,24 +1,46 @@
 import pytest
 from check_tex_url import check_tex_url
 
-def test_bib_file():
-    check_tex_url.check_tex_url("cv.bib")
+URL_FILES = ["cv.bib", "cv.tex", "generated/phd_students.tex", "generated/ms_students.tex",
+             "generated/pdfs.tex", "generated/TPCs.tex", "cv-10page.tex"]
 
-def test_cv_tex():
-    check_tex_url.check_tex_url("cv.tex")
+# check every file in one session so urls shared between files are fetched once
+@pytest.fixture(scope='module')
+def url_results(url_cache, url_replay, url_timer):
+    results = {}
+    filenames = []
+    for filename in URL_FILES:
+        try:
+            open(filename).close()
+            filenames.append(filename)
+        except OSError as e:
+            results[filename] = e
+    results.update(check_tex_url.check_tex_urls(filenames, cache=url_cache))
+    return results
 
-def test_phd_students_tex():
-    check_tex_url.check_tex_url("generated/phd_students.tex")
+def checked(url_results, filename):
+    if isinstance(url_results[filename], Exception):
+        raise url_results[filename]
+    return url_results[filename]
 
-def test_ms_students_tex():
-    check_tex_url.check_tex_url("generated/ms_students.tex")
+def test_bib_file(url_results):
+    checked(url_results, "cv.bib")
 
-def test_pdfs_tex():
-    check_tex_url.check_tex_url("generated/pdfs.tex")
-    
-def test_pdfs_tex():
-    check_tex_url.check_tex_url("generated/TPCs.tex")
+def test_cv_tex(url_results):
+    checked(url_results, "cv.tex")
 
-def test_cv10page_tex():
-    check_tex_url.check_tex_url("cv-10page.tex")
+def test_phd_students_tex(url_results):
+    checked(url_results, "generated/phd_students.tex")
+
+def test_ms_students_tex(url_results):
+    checked(url_results, "generated/ms_students.tex")
+
+def test_pdfs_tex(url_results):
+    checked(url_results, "generated/pdfs.tex")
+
+def test_tpcs_tex(url_results):
+    checked(url_results, "generated/TPCs.tex")
+
+def test_cv10page_tex(url_results):
+    checked(url_results, "cv-10page.tex")
 